@@ -1,12 +1,15 @@
 from flask import Flask
 from api.config import Config
-from api.extensions import db, jwt, cors
+from api.extensions import db, jwt, cors, redis_client
+from api.utils.json_provider import FastJSONProvider
+from api.utils import http_cache
 import os
 
 def create_app(config_class=Config):
     """Application factory pattern"""
     app = Flask(__name__)
     app.config.from_object(config_class)
+    app.json = FastJSONProvider(app)
     
     # Create upload folder
     os.makedirs(app.config.get('UPLOAD_FOLDER', '/tmp/uploads'), exist_ok=True)
@@ -15,6 +18,10 @@ def create_app(config_class=Config):
     db.init_app(app)
     jwt.init_app(app)
     cors.init_app(app)
+    redis_client.init_app(app)
+    
+    # ETags (304 Not Modified) and gzip/brotli compression
+    http_cache.init_app(app)
     
     # Register blueprints
     from api.routes.main import main_bp
@@ -27,6 +34,7 @@ def create_app(config_class=Config):
     from api.routes.notifications import notifications_bp
     from api.routes.media import media_bp
     from api.routes.ai import ai_bp
+    from api.routes.dashboard import dashboard_bp
     
     app.register_blueprint(main_bp)
     app.register_blueprint(auth_bp)
@@ -38,10 +46,21 @@ def create_app(config_class=Config):
     app.register_blueprint(notifications_bp)
     app.register_blueprint(media_bp)
     app.register_blueprint(ai_bp)
+    app.register_blueprint(dashboard_bp)
+    
+    # CLI commands
+    from api.commands import import_medications_command, normalize_medications_command
+    app.cli.add_command(import_medications_command)
+    app.cli.add_command(normalize_medications_command)
     
     # Create database tables
     with app.app_context():
         db.create_all()
         print("✓ Database tables created!")
+        
+        # Build the medication autocomplete index for this worker
+        if app.config.get('AUTOCOMPLETE_WARM_START'):
+            from api.utils.medication_index import medication_index
+            medication_index.rebuild()
     
     return app
@@ -0,0 +1,99 @@
+"""
+Notification channel backends, one per Notification.delivery_method.
+
+Backends are built from the app config the first time a worker needs them and
+kept for the life of the process, so provider connections are reused across
+tasks. A channel without a configured provider falls back to MemoryBackend,
+which only logs.
+"""
+import logging
+from flask import current_app
+from api.channels.base import ChannelBackend, DeliveryError, Message
+from api.channels.fake import MemoryBackend
+from api.channels.gateway import PushGatewayBackend, SMSGatewayBackend
+from api.channels.smtp import SMTPBackend
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('push', 'email', 'sms')
+
+_backends = {}
+
+
+def _build(method):
+    config = current_app.config
+    batch_size = config.get('NOTIFICATION_BATCH_SIZE')
+    if method == 'push' and config.get('PUSH_GATEWAY_URL'):
+        return PushGatewayBackend(config['PUSH_GATEWAY_URL'], config.get('PUSH_GATEWAY_TOKEN', ''),
+                                  batch_size=batch_size)
+    if method == 'sms' and config.get('SMS_GATEWAY_URL'):
+        return SMSGatewayBackend(config['SMS_GATEWAY_URL'], config.get('SMS_GATEWAY_TOKEN', ''),
+                                 batch_size=batch_size)
+    if method == 'email' and config.get('SMTP_HOST'):
+        return SMTPBackend(
+            config['SMTP_HOST'],
+            config.get('SMTP_PORT', 25),
+            config.get('SMTP_USERNAME', ''),
+            config.get('SMTP_PASSWORD', ''),
+            config.get('SMTP_USE_TLS', False),
+            config.get('MAIL_FROM', ''),
+            batch_size=batch_size,
+            pool_size=config.get('SMTP_POOL_SIZE', 2),
+            max_messages=config.get('SMTP_MAX_MESSAGES_PER_CONNECTION', 500)
+        )
+    logger.warning(f"No provider configured for {method} notifications, only logging them")
+    return MemoryBackend(method)
+
+
+def get_backend(method):
+    if method not in METHODS:
+        raise ValueError(f'Unknown delivery method: {method}')
+    backend = _backends.get(method)
+    if backend is None:
+        backend = _backends[method] = _build(method)
+    return backend
+
+
+def set_backend(method, backend):
+    """Replace a channel's backend (local stand-ins, benchmarks)"""
+    old = _backends.pop(method, None)
+    if old is not None:
+        old.close()
+    if backend is not None:
+        _backends[method] = backend
+
+
+def close_all():
+    for backend in _backends.values():
+        backend.close()
+    _backends.clear()
+
+
+def deliver(method, items):
+    """
+    Send (notification, user) pairs through a channel in batches of the
+    backend's batch_size, to notification.recipient when set (emergency
+    contacts) or else the user's address. Returns {notification_id: error}
+    for those that were not delivered.
+    """
+    backend = get_backend(method)
+    failures = {}
+    messages = []
+    for notification, user in items:
+        address = notification.recipient or backend.address(user)
+        if not address:
+            failures[notification.id] = f'User has no {method} address'
+            continue
+        messages.append(Message(
+            notification.id, user.id, address, notification.title or '', notification.message or '', user.language
+        ))
+
+    for start in range(0, len(messages), backend.batch_size):
+        batch = messages[start:start + backend.batch_size]
+        try:
+            failures.update(backend.send_batch(batch))
+        except Exception as e:
+            logger.error(f"Error sending {len(batch)} {method} notifications: {str(e)}")
+            backend.close()
+            failures.update({message.notification_id: str(e) for message in batch})
+    return failures
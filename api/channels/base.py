@@ -0,0 +1,38 @@
+"""
+Interface shared by the notification channel backends.
+"""
+from collections import namedtuple
+
+# Lo que recibe un backend por cada notificación
+Message = namedtuple('Message', 'notification_id user_id address title body language')
+
+
+class DeliveryError(Exception):
+    """The provider rejected or could not take a whole batch"""
+
+
+class ChannelBackend:
+    """
+    Delivers batches of messages for one delivery_method.
+
+    Instances live for the whole worker process, so connections opened by a
+    backend are reused by every batch the worker sends.
+    """
+    method = None
+    provider = 'default'  # rate limits are kept per channel and provider
+    batch_size = 100
+
+    def address(self, user):
+        """Recipient of the user's messages on this channel, or None"""
+        raise NotImplementedError
+
+    def send_batch(self, messages):
+        """
+        Send up to batch_size messages. Returns {notification_id: error} for
+        the messages that were not delivered; raises DeliveryError (or a
+        connection error) when the whole batch failed.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release connections; the next batch opens new ones"""
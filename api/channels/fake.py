@@ -0,0 +1,174 @@
+"""
+Local stand-ins for the notification providers.
+
+MemoryBackend is used for any channel without a configured provider: it logs
+and keeps the messages, as send_notification did before real delivery.
+
+FakePushGateway is an in-process HTTP server speaking the gateway protocol
+(see api.channels.gateway), for local runs and benchmarks:
+
+    python -m api.channels.fake --port 8025
+    PUSH_GATEWAY_URL=http://localhost:8025/push
+
+FakeSMTPServer is an aiosmtpd server (when aiosmtpd is installed) that
+advertises PIPELINING, keeps the messages and can reject recipients:
+
+    python -m api.channels.fake --port 8025 --smtp-port 1025
+    SMTP_HOST=localhost SMTP_PORT=1025
+"""
+import argparse
+import json
+import logging
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from api.channels.base import ChannelBackend
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:  # solo hace falta para FakeSMTPServer
+    Controller = None
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend(ChannelBackend):
+    provider = 'memory'
+
+    def __init__(self, method, keep=1000):
+        self.method = method
+        self.sent = deque(maxlen=keep)
+
+    def address(self, user):
+        if self.method == 'email':
+            return user.email or None
+        if self.method == 'sms':
+            return user.phone or None
+        return str(user.id)
+
+    def send_batch(self, messages):
+        for message in messages:
+            logger.info(f"Sending {self.method} notification to user {message.user_id}")
+        self.sent.extend(messages)
+        return {}
+
+
+class _GatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, como un proveedor real
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        gateway = self.server.gateway
+        messages = payload.get('messages', [])
+        failed = {
+            str(message['id']): 'Rejected by fake gateway'
+            for message in messages if message['id'] in gateway.reject
+        }
+        with gateway.lock:
+            gateway.requests += 1
+            gateway.messages.extend(messages)
+
+        body = json.dumps({'failed': failed}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakePushGateway:
+    """Records every batch it receives; ids in `reject` are reported as failed"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.messages = []
+        self.reject = set()
+        self._server = ThreadingHTTPServer((host, port), _GatewayHandler)
+        self._server.daemon_threads = True
+        self._server.gateway = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/push'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _SMTPHandler:
+    def __init__(self, server):
+        self.server = server
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        session.host_name = hostname
+        return responses[:-1] + ['250-PIPELINING'] + responses[-1:]
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.server.reject:
+            return '550 5.1.1 Mailbox unavailable'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        with self.server.lock:
+            self.server.messages.append((envelope.rcpt_tos[0], envelope.content))
+        return '250 Message accepted for delivery'
+
+
+class FakeSMTPServer:
+    """Keeps every (recipient, bytes) it receives; addresses in `reject` get a 550"""
+
+    def __init__(self, host='127.0.0.1', port=1025):
+        if Controller is None:
+            raise RuntimeError('FakeSMTPServer needs aiosmtpd (pip install aiosmtpd)')
+        self.lock = threading.Lock()
+        self.messages = []
+        self.reject = set()
+        self.host, self.port = host, port
+        self._controller = Controller(_SMTPHandler(self), hostname=host, port=port)
+
+    def start(self):
+        self._controller.start()
+        return self
+
+    def stop(self):
+        self._controller.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake push/SMS gateway and SMTP server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8025)
+    parser.add_argument('--smtp-port', type=int, help='also run FakeSMTPServer on this port')
+    args = parser.parse_args()
+
+    smtp = None
+    if args.smtp_port:
+        smtp = FakeSMTPServer(args.host, args.smtp_port).start()
+        print(f'SMTP on {args.host}:{args.smtp_port}')
+    gateway = FakePushGateway(args.host, args.port)
+    print(f'Listening on {gateway.url}')
+    try:
+        gateway._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if smtp:
+            smtp.stop()
+
+
+if __name__ == '__main__':
+    main()
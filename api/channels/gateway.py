@@ -0,0 +1,95 @@
+"""
+Push and SMS delivery through an HTTP gateway that accepts batches.
+
+Each batch is one request over a keep-alive connection that the backend keeps
+open for the life of the worker:
+
+    POST <url>
+    Authorization: Bearer <token>
+    {"messages": [{"id": 1, "to": "...", "title": "...", "body": "..."}]}
+
+Any 2xx answer means the batch was accepted; the body may list the messages
+the provider rejected as {"failed": {"<id>": "reason"}}.
+"""
+import http.client
+import json
+import logging
+from urllib.parse import urlsplit
+from api.channels.base import ChannelBackend, DeliveryError
+
+logger = logging.getLogger(__name__)
+
+
+class GatewayBackend(ChannelBackend):
+    def __init__(self, url, token='', timeout=10, batch_size=None):
+        parts = urlsplit(url)
+        self._connection_class = (
+            http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        )
+        self._netloc = self.provider = parts.netloc
+        self._path = parts.path or '/'
+        if parts.query:
+            self._path += '?' + parts.query
+        self._headers = {'Content-Type': 'application/json'}
+        if token:
+            self._headers['Authorization'] = f'Bearer {token}'
+        self._timeout = timeout
+        self._connection = None
+        if batch_size:
+            self.batch_size = batch_size
+
+    def _payload(self, message):
+        return {'id': message.notification_id, 'to': message.address, 'title': message.title, 'body': message.body}
+
+    def _post(self, body):
+        reused = self._connection is not None
+        if not reused:
+            self._connection = self._connection_class(self._netloc, timeout=self._timeout)
+        try:
+            self._connection.request('POST', self._path, body=body, headers=self._headers)
+            response = self._connection.getresponse()
+            return response.status, response.read()
+        except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+            self.close()
+            if not reused:
+                raise
+            # El servidor cerró la conexión inactiva: se reintenta con una nueva
+            return self._post(body)
+        except Exception:
+            self.close()
+            raise
+
+    def send_batch(self, messages):
+        body = json.dumps({'messages': [self._payload(message) for message in messages]}).encode('utf-8')
+        status, data = self._post(body)
+        if not 200 <= status < 300:
+            raise DeliveryError(f'{self.method} gateway answered {status}: {data[:200]!r}')
+
+        try:
+            failed = json.loads(data).get('failed') or {}
+            return {int(notification_id): str(error) for notification_id, error in failed.items()}
+        except (ValueError, AttributeError):
+            return {}  # respuesta vacía o sin detalle: todo entregado
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class PushGatewayBackend(GatewayBackend):
+    method = 'push'
+
+    def address(self, user):
+        # El gateway conoce los dispositivos de cada usuario
+        return str(user.id)
+
+
+class SMSGatewayBackend(GatewayBackend):
+    method = 'sms'
+
+    def address(self, user):
+        return user.phone or None
+
+    def _payload(self, message):
+        return {'id': message.notification_id, 'to': message.address, 'body': f'{message.title}: {message.body}'}
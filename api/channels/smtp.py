@@ -0,0 +1,305 @@
+"""
+Email delivery over SMTP.
+
+Each worker keeps a small pool of authenticated connections (SMTP_POOL_SIZE)
+and splits a batch across them, one thread per connection. When the server
+advertises PIPELINING (RFC 2920) the end of each message travels in the same
+write as the next envelope (MAIL, RCPT, DATA), so a message costs one round
+trip instead of four. Connections are recycled after
+SMTP_MAX_MESSAGES_PER_CONNECTION messages and checked with NOOP when they
+have been idle for a while.
+
+Messages are plain text, quoted-printable. The fixed headers and the encoded
+footer (the 'email.footer' notification template) are compiled once per
+language and worker, so rendering a message only encodes its subject and
+text and concatenates the pieces (building an EmailMessage costs about 1 ms,
+more than the SMTP exchange).
+"""
+import base64
+import binascii
+import logging
+import queue
+import re
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate, make_msgid
+from api.channels.base import ChannelBackend
+from api.utils.notification_templates import templates
+
+logger = logging.getLogger(__name__)
+
+# Segundos sin uso tras los que se comprueba la conexión con NOOP
+IDLE_CHECK = 5
+
+_DOT = re.compile(rb'^\.', re.MULTILINE)
+_NEWLINES = re.compile(r'\r\n|\r|\n')
+_RSET = object()
+
+
+def _text(value):
+    """Quoted-printable body with CRLF line endings"""
+    return binascii.b2a_qp(_NEWLINES.sub('\r\n', value).encode('utf-8'), istext=True)
+
+
+def _header(value):
+    """Header value, as RFC 2047 encoded words when it is not ASCII"""
+    value = ' '.join(value.splitlines())
+    if value.isascii():
+        return value.encode('ascii')
+    words, word = [], b''
+    for char in value:
+        encoded = char.encode('utf-8')
+        if len(word) + len(encoded) > 39:  # 52 caracteres en base64: líneas de menos de 78
+            words.append(word)
+            word = b''
+        word += encoded
+    words.append(word)
+    return b'\r\n '.join(b'=?utf-8?b?' + base64.b64encode(word) + b'?=' for word in words)
+
+
+def _error(code, reply):
+    return f"{code} {reply.decode('utf-8', 'replace') if isinstance(reply, bytes) else reply}"
+
+
+class _Connection:
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.sent = 0
+        self.used_at = time.monotonic()
+        self.pipelining = smtp.has_extn('pipelining')
+
+
+class SMTPBackend(ChannelBackend):
+    method = 'email'
+
+    def __init__(self, host, port=25, username='', password='', use_tls=False, sender='', timeout=10,
+                 batch_size=None, pool_size=2, max_messages=500):
+        self._host = host
+        self._port = port
+        self.provider = f'{host}:{port}'
+        self._username = username
+        self._password = password
+        self._use_tls = use_tls
+        self._sender = sender or f'no-reply@{host}'
+        self._domain = self._sender.rpartition('@')[2] or host
+        self._timeout = timeout
+        self._pool_size = max(1, pool_size)
+        self._max_messages = max_messages
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self._pool_size)
+        self._executor = None
+        self._layouts = {}
+        if batch_size:
+            self.batch_size = batch_size
+
+    def address(self, user):
+        return user.email or None
+
+    # Pool
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self._host, self._port, timeout=self._timeout)
+        try:
+            smtp.ehlo()
+            if self._use_tls:
+                smtp.starttls()
+                smtp.ehlo()
+            if self._username:
+                smtp.login(self._username, self._password)
+        except Exception:
+            smtp.close()
+            raise
+        return _Connection(smtp)
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    connection = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if time.monotonic() - connection.used_at < IDLE_CHECK:
+                    return connection
+                try:
+                    connection.smtp.noop()
+                    return connection
+                except (smtplib.SMTPException, OSError):
+                    self._discard(connection)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, connection, broken=False):
+        try:
+            if broken or connection.sent >= self._max_messages:
+                self._discard(connection, quit=not broken)
+            else:
+                connection.used_at = time.monotonic()
+                self._idle.put(connection)
+        finally:
+            self._slots.release()
+
+    def _discard(self, connection, quit=False):
+        try:
+            if quit:
+                connection.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        connection.smtp.close()
+
+    # Mensajes
+
+    def _layout(self, language):
+        """(headers, encoded footer) for a language, compiled once"""
+        key = templates.language(language)
+        layout = self._layouts.get(key)
+        if layout is None:
+            headers = (
+                b'From: ' + _header(self._sender) + b'\r\n'
+                b'MIME-Version: 1.0\r\n'
+                b'Content-Type: text/plain; charset="utf-8"\r\n'
+                b'Content-Transfer-Encoding: quoted-printable\r\n'
+            )
+            footer = templates.for_language(key)['email.footer']()
+            layout = self._layouts[key] = (headers, _text(footer))
+        return layout
+
+    def _raw(self, message):
+        if not message.address.isascii() or any(c in message.address for c in '<>\r\n '):
+            raise ValueError(f'Invalid email address: {message.address!r}')
+        headers, footer = self._layout(message.language)
+        return b''.join((
+            headers,
+            b'To: ', message.address.encode('ascii'), b'\r\n',
+            b'Subject: ', _header(message.title), b'\r\n',
+            b'Date: ', formatdate(usegmt=True).encode('ascii'), b'\r\n',
+            b'Message-ID: ', make_msgid(domain=self._domain).encode('ascii'), b'\r\n',
+            b'\r\n',
+            _text(message.body), footer,
+        ))
+
+    def _data(self, raw):
+        data = _DOT.sub(b'..', raw)
+        if not data.endswith(b'\r\n'):
+            data += b'\r\n'
+        return data + b'.\r\n'
+
+    def _envelope(self, address):
+        return f'MAIL FROM:<{self._sender}>\r\nRCPT TO:<{address}>\r\nDATA\r\n'.encode('ascii')
+
+    def _send_pipelined(self, connection, messages, failures, done):
+        """One write and one read per message; ids with a final answer go to `done`"""
+        smtp = connection.smtp
+        pending, awaiting = b'', None
+        for message in messages:
+            try:
+                envelope = self._envelope(message.address)
+                raw = self._raw(message)
+            except (UnicodeError, ValueError) as e:
+                failures[message.notification_id] = str(e)
+                done.add(message.notification_id)
+                continue
+
+            smtp.send(pending + envelope)
+            if awaiting is not None:
+                code, reply = smtp.getreply()
+                if awaiting is not _RSET:
+                    if code != 250:
+                        failures[awaiting] = _error(code, reply)
+                    done.add(awaiting)
+                    connection.sent += 1
+
+            replies = [smtp.getreply() for _ in range(3)]
+            if replies[2][0] == 354:
+                pending, awaiting = self._data(raw), message.notification_id
+            else:
+                code, reply = next((r for r in replies if r[0] not in (250, 251)), replies[2])
+                failures[message.notification_id] = _error(code, reply)
+                done.add(message.notification_id)
+                pending, awaiting = b'RSET\r\n', _RSET
+
+        if awaiting is not None:
+            smtp.send(pending)
+            code, reply = smtp.getreply()
+            if awaiting is not _RSET:
+                if code != 250:
+                    failures[awaiting] = _error(code, reply)
+                done.add(awaiting)
+                connection.sent += 1
+
+    def _send_serial(self, connection, messages, failures, done):
+        for message in messages:
+            try:
+                connection.smtp.sendmail(self._sender, [message.address], self._raw(message))
+            except smtplib.SMTPRecipientsRefused as e:
+                code, reply = next(iter(e.recipients.values()))
+                failures[message.notification_id] = _error(code, reply)
+            except (smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                failures[message.notification_id] = _error(e.smtp_code, e.smtp_error)
+            except (UnicodeError, ValueError) as e:
+                failures[message.notification_id] = str(e)
+            done.add(message.notification_id)
+            connection.sent += 1
+
+    def _send_chunk(self, messages, retry_stale=True):
+        try:
+            connection = self._acquire()
+        except (smtplib.SMTPException, OSError) as e:
+            logger.error(f"Could not connect to SMTP server {self._host}:{self._port}: {str(e)}")
+            return {message.notification_id: str(e) for message in messages}
+
+        failures = {}
+        done = set()
+        reused = connection.sent > 0
+        broken = stale = False
+        try:
+            if connection.pipelining:
+                self._send_pipelined(connection, messages, failures, done)
+            else:
+                self._send_serial(connection, messages, failures, done)
+        except (smtplib.SMTPException, OSError) as e:
+            broken = True
+            # El servidor cerró una conexión reutilizada antes del primer mensaje
+            stale = retry_stale and reused and not done
+            if not stale:
+                # Conexión perdida: lo ya confirmado salió, el resto se reintenta
+                logger.error(f"SMTP connection lost after {len(done)} of {len(messages)} messages: {str(e)}")
+                for message in messages:
+                    if message.notification_id not in done:
+                        failures[message.notification_id] = str(e)
+        finally:
+            self._release(connection, broken)
+
+        if stale:
+            self._drop_idle()  # probablemente también están cerradas
+            return self._send_chunk(messages, retry_stale=False)
+        return failures
+
+    def send_batch(self, messages):
+        chunks = min(self._pool_size, len(messages))
+        if chunks <= 1:
+            return self._send_chunk(messages)
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self._pool_size, thread_name_prefix='smtp')
+        size = -(-len(messages) // chunks)
+        failures = {}
+        for result in self._executor.map(self._send_chunk, [messages[i:i + size] for i in range(0, len(messages), size)]):
+            failures.update(result)
+        return failures
+
+    def _drop_idle(self, quit=False):
+        while True:
+            try:
+                self._discard(self._idle.get_nowait(), quit)
+            except queue.Empty:
+                break
+
+    def close(self):
+        self._drop_idle(quit=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,49 @@
+"""
+Token buckets in Redis pacing each channel's provider.
+
+A bucket holds up to `burst` tokens and refills at `rate` tokens per second;
+one token is one message. The refill and the take run in a Lua script, so
+every worker draws from the same bucket atomically, using the Redis clock.
+Buckets are keyed by channel and provider (gateway host, SMTP host), so two
+channels on one provider are still limited separately.
+
+When Redis is unreachable the limiter lets everything through, like the
+other Redis-backed helpers.
+"""
+import logging
+from redis import RedisError
+from api.extensions import redis_client
+
+logger = logging.getLogger(__name__)
+
+_TAKE = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local wanted = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local granted = math.min(wanted, math.floor(tokens))
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens - granted), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return granted
+"""
+
+
+def _key(method, provider):
+    return f'ratelimit:{method}:{provider}'
+
+
+def take(method, provider, wanted, rate, burst):
+    """Take up to `wanted` tokens; returns how many messages may be sent now"""
+    if wanted <= 0:
+        return 0
+    try:
+        script = redis_client.register_script(_TAKE)
+        return int(script(keys=[_key(method, provider)], args=[rate, burst, wanted]))
+    except RedisError as e:
+        logger.warning(f"Rate limiter unavailable for {method}, not throttling: {str(e)}")
+        return wanted
@@ -0,0 +1,97 @@
+import click
+from collections import defaultdict
+from flask.cli import with_appcontext
+from sqlalchemy import update
+from api.extensions import db
+from api.models import Medication, UserMedication, Prescription
+from api.utils.catalog_cache import catalog_reloaded
+from api.utils.catalog_import import import_catalog, iter_records, detect_format
+from api.utils.normalization import normalize_barcode, normalize_medication_name, normalize_strength
+
+
+@click.command('import-medications')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension')
+@click.option('--dry-run', is_flag=True, help='Validate and count without writing')
+@click.option('--batch-size', default=50000, show_default=True, help='Rows per COPY batch')
+@with_appcontext
+def import_medications_command(path, fmt, dry_run, batch_size):
+    """Bulk import a medication catalog from a CSV or JSONL file"""
+    def progress(staged, elapsed):
+        rate = int(staged / elapsed) if elapsed > 0 else staged
+        click.echo(f"  staged {staged} rows ({rate} rows/s)")
+
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        records = iter_records(stream, fmt or detect_format(path))
+        report = import_catalog(records, dry_run=dry_run, batch_size=batch_size, progress=progress)
+
+    prefix = '[dry run] ' if dry_run else ''
+    click.echo(
+        f"{prefix}{report['staged']} rows staged, {report['rejected']} rejected, "
+        f"{report['duplicates']} duplicates, {report['updated']} updated, "
+        f"{report['inserted']} inserted in {report['seconds']}s ({report['rows_per_second']} rows/s)"
+    )
+    for error in report['errors']:
+        click.echo(f"  line {error['line']}: {error['error']} ({error['name']!r}, criticality={error['criticality']!r})")
+
+
+@click.command('normalize-medications')
+@with_appcontext
+def normalize_medications_command():
+    """Backfill normalized name/barcode keys and merge duplicate catalog entries"""
+    rows = db.session.query(
+        Medication.id,
+        Medication.name,
+        Medication.strength,
+        Medication.barcode,
+        Medication.is_active
+    ).order_by(Medication.id).all()
+
+    keys = []
+    seen_barcodes = set()
+    by_name = defaultdict(list)
+    for row in rows:
+        normalized_barcode = normalize_barcode(row.barcode) or None
+        if normalized_barcode in seen_barcodes:
+            click.echo(f"  medication {row.id}: barcode {row.barcode!r} already used, key left empty")
+            normalized_barcode = None
+        elif normalized_barcode:
+            seen_barcodes.add(normalized_barcode)
+        normalized_name = normalize_medication_name(row.name) or None
+        normalized_strength = normalize_strength(row.name, row.strength)
+        keys.append({
+            'id': row.id,
+            'normalized_name': normalized_name,
+            'normalized_strength': normalized_strength,
+            'normalized_barcode': normalized_barcode
+        })
+        # Solo son duplicados el mismo nombre con la misma dosis
+        if row.is_active and normalized_name and not normalized_barcode:
+            by_name[normalized_name, normalized_strength].append(row.id)
+
+    # Keep the oldest entry of each duplicate group and point references at it
+    merged = 0
+    for ids in by_name.values():
+        keeper, duplicates = ids[0], ids[1:]
+        if not duplicates:
+            continue
+        UserMedication.query.filter(UserMedication.medication_id.in_(duplicates)).update(
+            {'medication_id': keeper}, synchronize_session=False
+        )
+        Prescription.query.filter(Prescription.medication_id.in_(duplicates)).update(
+            {'medication_id': keeper}, synchronize_session=False
+        )
+        Medication.query.filter(Medication.id.in_(duplicates)).update(
+            {'is_active': False}, synchronize_session=False
+        )
+        merged += len(duplicates)
+
+    if keys:
+        db.session.execute(update(Medication), keys)
+    db.session.commit()
+
+    for index in Medication.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+
+    catalog_reloaded()
+    click.echo(f"Normalized {len(keys)} medications, merged {merged} duplicates")
@@ -17,6 +17,9 @@ class Config:
     DEBUG = os.getenv('FLASK_ENV') == 'development'
     SECRET_KEY = os.getenv('SECRET_KEY', 'your-flask-secret-key')
     
+    # Users allowed to run admin endpoints (comma separated ids)
+    ADMIN_USER_IDS = {int(i) for i in os.getenv('ADMIN_USER_IDS', '').split(',') if i.strip()}
+    
     # OpenAI
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
     
@@ -28,3 +31,71 @@ class Config:
     CELERY_BROKER_URL = "redis://redis:6379/0"
     CELERY_RESULT_BACKEND = "redis://redis:6379/0"
 
+    # Redis (shared counters and caches)
+    REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
+
+    # Medication autocomplete
+    AUTOCOMPLETE_WARM_START = os.getenv('AUTOCOMPLETE_WARM_START', 'true').lower() == 'true'
+    AUTOCOMPLETE_MAX_RESULTS = 20
+    AUTOCOMPLETE_POPULARITY_TTL = 300  # seconds between popularity refreshes
+
+    # Medication catalog cache (per worker)
+    CATALOG_CACHE_SIZE = int(os.getenv('CATALOG_CACHE_SIZE', 5000))
+    CATALOG_CACHE_CHECK_INTERVAL = 1  # seconds between catalog version checks
+    BARCODE_LOOKUP_MAX = 500  # codes per batch lookup
+
+    # Per-section Server-Timing header on the dashboard (always on in debug)
+    SERVER_TIMING = os.getenv('SERVER_TIMING', 'false').lower() == 'true'
+
+    # Reminder occurrences (calendar) endpoint
+    OCCURRENCES_MAX_DAYS = 92
+    OCCURRENCES_MAX_RESULTS = 5000
+    OCCURRENCES_CACHE_TTL = 600  # seconds
+
+    # Scheduled reminder fires older than this are dropped by the dispatcher
+    DUE_REMINDERS_MAX_DELAY = 3600  # seconds
+    # Claimed fires not acked after this are claimed again (broker error, crash)
+    DUE_REMINDERS_CLAIM_TIMEOUT = 60  # seconds
+
+    # Notification providers (channels without one only log the messages)
+    PUSH_GATEWAY_URL = os.getenv('PUSH_GATEWAY_URL', '')
+    PUSH_GATEWAY_TOKEN = os.getenv('PUSH_GATEWAY_TOKEN', '')
+    SMS_GATEWAY_URL = os.getenv('SMS_GATEWAY_URL', '')
+    SMS_GATEWAY_TOKEN = os.getenv('SMS_GATEWAY_TOKEN', '')
+    SMTP_HOST = os.getenv('SMTP_HOST', '')
+    SMTP_PORT = int(os.getenv('SMTP_PORT', 25))
+    SMTP_USERNAME = os.getenv('SMTP_USERNAME', '')
+    SMTP_PASSWORD = os.getenv('SMTP_PASSWORD', '')
+    SMTP_USE_TLS = os.getenv('SMTP_USE_TLS', 'false').lower() == 'true'
+    MAIL_FROM = os.getenv('MAIL_FROM', '')
+    SMTP_POOL_SIZE = int(os.getenv('SMTP_POOL_SIZE', 2))  # connections per worker
+    SMTP_MAX_MESSAGES_PER_CONNECTION = 500
+    NOTIFICATION_BATCH_SIZE = int(os.getenv('NOTIFICATION_BATCH_SIZE', 100))  # messages per provider call
+    # Provider pacing per channel: (messages per second, burst), shared by all workers
+    NOTIFICATION_RATE_LIMITS = {
+        'push': (500, 1000),
+        'email': (50, 200),
+        'sms': (10, 50),
+    }
+    NOTIFICATION_MAX_RETRIES = 3
+    NOTIFICATION_RETRY_BASE_DELAY = 60  # seconds, doubled on every attempt (with jitter)
+    NOTIFICATION_RETRY_MAX_DELAY = 3600
+
+    # Unread notification counters in Redis (recounted after expiring or drifting)
+    UNREAD_COUNT_TTL = 86400  # seconds
+
+    # Server-sent event stream of new notifications (one gunicorn thread per open stream)
+    NOTIFICATION_STREAM_MAX_DURATION = 300  # seconds, then the client reconnects
+    NOTIFICATION_STREAM_HEARTBEAT = 15  # seconds between keep-alive comments
+    # Open streams per worker process; keep it below gunicorn's --threads so
+    # streams never take the threads that serve the other requests
+    NOTIFICATION_STREAM_MAX_PER_WORKER = int(os.getenv('NOTIFICATION_STREAM_MAX_PER_WORKER', 30))
+
+    # ICS feed cache (rebuilt when the user's reminders change; TTL only frees memory)
+    CALENDAR_CACHE_TTL = 86400  # seconds
+
+    # Response compression (smaller bodies are sent as is)
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_GZIP_LEVEL = 6
+    COMPRESS_BROTLI_QUALITY = 4
+
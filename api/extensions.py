@@ -2,9 +2,33 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from celery import Celery
+import redis
 
 celery = Celery(__name__)
 
+
+class RedisClient:
+    """Redis connection bound to the app config (REDIS_URL)"""
+
+    def __init__(self):
+        self._client = None
+
+    def init_app(self, app):
+        self._client = redis.Redis.from_url(
+            app.config['REDIS_URL'],
+            decode_responses=True,
+            socket_timeout=1,
+            socket_connect_timeout=1
+        )
+        app.extensions['redis'] = self
+
+    def __getattr__(self, name):
+        if self._client is None:
+            raise RuntimeError('Redis client is not initialized')
+        return getattr(self._client, name)
+
+
 db = SQLAlchemy()
 jwt = JWTManager()
 cors = CORS()
+redis_client = RedisClient()
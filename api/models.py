@@ -1,9 +1,21 @@
 from api.extensions import db
+from api.utils.normalization import normalize_barcode, normalize_medication_name, normalize_strength
+from api.utils.serializers import SerializerMixin
+from sqlalchemy.orm import validates
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 
-class User(db.Model):
+# Peso numérico de la criticidad para métricas
+CRITICALITY_WEIGHTS = {
+    'low': 1,
+    'medium': 2,
+    'high': 3,
+    'critical': 4
+}
+
+class User(SerializerMixin, db.Model):
     __tablename__ = 'users'
+    __serializer_exclude__ = ('password_hash', 'reset_token', 'reset_token_expiry', 'calendar_key')
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False, index=True)
@@ -20,6 +32,7 @@ class User(db.Model):
     email_verified = db.Column(db.Boolean, default=False)
     reset_token = db.Column(db.String(100), nullable=True, unique=True)
     reset_token_expiry = db.Column(db.DateTime, nullable=True)
+    calendar_key = db.Column(db.String(32), nullable=True)  # in the ICS feed URL; replaced to revoke it
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     last_login = db.Column(db.DateTime)
@@ -36,31 +49,29 @@ class User(db.Model):
     
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'username': self.username,
-            'email': self.email,
-            'first_name': self.first_name,
-            'last_name': self.last_name,
-            'phone': self.phone,
-            'date_of_birth': self.date_of_birth.isoformat() if self.date_of_birth else None,
-            'gender': self.gender,
-            'language': self.language,
-            'profile_image_url': self.profile_image_url,
-            'is_active': self.is_active,
-            'email_verified': self.email_verified,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'last_login': self.last_login.isoformat() if self.last_login else None
-        }
 
-class Medication(db.Model):
+class Medication(SerializerMixin, db.Model):
     __tablename__ = 'medications'
+    __serializer_exclude__ = ('normalized_name', 'normalized_strength', 'normalized_barcode')
+    __table_args__ = (
+        # Un solo medicamento activo sin código de barras por nombre y dosis normalizados
+        db.Index(
+            'uq_medications_normalized_name',
+            'normalized_name',
+            'normalized_strength',
+            unique=True,
+            postgresql_where=db.text('normalized_barcode IS NULL AND is_active'),
+            sqlite_where=db.text('normalized_barcode IS NULL AND is_active')
+        ),
+        db.Index('ix_medications_normalized_name', 'normalized_name'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
+    # Clave de búsqueda del nombre (ver normalize_medication_name)
+    normalized_name = db.Column(db.String(200))
+    # Dosis de la clave (ver normalize_strength); '' si no tiene
+    normalized_strength = db.Column(db.String(100), nullable=False, default='', server_default='')
     generic_name = db.Column(db.String(200))
     brand_name = db.Column(db.String(200))
     description = db.Column(db.Text)
@@ -72,6 +83,8 @@ class Medication(db.Model):
     contraindications = db.Column(db.Text)
     storage_instructions = db.Column(db.Text)
     barcode = db.Column(db.String(100))
+    # Clave canónica del código de barras / NDC (ver normalize_barcode)
+    normalized_barcode = db.Column(db.String(100), unique=True, index=True)
     image_url = db.Column(db.Text)
     requires_prescription = db.Column(db.Boolean, default=True)
     
@@ -89,40 +102,27 @@ class Medication(db.Model):
     # Relationships
     user_medications = db.relationship('UserMedication', back_populates='medication', cascade='all, delete-orphan')
 
+    @validates('name')
+    def validate_name(self, key, name):
+        self.normalized_name = normalize_medication_name(name) or None
+        self.normalized_strength = normalize_strength(name, self.strength)
+        return name
+
+    @validates('strength')
+    def validate_strength(self, key, strength):
+        self.normalized_strength = normalize_strength(self.name, strength)
+        return strength
+
+    @validates('barcode')
+    def validate_barcode(self, key, barcode):
+        self.normalized_barcode = normalize_barcode(barcode) or None
+        return barcode
+
     def get_criticality_weight(self):
         """Retorna el peso numérico de la criticidad para métricas"""
-        weights = {
-            'low': 1,
-            'medium': 2,
-            'high': 3,
-            'critical': 4
-        }
-        return weights.get(self.criticality, 2)
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'generic_name': self.generic_name,
-            'brand_name': self.brand_name,
-            'description': self.description,
-            'manufacturer': self.manufacturer,
-            'dosage_form': self.dosage_form,
-            'strength': self.strength,
-            'route_of_administration': self.route_of_administration,
-            'uses': self.uses,
-            'contraindications': self.contraindications,
-            'storage_instructions': self.storage_instructions,
-            'barcode': self.barcode,
-            'image_url': self.image_url,
-            'requires_prescription': self.requires_prescription,
-            'criticality': self.criticality,  # NUEVO
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        return CRITICALITY_WEIGHTS.get(self.criticality, 2)
 
-class Doctor(db.Model):
+class Doctor(SerializerMixin, db.Model):
     __tablename__ = 'doctors'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -141,24 +141,8 @@ class Doctor(db.Model):
     # Relationships
     user_doctors = db.relationship('UserDoctor', back_populates='doctor', cascade='all, delete-orphan')
     prescriptions = db.relationship('Prescription', back_populates='doctor', cascade='all, delete-orphan')
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'first_name': self.first_name,
-            'last_name': self.last_name,
-            'specialty': self.specialty,
-            'license_number': self.license_number,
-            'phone': self.phone,
-            'email': self.email,
-            'address': self.address,
-            'notes': self.notes,
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
 
-class UserMedication(db.Model):
+class UserMedication(SerializerMixin, db.Model):
     __tablename__ = 'user_medications'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -179,25 +163,8 @@ class UserMedication(db.Model):
     user = db.relationship('User', back_populates='medications')
     medication = db.relationship('Medication', back_populates='user_medications')
     reminders = db.relationship('Reminder', back_populates='user_medication', cascade='all, delete-orphan')
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'medication_id': self.medication_id,
-            'custom_name': self.custom_name,
-            'prescribed_dosage': self.prescribed_dosage,
-            'prescribed_frequency': self.prescribed_frequency,
-            'start_date': self.start_date.isoformat() if self.start_date else None,
-            'end_date': self.end_date.isoformat() if self.end_date else None,
-            'doctor_instructions': self.doctor_instructions,
-            'notes': self.notes,
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
 
-class UserDoctor(db.Model):
+class UserDoctor(SerializerMixin, db.Model):
     __tablename__ = 'user_doctors'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -214,22 +181,8 @@ class UserDoctor(db.Model):
     # Relationships
     user = db.relationship('User', back_populates='doctors')
     doctor = db.relationship('Doctor', back_populates='user_doctors')
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'doctor_id': self.doctor_id,
-            'relationship_type': self.relationship_type,
-            'is_primary': self.is_primary,
-            'relationship_start_date': self.relationship_start_date.isoformat() if self.relationship_start_date else None,
-            'relationship_end_date': self.relationship_end_date.isoformat() if self.relationship_end_date else None,
-            'notes': self.notes,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
 
-class Prescription(db.Model):
+class Prescription(SerializerMixin, db.Model):
     __tablename__ = 'prescriptions'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -251,28 +204,8 @@ class Prescription(db.Model):
     
     # Relationships
     doctor = db.relationship('Doctor', back_populates='prescriptions')
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'doctor_id': self.doctor_id,
-            'medication_id': self.medication_id,
-            'prescription_number': self.prescription_number,
-            'prescribed_date': self.prescribed_date.isoformat() if self.prescribed_date else None,
-            'expiry_date': self.expiry_date.isoformat() if self.expiry_date else None,
-            'dosage': self.dosage,
-            'frequency': self.frequency,
-            'quantity': self.quantity,
-            'refills_remaining': self.refills_remaining,
-            'instructions': self.instructions,
-            'status': self.status,
-            'notes': self.notes,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
 
-class Reminder(db.Model):
+class Reminder(SerializerMixin, db.Model):
     __tablename__ = 'reminders'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -296,34 +229,15 @@ class Reminder(db.Model):
     # Relationships
     user_medication = db.relationship('UserMedication', back_populates='reminders')
     reminder_logs = db.relationship('ReminderLog', back_populates='reminder', cascade='all, delete-orphan')
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'user_medication_id': self.user_medication_id,
-            'title': self.title,
-            'description': self.description,
-            'reminder_time': self.reminder_time.isoformat() if self.reminder_time else None,
-            'time_of_week': self.time_of_week,
-            'frequency_type': self.frequency_type,
-            'frequency_value': self.frequency_value,
-            'start_date': self.start_date.isoformat() if self.start_date else None,
-            'end_date': self.end_date.isoformat() if self.end_date else None,
-            'is_active': self.is_active,
-            'event_enabled': self.event_enabled,
-            'calendar_reminder': self.calendar_reminder,
-            'push_notification': self.push_notification,
-            'email_notification': self.email_notification,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
 
-class ReminderLog(db.Model):
+class ReminderLog(SerializerMixin, db.Model):
     __tablename__ = 'reminder_logs'
     
     id = db.Column(db.Integer, primary_key=True)
     reminder_id = db.Column(db.Integer, db.ForeignKey('reminders.id'), nullable=False)
     scheduled_time = db.Column(db.DateTime)
+    # Dosis pospuesta: nuevo plazo para darla por perdida (scheduled_time no cambia)
+    snoozed_until = db.Column(db.DateTime, index=True)
     actual_time = db.Column(db.DateTime)
     status = db.Column(db.Enum('pending', 'sent', 'acknowledged', 'missed', name='reminder_status_enum'))
     notes = db.Column(db.Text)
@@ -332,20 +246,8 @@ class ReminderLog(db.Model):
     
     # Relationships
     reminder = db.relationship('Reminder', back_populates='reminder_logs')
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'reminder_id': self.reminder_id,
-            'scheduled_time': self.scheduled_time.isoformat() if self.scheduled_time else None,
-            'actual_time': self.actual_time.isoformat() if self.actual_time else None,
-            'status': self.status,
-            'notes': self.notes,
-            'log_metadata': self.log_metadata,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
 
-class MediaFile(db.Model):
+class MediaFile(SerializerMixin, db.Model):
     __tablename__ = 'media_files'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -357,33 +259,15 @@ class MediaFile(db.Model):
     file_type = db.Column(db.String(50))
     mime_type = db.Column(db.String(100))
     file_size = db.Column(db.BigInteger)
-    file_metadata = db.Column(db.JSON)
+    # Blobs JSON: solo se cargan cuando se piden (undefer_group('details'))
+    file_metadata = db.deferred(db.Column(db.JSON), group='details')
     description = db.Column(db.Text)
     is_processed = db.Column(db.Boolean, default=False)
-    ai_analysis_result = db.Column(db.JSON)
+    ai_analysis_result = db.deferred(db.Column(db.JSON), group='details')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'related_entity_id': self.related_entity_id,
-            'related_entity_type': self.related_entity_type,
-            'original_name': self.original_name,
-            'file_path': self.file_path,
-            'file_type': self.file_type,
-            'mime_type': self.mime_type,
-            'file_size': self.file_size,
-            'file_metadata': self.file_metadata,
-            'description': self.description,
-            'is_processed': self.is_processed,
-            'ai_analysis_result': self.ai_analysis_result,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
 
-class UserSetting(db.Model):
+class UserSetting(SerializerMixin, db.Model):
     __tablename__ = 'user_settings'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -397,20 +281,8 @@ class UserSetting(db.Model):
     
     # Relationships
     user = db.relationship('User', back_populates='settings')
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'setting_key': self.setting_key,
-            'setting_value': self.setting_value,
-            'data_type': self.data_type,
-            'description': self.description,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
 
-class ActivityLog(db.Model):
+class ActivityLog(SerializerMixin, db.Model):
     __tablename__ = 'activity_logs'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -418,8 +290,9 @@ class ActivityLog(db.Model):
     entity_type = db.Column(db.String(50))
     entity_id = db.Column(db.Integer)
     action = db.Column(db.String(50))
-    old_data = db.Column(db.JSON)
-    new_data = db.Column(db.JSON)
+    # Blobs JSON: solo se cargan cuando se piden (undefer_group('details'))
+    old_data = db.deferred(db.Column(db.JSON), group='details')
+    new_data = db.deferred(db.Column(db.JSON), group='details')
     ip_address = db.Column(db.String(50))
     user_agent = db.Column(db.Text)
     description = db.Column(db.Text)
@@ -427,23 +300,8 @@ class ActivityLog(db.Model):
     
     # Relationships
     user = db.relationship('User', back_populates='activity_logs')
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'entity_type': self.entity_type,
-            'entity_id': self.entity_id,
-            'action': self.action,
-            'old_data': self.old_data,
-            'new_data': self.new_data,
-            'ip_address': self.ip_address,
-            'user_agent': self.user_agent,
-            'description': self.description,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
 
-class EmergencyContact(db.Model):
+class EmergencyContact(SerializerMixin, db.Model):
     __tablename__ = 'emergency_contacts'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -459,23 +317,15 @@ class EmergencyContact(db.Model):
     
     # Relationships
     user = db.relationship('User', back_populates='emergency_contacts')
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'name': self.name,
-            'relationship': self.relationship,
-            'phone': self.phone,
-            'email': self.email,
-            'is_primary': self.is_primary,
-            'notify_missed_doses': self.notify_missed_doses,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
 
-class Notification(db.Model):
+class Notification(SerializerMixin, db.Model):
     __tablename__ = 'notifications'
+    __table_args__ = (
+        # Notificaciones listas para enviar (dispatch_notifications)
+        db.Index('ix_notifications_status_scheduled_at', 'status', 'scheduled_at'),
+        # Recuento de no leídas por usuario (api.utils.unread)
+        db.Index('ix_notifications_user_id_read_at', 'user_id', 'read_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -484,6 +334,8 @@ class Notification(db.Model):
     title = db.Column(db.String(200))
     message = db.Column(db.Text)
     delivery_method = db.Column(db.Enum('push', 'email', 'sms', name='delivery_method_enum'))
+    # Dirección de otra persona (contacto de emergencia); None = la del usuario
+    recipient = db.Column(db.String(120))
     scheduled_at = db.Column(db.DateTime)
     sent_at = db.Column(db.DateTime)
     read_at = db.Column(db.DateTime)
@@ -491,26 +343,8 @@ class Notification(db.Model):
     retry_count = db.Column(db.Integer, default=0)
     error_message = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'reminder_id': self.reminder_id,
-            'notification_type': self.notification_type,
-            'title': self.title,
-            'message': self.message,
-            'delivery_method': self.delivery_method,
-            'scheduled_at': self.scheduled_at.isoformat() if self.scheduled_at else None,
-            'sent_at': self.sent_at.isoformat() if self.sent_at else None,
-            'read_at': self.read_at.isoformat() if self.read_at else None,
-            'status': self.status,
-            'retry_count': self.retry_count,
-            'error_message': self.error_message,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
 
-class MedicationIntake(db.Model):
+class MedicationIntake(SerializerMixin, db.Model):
     __tablename__ = 'medication_intake'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -522,16 +356,3 @@ class MedicationIntake(db.Model):
     notes = db.Column(db.Text)
     side_effects_reported = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'user_medication_id': self.user_medication_id,
-            'reminder_log_id': self.reminder_log_id,
-            'status_at': self.status_at.isoformat() if self.status_at else None,
-            'dosage_taken': self.dosage_taken,
-            'status': self.status,
-            'notes': self.notes,
-            'side_effects_reported': self.side_effects_reported,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
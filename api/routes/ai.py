@@ -4,6 +4,7 @@ from werkzeug.utils import secure_filename
 from api.extensions import db
 from api.models import MediaFile
 from api.utils.image_analyzer import ImageAnalyzer
+from api.utils.catalog_cache import find_by_barcodes, find_by_names
 import os
 from datetime import datetime
 
@@ -64,6 +65,16 @@ def analyze_prescription():
                 'file_path': f'/uploads/{filename}'
             }), 422
         
+        # Match each extracted medication against the catalog by normalized name
+        extracted = analysis_result['data'].get('medications') or []
+        matches = find_by_names(
+            [med.get('name') for med in extracted] + [med.get('generic_name') for med in extracted]
+        )
+        catalog_matches = [
+            matches.get(med.get('name')) or matches.get(med.get('generic_name'))
+            for med in extracted
+        ]
+        
         # Save media file record
         media_file = MediaFile(
             user_id=current_user_id,
@@ -82,6 +93,7 @@ def analyze_prescription():
         return jsonify({
             'message': 'Image analyzed successfully',
             'analysis': analysis_result['data'],
+            'catalog_matches': catalog_matches,
             'confidence': analysis_result.get('confidence', 'medium'),
             'media_file_id': media_file.id,
             'file_path': f'/uploads/{filename}'
@@ -217,10 +229,21 @@ def analyze_medication():
 def analyze_medication_bottle():
     """
     Analyze medication bottle/package image
-    Expects multipart/form-data with an 'image' file
+    Expects multipart/form-data with an 'image' file and an optional scanned 'barcode'
     """
     current_user_id = int(get_jwt_identity())
     
+    # A scanned barcode that is already in the catalog needs no image analysis
+    scanned_code = request.form.get('barcode')
+    if scanned_code:
+        catalog_medication = find_by_barcodes([scanned_code]).get(scanned_code)
+        if catalog_medication:
+            return jsonify({
+                'message': 'Medication found in catalog',
+                'analysis': None,
+                'catalog_medication': catalog_medication
+            }), 200
+    
     if 'image' not in request.files:
         return jsonify({'error': 'No image file provided'}), 400
     
@@ -255,6 +278,16 @@ def analyze_medication_bottle():
                 'file_path': f'/uploads/{filename}'
             }), 422
         
+        # Match the NDC printed on the label against the catalog, then the name
+        analysis = analysis_result['data']
+        catalog_medication = None
+        ndc_code = analysis.get('ndc_code')
+        if ndc_code:
+            catalog_medication = find_by_barcodes([ndc_code]).get(ndc_code)
+        if not catalog_medication:
+            matches = find_by_names([analysis.get('name'), analysis.get('generic_name')])
+            catalog_medication = matches.get(analysis.get('name')) or matches.get(analysis.get('generic_name'))
+        
         # Save media file record
         media_file = MediaFile(
             user_id=current_user_id,
@@ -273,6 +306,7 @@ def analyze_medication_bottle():
         return jsonify({
             'message': 'Medication bottle analyzed successfully',
             'analysis': analysis_result['data'],
+            'catalog_medication': catalog_medication,
             'media_file_id': media_file.id,
             'file_path': f'/uploads/{filename}'
         }), 200
@@ -0,0 +1,132 @@
+from flask import Blueprint, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from api.extensions import db
+from api.models import Reminder, ReminderLog, UserMedication, MedicationIntake
+from api.utils.catalog_cache import medication_cache
+from api.utils.serializers import serializer_for
+from api.utils.schedule import occurs_on
+from api.utils.adherence import daily_adherence
+from api.utils.unread import get_unread
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import time
+
+dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/api/dashboard')
+
+# Campos del medicamento incluidos en el dashboard
+MEDICATION_SUMMARY_FIELDS = ('id', 'name', 'generic_name', 'strength', 'dosage_form', 'criticality', 'image_url')
+ADHERENCE_DAYS = 7
+
+
+class _SectionTimer:
+    """Collects per-section durations for the Server-Timing header"""
+
+    def __init__(self):
+        self.sections = []
+
+    @contextmanager
+    def section(self, name):
+        started = time.perf_counter()
+        yield
+        self.sections.append((name, (time.perf_counter() - started) * 1000))
+
+    def header(self):
+        return ', '.join(f'{name};dur={ms:.2f}' for name, ms in self.sections)
+
+
+def _dose_status(log_status, intake_status, dose_time, now):
+    if intake_status:
+        return intake_status
+    if log_status:
+        return log_status
+    return 'upcoming' if dose_time > now else 'due'
+
+
+@dashboard_bp.route('', methods=['GET'])
+@jwt_required()
+def get_dashboard():
+    """
+    Everything the app shows on launch in one response: active medications,
+    today's doses, unread notifications and a 7-day adherence strip
+    """
+    current_user_id = int(get_jwt_identity())
+    now = datetime.utcnow()
+    today = now.date()
+    day_start = datetime.combine(today, datetime.min.time())
+    timer = _SectionTimer()
+
+    with timer.section('medications'):
+        serializer = serializer_for(UserMedication)
+        user_meds = db.session.query(*serializer.columns()).filter(
+            UserMedication.user_id == current_user_id,
+            UserMedication.is_active == True
+        ).all()
+        catalog = medication_cache.get_many(um.medication_id for um in user_meds)
+        medications = []
+        for um in user_meds:
+            item = serializer.dump_row(um)
+            medication = catalog.get(um.medication_id)
+            if medication:
+                item['medication'] = {field: medication[field] for field in MEDICATION_SUMMARY_FIELDS}
+            medications.append(item)
+
+    with timer.section('doses'):
+        names = {
+            um.id: um.custom_name or catalog.get(um.medication_id, {}).get('name')
+            for um in user_meds
+        }
+        reminders = db.session.query(Reminder).filter(
+            Reminder.user_medication_id.in_(names.keys()),
+            Reminder.is_active == True
+        ).all()
+        todays = [r for r in reminders if r.reminder_time and occurs_on(r, today)]
+
+        # Último registro de hoy por recordatorio, con la toma asociada si existe
+        logs = {}
+        if todays:
+            rows = db.session.query(
+                ReminderLog.reminder_id,
+                ReminderLog.id,
+                ReminderLog.status,
+                MedicationIntake.id,
+                MedicationIntake.status
+            ).outerjoin(
+                MedicationIntake, MedicationIntake.reminder_log_id == ReminderLog.id
+            ).filter(
+                ReminderLog.reminder_id.in_([r.id for r in todays]),
+                ReminderLog.scheduled_time >= day_start
+            ).order_by(ReminderLog.scheduled_time).all()
+            logs = {row[0]: row for row in rows}
+
+        doses = []
+        for reminder in sorted(todays, key=lambda r: r.reminder_time):
+            dose_time = datetime.combine(today, reminder.reminder_time)
+            _, log_id, log_status, intake_id, intake_status = logs.get(reminder.id, (None,) * 5)
+            doses.append({
+                'reminder_id': reminder.id,
+                'user_medication_id': reminder.user_medication_id,
+                'medication_name': names.get(reminder.user_medication_id),
+                'title': reminder.title,
+                'scheduled_at': dose_time.isoformat(),
+                'status': _dose_status(log_status, intake_status, dose_time, now),
+                'reminder_log_id': log_id,
+                'intake_id': intake_id
+            })
+
+    with timer.section('notifications'):
+        unread = get_unread(current_user_id)
+
+    with timer.section('adherence'):
+        pairs = [(um, catalog[um.medication_id]) for um in user_meds if um.medication_id in catalog]
+        adherence = daily_adherence(pairs, today - timedelta(days=ADHERENCE_DAYS - 1), ADHERENCE_DAYS)
+
+    response = jsonify({
+        'date': today.isoformat(),
+        'medications': medications,
+        'doses': doses,
+        'unread_notifications': unread,
+        'adherence': adherence
+    })
+    if current_app.debug or current_app.config.get('SERVER_TIMING'):
+        response.headers['Server-Timing'] = timer.header()
+    return response, 200
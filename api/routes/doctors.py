@@ -2,9 +2,14 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from api.extensions import db
 from api.models import Doctor, UserDoctor
+from api.utils.fields import requested_fields, FieldsError
+from api.utils.includes import requested_includes, loader_options, dump_included
 
 doctors_bp = Blueprint('doctors', __name__, url_prefix='/api/doctors')
 
+# Relaciones aceptadas en ?include= (/api/doctors/user)
+USER_DOCTOR_INCLUDES = ('doctor',)
+
 # Doctor CRUD
 @doctors_bp.route('', methods=['GET'])
 @jwt_required()
@@ -14,7 +19,12 @@ def get_doctors():
     per_page = request.args.get('per_page', 20, type=int)
     search = request.args.get('search', '')
     
-    query = Doctor.query.filter_by(is_active=True)
+    try:
+        selection = requested_fields(Doctor)
+    except FieldsError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query = selection.apply(Doctor.query.filter_by(is_active=True), Doctor)
     
     if search:
         query = query.filter(
@@ -28,7 +38,7 @@ def get_doctors():
     pagination = query.paginate(page=page, per_page=per_page, error_out=False)
     
     return jsonify({
-        'doctors': [doc.to_dict() for doc in pagination.items],
+        'doctors': [doc.to_dict(selection.fields) for doc in pagination.items],
         'total': pagination.total,
         'page': page,
         'per_page': per_page,
@@ -118,16 +128,18 @@ def get_user_doctors():
     """Get current user's doctors"""
     current_user_id = int(get_jwt_identity())
     
-    user_doctors = UserDoctor.query.filter_by(user_id=current_user_id).all()
+    try:
+        includes = requested_includes(USER_DOCTOR_INCLUDES)
+    except FieldsError as e:
+        return jsonify({'error': str(e)}), 400
     
-    result = []
-    for ud in user_doctors:
-        user_doc_dict = ud.to_dict()
-        if ud.doctor:
-            user_doc_dict['doctor'] = ud.doctor.to_dict()
-        result.append(user_doc_dict)
+    # El médico siempre se incluye; ?include= solo amplía lo que cuelga de él
+    includes.setdefault('doctor', {})
+    user_doctors = UserDoctor.query.options(
+        *loader_options(UserDoctor, includes)
+    ).filter_by(user_id=current_user_id).all()
     
-    return jsonify({'doctors': result}), 200
+    return jsonify({'doctors': [dump_included(ud, includes) for ud in user_doctors]}), 200
 
 @doctors_bp.route('/user/<int:id>', methods=['GET'])
 @jwt_required()
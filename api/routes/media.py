@@ -2,6 +2,8 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from api.extensions import db
 from api.models import MediaFile
+from api.utils.fields import requested_fields, FieldsError
+from sqlalchemy.orm import undefer_group
 
 media_bp = Blueprint('media', __name__, url_prefix='/api/media')
 
@@ -16,7 +18,13 @@ def get_media_files():
     entity_type = request.args.get('entity_type')
     entity_id = request.args.get('entity_id', type=int)
     
-    query = MediaFile.query.filter_by(user_id=current_user_id)
+    # ai_analysis_result y file_metadata solo con ?include=
+    try:
+        selection = requested_fields(MediaFile)
+    except FieldsError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query = selection.apply(MediaFile.query.filter_by(user_id=current_user_id), MediaFile)
     
     if entity_type:
         query = query.filter_by(related_entity_type=entity_type)
@@ -29,7 +37,7 @@ def get_media_files():
     )
     
     return jsonify({
-        'media_files': [mf.to_dict() for mf in pagination.items],
+        'media_files': [mf.to_dict(selection.fields) for mf in pagination.items],
         'total': pagination.total,
         'page': page,
         'per_page': per_page,
@@ -42,7 +50,7 @@ def get_media_file(id):
     """Get a specific media file"""
     current_user_id = int(get_jwt_identity())
     
-    media_file = MediaFile.query.filter_by(
+    media_file = MediaFile.query.options(undefer_group('details')).filter_by(
         id=id,
         user_id=current_user_id
     ).first_or_404()
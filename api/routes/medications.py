@@ -1,22 +1,135 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from api.extensions import db
 from datetime import datetime, timedelta
-from api.models import Medication, UserMedication, MedicationIntake
+from api.models import Medication, UserMedication, MedicationIntake, CRITICALITY_WEIGHTS
+from api.utils.catalog_cache import medication_cache, catalog_changed, find_by_barcodes
+from api.utils.catalog_import import import_catalog, iter_records, detect_format
+from api.utils.normalization import normalize_barcode, normalize_medication_name, normalize_strength, split_dosage
+from api.utils.auth import admin_required
+from api.utils.serializers import serializer_for
+from api.utils.fields import requested_fields, FieldsError
+from api.utils.includes import requested_includes, loader_options, dump_included
+from api.utils.http_cache import conditional
+from api.utils.adherence import expected_doses_per_day, daily_adherence
+from api.utils.versioning import get_version, bump_version, user_version, CATALOG, INTAKES, REMINDERS
+from api.utils.medication_index import medication_index
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+import io
+import logging
+
+logger = logging.getLogger(__name__)
 
 medications_bp = Blueprint('medications', __name__, url_prefix='/api/medications')
 
+# Relaciones aceptadas en ?include=
+USER_MEDICATION_INCLUDES = ('medication', 'reminders')
+
+def _barcode_taken(barcode, exclude_id=None):
+    """Check the unique normalized barcode index before writing"""
+    key = normalize_barcode(barcode)
+    if not key:
+        return False
+    query = Medication.query.filter(Medication.normalized_barcode == key)
+    if exclude_id is not None:
+        query = query.filter(Medication.id != exclude_id)
+    return db.session.query(query.exists()).scalar()
+
+def _name_taken(normalized_name, normalized_strength, exclude_id=None):
+    """Check the unique normalized name and strength index (active medications without barcode) before writing"""
+    if not normalized_name:
+        return False
+    query = Medication.query.filter(
+        Medication.normalized_name == normalized_name,
+        Medication.normalized_strength == normalized_strength,
+        Medication.normalized_barcode.is_(None),
+        Medication.is_active == True
+    )
+    if exclude_id is not None:
+        query = query.filter(Medication.id != exclude_id)
+    # Sin autoflush: en una edición los cambios pendientes aún no deben llegar a la base
+    with db.session.no_autoflush:
+        return db.session.query(query.exists()).scalar()
+
+def _find_or_create_medication(name, strength=None, criticality='medium'):
+    """
+    Match a catalog entry by normalized name and strength (one index probe), creating it when missing
+    Returns (medication, created)
+    """
+    query = Medication.query.filter_by(
+        normalized_name=normalize_medication_name(name),
+        normalized_strength=normalize_strength(name, strength),
+        is_active=True
+    ).order_by(Medication.id)
+    
+    medication = query.first()
+    if medication:
+        return medication, False
+    
+    base_name, dosage = split_dosage(name)
+    medication = Medication(
+        name=base_name,
+        strength=strength or dosage,
+        description="Medication added by user",
+        requires_prescription=True,
+        criticality=criticality
+    )
+    try:
+        with db.session.begin_nested():
+            db.session.add(medication)
+    except IntegrityError:
+        # Another request created the same medication first
+        return query.first(), False
+    
+    return medication, True
+
+def _catalog_token(*args, **kwargs):
+    """ETag token for catalog reads: the shared catalog version"""
+    return get_version(CATALOG)
+
+def _user_medications_token(*args, **kwargs):
+    """ETag token for the current user's medications (count, last update, catalog version)"""
+    user_id = int(get_jwt_identity())
+    catalog = get_version(CATALOG)
+    if catalog is None:
+        return None
+    count, last_update = db.session.query(
+        func.count(UserMedication.id),
+        func.max(UserMedication.updated_at)
+    ).filter(UserMedication.user_id == user_id).one()
+    token = (catalog, count, last_update)
+    # ?include=reminders: crear, editar o borrar un recordatorio no toca UserMedication
+    if 'reminders' in request.args.get('include', ''):
+        reminders = get_version(user_version(REMINDERS, user_id))
+        if reminders is None:
+            return None
+        token += (reminders,)
+    return token
+
+def _metrics_token(*args, **kwargs):
+    """ETag token for adherence metrics: changes with the day, intakes and medications"""
+    intakes = get_version(user_version(INTAKES, int(get_jwt_identity())))
+    if intakes is None:
+        return None
+    return (datetime.utcnow().date(), intakes, _user_medications_token())
+
 # Medication CRUD
 @medications_bp.route('', methods=['GET'])
 @jwt_required()
+@conditional(_catalog_token)
 def get_medications():
     """Get all medications"""
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     search = request.args.get('search', '')
     
-    query = Medication.query.filter_by(is_active=True)
+    try:
+        selection = requested_fields(Medication)
+    except FieldsError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query = selection.apply(Medication.query.filter_by(is_active=True), Medication)
     
     if search:
         query = query.filter(
@@ -30,15 +143,62 @@ def get_medications():
     pagination = query.paginate(page=page, per_page=per_page, error_out=False)
     
     return jsonify({
-        'medications': [med.to_dict() for med in pagination.items],
+        'medications': [med.to_dict(selection.fields) for med in pagination.items],
         'total': pagination.total,
         'page': page,
         'per_page': per_page,
         'pages': pagination.pages
     }), 200
 
+@medications_bp.route('/autocomplete', methods=['GET'])
+@jwt_required()
+def autocomplete_medications():
+    """Type-ahead over medication names, most used first"""
+    prefix = request.args.get('q', '')
+    max_results = current_app.config.get('AUTOCOMPLETE_MAX_RESULTS', 20)
+    limit = max(1, min(request.args.get('limit', 10, type=int), max_results))
+    
+    medication_index.sync()
+    
+    return jsonify({
+        'query': prefix,
+        'medications': medication_index.search(prefix, limit)
+    }), 200
+
+@medications_bp.route('/barcode/<code>', methods=['GET'])
+@jwt_required()
+@conditional(_catalog_token)
+def get_medication_by_barcode(code):
+    """Find a medication by package barcode or NDC code"""
+    medication = find_by_barcodes([code]).get(code)
+    if not medication:
+        return jsonify({'error': 'Medication not found'}), 404
+    return jsonify(medication), 200
+
+@medications_bp.route('/barcode/lookup', methods=['POST'])
+@jwt_required()
+def lookup_medication_barcodes():
+    """Resolve many barcodes or NDC codes in one request"""
+    data = request.get_json()
+    codes = data.get('codes') if data else None
+    
+    if not isinstance(codes, list) or not codes:
+        return jsonify({'error': 'codes must be a non-empty list'}), 400
+    
+    max_codes = current_app.config.get('BARCODE_LOOKUP_MAX', 500)
+    if len(codes) > max_codes:
+        return jsonify({'error': f'At most {max_codes} codes per request'}), 400
+    
+    results = find_by_barcodes(str(code) for code in codes)
+    
+    return jsonify({
+        'results': results,
+        'found': sum(1 for medication in results.values() if medication)
+    }), 200
+
 @medications_bp.route('/<int:id>', methods=['GET'])
 @jwt_required()
+@conditional(_catalog_token)
 def get_medication(id):
     """Get a specific medication"""
     medication = Medication.query.get_or_404(id)
@@ -59,6 +219,14 @@ def create_medication():
     if criticality not in valid_criticalities:
         return jsonify({'error': f'Invalid criticality. Must be one of: {", ".join(valid_criticalities)}'}), 400
     
+    if _barcode_taken(data.get('barcode')):
+        return jsonify({'error': 'Barcode already registered'}), 409
+    
+    if not normalize_barcode(data.get('barcode')) and _name_taken(
+        normalize_medication_name(data['name']), normalize_strength(data['name'], data.get('strength'))
+    ):
+        return jsonify({'error': 'A medication with this name already exists'}), 409
+    
     medication = Medication(
         name=data['name'],
         generic_name=data.get('generic_name'),
@@ -79,12 +247,45 @@ def create_medication():
     
     db.session.add(medication)
     db.session.commit()
+    catalog_changed(medication)
     
     return jsonify({
         'message': 'Medication created successfully',
         'medication': medication.to_dict()
     }), 201
 
+@medications_bp.route('/import', methods=['POST'])
+@jwt_required()
+@admin_required
+def import_medications():
+    """
+    Bulk import a catalog file (admin only)
+    Expects multipart/form-data with a CSV or JSONL 'file'; ?dry_run=true only validates
+    """
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file provided'}), 400
+    
+    file = request.files['file']
+    fmt = request.form.get('format') or detect_format(file.filename)
+    dry_run = request.args.get('dry_run', 'false').lower() == 'true'
+    
+    def progress(staged, elapsed):
+        logger.info(f"Catalog import {file.filename}: staged {staged} rows in {elapsed:.1f}s")
+    
+    try:
+        stream = io.TextIOWrapper(file.stream, encoding='utf-8-sig', newline='')
+        report = import_catalog(iter_records(stream, fmt), dry_run=dry_run, progress=progress)
+    except Exception as e:
+        return jsonify({
+            'error': 'Failed to import catalog',
+            'details': str(e)
+        }), 400
+    
+    return jsonify({
+        'message': 'Catalog validated' if dry_run else 'Catalog imported successfully',
+        'report': report
+    }), 200
+
 @medications_bp.route('/<int:id>', methods=['PUT'])
 @jwt_required()
 def update_medication(id):
@@ -115,6 +316,8 @@ def update_medication(id):
     if 'storage_instructions' in data:
         medication.storage_instructions = data['storage_instructions']
     if 'barcode' in data:
+        if _barcode_taken(data['barcode'], exclude_id=medication.id):
+            return jsonify({'error': 'Barcode already registered'}), 409
         medication.barcode = data['barcode']
     if 'image_url' in data:
         medication.image_url = data['image_url']
@@ -128,7 +331,13 @@ def update_medication(id):
             return jsonify({'error': f'Invalid criticality. Must be one of: {", ".join(valid_criticalities)}'}), 400
         medication.criticality = data['criticality']
     
+    if data.keys() & {'name', 'strength', 'barcode'} and medication.is_active and medication.normalized_barcode is None:
+        if _name_taken(medication.normalized_name, medication.normalized_strength, exclude_id=medication.id):
+            db.session.rollback()
+            return jsonify({'error': 'A medication with this name already exists'}), 409
+    
     db.session.commit()
+    catalog_changed(medication)
     
     return jsonify({
         'message': 'Medication updated successfully',
@@ -142,27 +351,48 @@ def delete_medication(id):
     medication = Medication.query.get_or_404(id)
     medication.is_active = False
     db.session.commit()
+    catalog_changed(medication)
     
     return jsonify({'message': 'Medication deleted successfully'}), 200
 
 # User Medications CRUD
 @medications_bp.route('/user', methods=['GET'])
 @jwt_required()
+@conditional(_user_medications_token)
 def get_user_medications():
     """Get current user's medications"""
     current_user_id = int(get_jwt_identity())
     
-    medications = UserMedication.query.filter_by(
-        user_id=current_user_id,
-        is_active=True
-    ).all()
-    
-    result = []
-    for um in medications:
-        user_med_dict = um.to_dict()
-        if um.medication:
-            user_med_dict['medication'] = um.medication.to_dict()
-        result.append(user_med_dict)
+    try:
+        selection = requested_fields(UserMedication, {'medication': Medication}, USER_MEDICATION_INCLUDES)
+        includes = requested_includes(USER_MEDICATION_INCLUDES)
+    except FieldsError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # The medication comes from the catalog cache, not from a join
+    with_medication = includes.pop('medication', None) is not None or selection.includes('medication')
+    filters = (UserMedication.user_id == current_user_id, UserMedication.is_active == True)
+    fields = selection.with_fields('medication_id')
+    
+    if includes:
+        user_meds = selection.apply(UserMedication.query, UserMedication, 'medication_id').options(
+            *loader_options(UserMedication, includes)
+        ).filter(*filters).all()
+        result = [dump_included(um, includes, um.to_dict(fields)) for um in user_meds]
+    else:
+        # Serializa directamente desde filas, sin construir objetos ORM
+        serializer = serializer_for(UserMedication)
+        rows = db.session.query(*serializer.columns(fields)).filter(*filters).all()
+        result = serializer.dump_rows(rows, fields)
+    
+    catalog = {}
+    if with_medication:
+        catalog = medication_cache.get_many(item['medication_id'] for item in result)
+    keep_medication_id = fields is None or 'medication_id' in selection.fields
+    for item in result:
+        medication_id = item['medication_id'] if keep_medication_id else item.pop('medication_id')
+        if medication_id in catalog:
+            item['medication'] = selection.trim('medication', catalog[medication_id])
     
     return jsonify({'medications': result}), 200
 
@@ -177,8 +407,9 @@ def get_user_medication(id):
     ).first_or_404()
     
     result = user_med.to_dict()
-    if user_med.medication:
-        result['medication'] = user_med.medication.to_dict()
+    medication = medication_cache.get(user_med.medication_id)
+    if medication:
+        result['medication'] = medication
     
     return jsonify(result), 200
 
@@ -194,31 +425,23 @@ def create_user_medication():
     
     medication_name = data['custom_name'].strip()
     medication_id = data.get('medication_id')
+    medication_created = False
     
     if medication_id:
         medication = Medication.query.get(medication_id)
         if not medication:
             return jsonify({'error': 'Medication not found'}), 404
     else:
-        medication = Medication.query.filter(
-            db.func.lower(Medication.name) == medication_name.lower()
-        ).filter_by(is_active=True).first()
+        criticality = data.get('criticality', 'medium')
+        valid_criticalities = ['low', 'medium', 'high', 'critical']
+        if criticality not in valid_criticalities:
+            criticality = 'medium'
         
-        if not medication:
-            criticality = data.get('criticality', 'medium')
-            valid_criticalities = ['low', 'medium', 'high', 'critical']
-            if criticality not in valid_criticalities:
-                criticality = 'medium'
-            
-            medication = Medication(
-                name=medication_name,
-                strength=data.get('prescribed_dosage'),
-                description=f"Medication added by user",
-                requires_prescription=True,
-                criticality=criticality
-            )
-            db.session.add(medication)
-            db.session.flush()
+        medication, medication_created = _find_or_create_medication(
+            medication_name,
+            strength=data.get('prescribed_dosage'),
+            criticality=criticality
+        )
     
     user_med = UserMedication(
         user_id=current_user_id,
@@ -235,13 +458,17 @@ def create_user_medication():
     db.session.add(user_med)
     db.session.commit()
     
+    if medication_created:
+        catalog_changed(medication)
+    medication_index.record_usage(medication.id)
+    
     result = user_med.to_dict()
     result['medication'] = medication.to_dict()
     
     return jsonify({
         'message': 'Medication added to user successfully',
         'user_medication': result,
-        'medication_created': medication_id is None
+        'medication_created': medication_created
     }), 201
 
 @medications_bp.route('/user/<int:id>', methods=['PUT'])
@@ -282,10 +509,12 @@ def update_user_medication(id):
         user_med.is_active = data['is_active']
     
     db.session.commit()
+    bump_version(user_version(REMINDERS, current_user_id))
     
     result = user_med.to_dict()
-    if user_med.medication:
-        result['medication'] = user_med.medication.to_dict()
+    medication = medication_cache.get(user_med.medication_id)
+    if medication:
+        result['medication'] = medication
     
     return jsonify({
         'message': 'User medication updated successfully',
@@ -304,11 +533,22 @@ def delete_user_medication(id):
     
     user_med.is_active = False
     db.session.commit()
+    bump_version(user_version(REMINDERS, current_user_id))
     
     return jsonify({'message': 'User medication deleted successfully'}), 200
 
+def _active_user_medications(user_id):
+    """Active (UserMedication, serialized Medication) pairs for a user"""
+    user_meds = UserMedication.query.filter_by(
+        user_id=user_id,
+        is_active=True
+    ).all()
+    catalog = medication_cache.get_many(um.medication_id for um in user_meds)
+    return [(um, catalog[um.medication_id]) for um in user_meds if um.medication_id in catalog]
+
 @medications_bp.route('/user/metrics', methods=['GET'])
 @jwt_required()
+@conditional(_metrics_token)
 def get_user_medication_metrics():
     """Get user medication adherence metrics weighted by criticality"""
     current_user_id = int(get_jwt_identity())
@@ -319,16 +559,7 @@ def get_user_medication_metrics():
     start_date = end_date - timedelta(days=days)
     
     # Obtener medicamentos activos del usuario con su criticidad
-    user_meds = db.session.query(
-        UserMedication,
-        Medication
-    ).join(
-        Medication,
-        UserMedication.medication_id == Medication.id
-    ).filter(
-        UserMedication.user_id == current_user_id,
-        UserMedication.is_active == True
-    ).all()
+    user_meds = _active_user_medications(current_user_id)
     
     if not user_meds:
         return jsonify({
@@ -344,28 +575,6 @@ def get_user_medication_metrics():
             'medications': []
         }), 200
     
-    def get_expected_doses_per_day(frequency):
-        """Calculate expected doses per day from frequency string"""
-        if not frequency:
-            return 1
-        
-        freq_lower = frequency.lower().strip()
-        
-        if any(term in freq_lower for term in ['dos veces', '2 veces', 'twice']):
-            return 2
-        if any(term in freq_lower for term in ['tres veces', '3 veces', 'three times']):
-            return 3
-        if any(term in freq_lower for term in ['cuatro veces', '4 veces', 'four times']):
-            return 4
-        if 'cada 12 horas' in freq_lower or 'every 12 hours' in freq_lower:
-            return 2
-        if 'cada 8 horas' in freq_lower or 'every 8 hours' in freq_lower:
-            return 3
-        if 'cada 6 horas' in freq_lower or 'every 6 hours' in freq_lower:
-            return 4
-        
-        return 1
-    
     total_weight = 0
     total_weighted_taken = 0
     total_simple_taken = 0
@@ -374,8 +583,8 @@ def get_user_medication_metrics():
     medication_stats = []
     
     for user_med, medication in user_meds:
-        weight = medication.get_criticality_weight()
-        doses_per_day = get_expected_doses_per_day(user_med.prescribed_frequency)
+        weight = CRITICALITY_WEIGHTS.get(medication['criticality'], 2)
+        doses_per_day = expected_doses_per_day(user_med.prescribed_frequency)
         expected_total = doses_per_day * days
         
         # Obtener estadísticas de intake
@@ -405,15 +614,15 @@ def get_user_medication_metrics():
         total_expected += effective_expected
         
         # Contar dosis críticas perdidas
-        if medication.criticality == 'critical':
+        if medication['criticality'] == 'critical':
             total_missed_critical += missed
         
         medication_stats.append({
-            'medication_id': medication.id,
+            'medication_id': medication['id'],
             'user_medication_id': user_med.id,
-            'medication_name': medication.name,
+            'medication_name': medication['name'],
             'custom_name': user_med.custom_name,
-            'criticality': medication.criticality,
+            'criticality': medication['criticality'],
             'criticality_weight': weight,
             'doses_per_day': doses_per_day,
             'simple_adherence_rate': round(simple_adherence, 2),
@@ -444,6 +653,7 @@ def get_user_medication_metrics():
 
 @medications_bp.route('/user/metrics/daily', methods=['GET'])
 @jwt_required()
+@conditional(_metrics_token)
 def get_daily_metrics():
     """Get daily metrics for the last N days"""
     current_user_id = int(get_jwt_identity())
@@ -453,16 +663,7 @@ def get_daily_metrics():
     start_date = end_date - timedelta(days=days - 1)
     
     # Obtener medicamentos activos del usuario
-    user_meds = db.session.query(
-        UserMedication,
-        Medication
-    ).join(
-        Medication,
-        UserMedication.medication_id == Medication.id
-    ).filter(
-        UserMedication.user_id == current_user_id,
-        UserMedication.is_active == True
-    ).all()
+    user_meds = _active_user_medications(current_user_id)
     
     if not user_meds:
         return jsonify({
@@ -470,77 +671,7 @@ def get_daily_metrics():
             'period_days': days
         }), 200
     
-    def get_expected_doses_per_day(frequency):
-        if not frequency:
-            return 1
-        
-        freq_lower = frequency.lower().strip()
-        
-        if any(term in freq_lower for term in ['dos veces', '2 veces', 'twice']):
-            return 2
-        if any(term in freq_lower for term in ['tres veces', '3 veces', 'three times']):
-            return 3
-        if any(term in freq_lower for term in ['cuatro veces', '4 veces', 'four times']):
-            return 4
-        if 'cada 12 horas' in freq_lower or 'every 12 hours' in freq_lower:
-            return 2
-        if 'cada 8 horas' in freq_lower or 'every 8 hours' in freq_lower:
-            return 3
-        if 'cada 6 horas' in freq_lower or 'every 6 hours' in freq_lower:
-            return 4
-        
-        return 1
-    
-    daily_metrics = []
-    
-    for day_offset in range(days):
-        current_day = start_date + timedelta(days=day_offset)
-        day_start = datetime.combine(current_day, datetime.min.time())
-        day_end = datetime.combine(current_day, datetime.max.time())
-        
-        day_weight = 0
-        day_weighted_taken = 0
-        day_simple_taken = 0
-        day_expected = 0
-        day_missed_critical = 0
-        
-        for user_med, medication in user_meds:
-            weight = medication.get_criticality_weight()
-            doses_per_day = get_expected_doses_per_day(user_med.prescribed_frequency)
-            
-            # Obtener intakes del día
-            day_intakes = db.session.query(
-                MedicationIntake.status,
-                func.count(MedicationIntake.id).label('count')
-            ).filter(
-                MedicationIntake.user_medication_id == user_med.id,
-                MedicationIntake.status_at >= day_start,
-                MedicationIntake.status_at <= day_end
-            ).group_by(MedicationIntake.status).all()
-            
-            taken = sum(i.count for i in day_intakes if i.status == 'taken')
-            missed = sum(i.count for i in day_intakes if i.status == 'missed')
-            
-            day_weight += weight * doses_per_day
-            day_weighted_taken += taken * weight
-            day_simple_taken += taken
-            day_expected += doses_per_day
-            
-            if medication.criticality == 'critical':
-                day_missed_critical += missed
-        
-        simple_adherence = (day_simple_taken / day_expected * 100) if day_expected > 0 else 0
-        weighted_adherence = (day_weighted_taken / day_weight * 100) if day_weight > 0 else 0
-        
-        daily_metrics.append({
-            'date': current_day.isoformat(),
-            'taken_count': day_simple_taken,
-            'expected_count': day_expected,
-            'simple_adherence': round(simple_adherence, 2),
-            'weighted_adherence': round(weighted_adherence, 2),
-            'missed_critical': day_missed_critical,
-            'is_compliant': weighted_adherence >= 80
-        })
+    daily_metrics = daily_adherence(user_meds, start_date, days)
     
     return jsonify({
         'days': daily_metrics,
@@ -1,8 +1,16 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from api.extensions import db
+from api.channels import METHODS
 from api.models import Notification, MedicationIntake
+from api.utils import notification_stream
+from api.utils.auth import admin_required
+from api.utils.fields import requested_fields, FieldsError
+from api.utils.loaders import load_owned, load_intake, load_user_medication
+from api.utils.unread import UNREAD, add_unread, get_unread, is_unread
+from api.utils.versioning import bump_version, user_version, INTAKES
 from datetime import datetime
+from redis import RedisError
 
 notifications_bp = Blueprint('notifications', __name__, url_prefix='/api/notifications')
 
@@ -17,36 +25,105 @@ def get_notifications():
     status = request.args.get('status')
     unread_only = request.args.get('unread_only', 'false').lower() == 'true'
     
-    query = Notification.query.filter_by(user_id=current_user_id)
+    try:
+        selection = requested_fields(Notification)
+    except FieldsError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query = selection.apply(Notification.query.filter_by(user_id=current_user_id), Notification)
     
     if status:
         query = query.filter_by(status=status)
     
     if unread_only:
-        query = query.filter(Notification.read_at.is_(None))
+        query = query.filter(UNREAD)
     
     pagination = query.order_by(Notification.created_at.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
     
     return jsonify({
-        'notifications': [n.to_dict() for n in pagination.items],
+        'notifications': [n.to_dict(selection.fields) for n in pagination.items],
         'total': pagination.total,
         'page': page,
         'per_page': per_page,
         'pages': pagination.pages
     }), 200
 
+@notifications_bp.route('/unread-count', methods=['GET'])
+@jwt_required()
+def get_unread_count():
+    """Number of unread notifications (app badge), from a counter in Redis"""
+    current_user_id = int(get_jwt_identity())
+    
+    return jsonify({'unread': get_unread(current_user_id)}), 200
+
+@notifications_bp.route('/stream', methods=['GET'])
+@jwt_required()
+def stream_notifications():
+    """
+    Server-sent events with the user's new notifications
+    Reconnecting with Last-Event-ID also sends the ones created meanwhile
+    """
+    current_user_id = int(get_jwt_identity())
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    config = current_app.config
+    
+    # Cada stream ocupa un hilo: por encima del límite se rechaza en lugar de agotarlos
+    if not notification_stream.slots.acquire(config['NOTIFICATION_STREAM_MAX_PER_WORKER']):
+        return jsonify({'error': 'Too many open notification streams, retry later'}), 503, {
+            'Retry-After': str(config['NOTIFICATION_STREAM_HEARTBEAT'])
+        }
+    
+    try:
+        pubsub = notification_stream.subscribe(current_user_id)
+    except RedisError:
+        notification_stream.slots.release()
+        return jsonify({'error': 'Notification stream is unavailable'}), 503
+    
+    closed = False
+    
+    def close():
+        # Puede llamarse más de una vez: el hueco se libera una sola
+        nonlocal closed
+        if not closed:
+            closed = True
+            pubsub.close()
+            notification_stream.slots.release()
+    
+    try:
+        # Suscrito antes de consultar: lo creado entre medias llega por alguna de las dos vías
+        backlog = []
+        if last_id is not None:
+            missed = Notification.query.filter(
+                Notification.user_id == current_user_id,
+                Notification.id > last_id,
+                Notification.recipient.is_(None)
+            ).order_by(Notification.id).limit(notification_stream.BACKLOG_LIMIT).all()
+            backlog = [(n.id, current_app.json.dumps(n.to_dict())) for n in missed]
+        
+        response = Response(
+            notification_stream.events(
+                pubsub, backlog,
+                duration=config['NOTIFICATION_STREAM_MAX_DURATION'],
+                heartbeat=config['NOTIFICATION_STREAM_HEARTBEAT']
+            ),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+    except Exception:
+        close()
+        raise
+    response.call_on_close(close)
+    return response
+
 @notifications_bp.route('/<int:id>', methods=['GET'])
 @jwt_required()
 def get_notification(id):
     """Get a specific notification"""
     current_user_id = int(get_jwt_identity())
     
-    notification = Notification.query.filter_by(
-        id=id,
-        user_id=current_user_id
-    ).first_or_404()
+    notification = load_owned(Notification, id, current_user_id)
     
     return jsonify(notification.to_dict()), 200
 
@@ -56,14 +133,14 @@ def mark_as_read(id):
     """Mark a notification as read"""
     current_user_id = int(get_jwt_identity())
     
-    notification = Notification.query.filter_by(
-        id=id,
-        user_id=current_user_id
-    ).first_or_404()
+    notification = load_owned(Notification, id, current_user_id)
+    was_unread = is_unread(notification)
     
     notification.read_at = datetime.utcnow()
     notification.status = 'read'
     db.session.commit()
+    if was_unread:
+        add_unread({current_user_id: -1})
     
     return jsonify({
         'message': 'Notification marked as read',
@@ -76,14 +153,16 @@ def mark_all_as_read():
     """Mark all notifications as read"""
     current_user_id = int(get_jwt_identity())
     
-    Notification.query.filter_by(
+    # Se resta lo marcado (no se pone a 0): las creadas mientras tanto siguen contando
+    marked = Notification.query.filter_by(
         user_id=current_user_id
-    ).filter(Notification.read_at.is_(None)).update({
+    ).filter(UNREAD).update({
         'read_at': datetime.utcnow(),
         'status': 'read'
     })
     
     db.session.commit()
+    add_unread({current_user_id: -marked})
     
     return jsonify({'message': 'All notifications marked as read'}), 200
 
@@ -93,16 +172,89 @@ def delete_notification(id):
     """Delete a notification"""
     current_user_id = int(get_jwt_identity())
     
-    notification = Notification.query.filter_by(
-        id=id,
-        user_id=current_user_id
-    ).first_or_404()
+    notification = load_owned(Notification, id, current_user_id)
+    was_unread = is_unread(notification)
     
     db.session.delete(notification)
     db.session.commit()
+    if was_unread:
+        add_unread({current_user_id: -1})
     
     return jsonify({'message': 'Notification deleted successfully'}), 200
 
+# Dead letters: notifications whose delivery retries are exhausted
+
+def _dead_letters(data):
+    query = Notification.query.filter_by(status='failed')
+    
+    delivery_method = data.get('delivery_method')
+    if delivery_method:
+        if delivery_method not in METHODS:
+            raise ValueError(f"delivery_method must be one of: {', '.join(METHODS)}")
+        query = query.filter_by(delivery_method=delivery_method)
+    
+    return query
+
+@notifications_bp.route('/dead-letters', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_dead_letters():
+    """List undeliverable notifications of all users (admin only)"""
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 20, type=int)
+    
+    try:
+        query = _dead_letters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    pagination = query.order_by(Notification.scheduled_at.desc()).paginate(
+        page=page, per_page=per_page, error_out=False
+    )
+    
+    return jsonify({
+        'notifications': [n.to_dict() for n in pagination.items],
+        'total': pagination.total,
+        'page': page,
+        'per_page': per_page,
+        'pages': pagination.pages
+    }), 200
+
+@notifications_bp.route('/dead-letters/replay', methods=['POST'])
+@jwt_required()
+@admin_required
+def replay_dead_letters():
+    """
+    Queue dead letters for delivery again (admin only)
+    Body: {"ids": [...]} and/or {"delivery_method": "sms"}; an empty body replays all
+    """
+    data = request.get_json(silent=True) or {}
+    
+    try:
+        query = _dead_letters(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    ids = data.get('ids')
+    if ids is not None:
+        if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            return jsonify({'error': 'ids must be a list of notification ids'}), 400
+        query = query.filter(Notification.id.in_(ids))
+    
+    # dispatch_notifications las envía respetando el límite de cada canal
+    replayed = query.update({
+        'status': 'pending',
+        'retry_count': 0,
+        'error_message': None,
+        'scheduled_at': datetime.utcnow()
+    }, synchronize_session=False)
+    db.session.commit()
+    
+    return jsonify({
+        'message': f'{replayed} notifications queued for delivery',
+        'replayed': replayed
+    }), 200
+
 # Medication Intake Tracking
 @notifications_bp.route('/intake', methods=['GET'])
 @jwt_required()
@@ -113,13 +265,18 @@ def get_intakes():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     
-    # Get user's medication intakes through user_medications
+    user_medication_id = request.args.get('user_medication_id', type=int)
+    
+    # Filtra por usuario con un join en lugar de precargar sus UserMedication
     from api.models import UserMedication
-    user_med_ids = [um.id for um in UserMedication.query.filter_by(user_id=current_user_id).all()]
+    query = MedicationIntake.query.join(
+        UserMedication, MedicationIntake.user_medication_id == UserMedication.id
+    ).filter(UserMedication.user_id == current_user_id)
+    
+    if user_medication_id:
+        query = query.filter(MedicationIntake.user_medication_id == user_medication_id)
     
-    pagination = MedicationIntake.query.filter(
-        MedicationIntake.user_medication_id.in_(user_med_ids)
-    ).order_by(MedicationIntake.status_at.desc()).paginate(
+    pagination = query.order_by(MedicationIntake.status_at.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
     
@@ -142,10 +299,7 @@ def create_intake():
         return jsonify({'error': 'user_medication_id is required'}), 400
     
     # Verify user owns the medication
-    from api.models import UserMedication
-    user_med = UserMedication.query.get_or_404(data['user_medication_id'])
-    if user_med.user_id != current_user_id:
-        return jsonify({'error': 'Unauthorized'}), 403
+    load_user_medication(data['user_medication_id'], current_user_id)
     
     intake = MedicationIntake(
         user_medication_id=data['user_medication_id'],
@@ -159,6 +313,7 @@ def create_intake():
     
     db.session.add(intake)
     db.session.commit()
+    bump_version(user_version(INTAKES, current_user_id))
     
     return jsonify({
         'message': 'Medication intake logged successfully',
@@ -171,13 +326,7 @@ def update_intake(id):
     """Update a medication intake log"""
     current_user_id = int(get_jwt_identity())
     
-    intake = MedicationIntake.query.get_or_404(id)
-    
-    # Verify user owns this intake
-    from api.models import UserMedication
-    user_med = UserMedication.query.get_or_404(intake.user_medication_id)
-    if user_med.user_id != current_user_id:
-        return jsonify({'error': 'Unauthorized'}), 403
+    intake = load_intake(id, current_user_id)
     
     data = request.get_json()
     
@@ -193,6 +342,7 @@ def update_intake(id):
         intake.side_effects_reported = data['side_effects_reported']
     
     db.session.commit()
+    bump_version(user_version(INTAKES, current_user_id))
     
     return jsonify({
         'message': 'Intake log updated successfully',
@@ -2,9 +2,16 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from api.extensions import db
 from api.models import Prescription
+from api.utils.catalog_cache import medication_cache
+from api.utils.fields import requested_fields, FieldsError
+from api.utils.includes import requested_includes, loader_options, dump_included
+from api.utils.loaders import load_owned
 
 prescriptions_bp = Blueprint('prescriptions', __name__, url_prefix='/api/prescriptions')
 
+# Relaciones aceptadas en ?include=
+PRESCRIPTION_INCLUDES = ('doctor', 'medication')
+
 @prescriptions_bp.route('', methods=['GET'])
 @jwt_required()
 def get_prescriptions():
@@ -13,16 +20,33 @@ def get_prescriptions():
     
     status = request.args.get('status')
     
-    query = Prescription.query.filter_by(user_id=current_user_id)
+    try:
+        selection = requested_fields(Prescription, relations=PRESCRIPTION_INCLUDES)
+        includes = requested_includes(PRESCRIPTION_INCLUDES)
+    except FieldsError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # The medication comes from the catalog cache, not from a join
+    with_medication = includes.pop('medication', None) is not None
+    extra = ('medication_id',) if with_medication else ()
+    
+    query = selection.apply(
+        Prescription.query.filter_by(user_id=current_user_id), Prescription, *extra
+    ).options(*loader_options(Prescription, includes))
     
     if status:
         query = query.filter_by(status=status)
     
     prescriptions = query.order_by(Prescription.prescribed_date.desc()).all()
     
-    return jsonify({
-        'prescriptions': [p.to_dict() for p in prescriptions]
-    }), 200
+    fields = selection.fields
+    result = [dump_included(p, includes, p.to_dict(fields)) for p in prescriptions]
+    if with_medication:
+        catalog = medication_cache.get_many(p.medication_id for p in prescriptions)
+        for p, item in zip(prescriptions, result):
+            item['medication'] = catalog.get(p.medication_id)
+    
+    return jsonify({'prescriptions': result}), 200
 
 @prescriptions_bp.route('/<int:id>', methods=['GET'])
 @jwt_required()
@@ -30,10 +54,7 @@ def get_prescription(id):
     """Get a specific prescription"""
     current_user_id = int(get_jwt_identity())
     
-    prescription = Prescription.query.filter_by(
-        id=id,
-        user_id=current_user_id
-    ).first_or_404()
+    prescription = load_owned(Prescription, id, current_user_id)
     
     return jsonify(prescription.to_dict()), 200
 
@@ -74,10 +95,7 @@ def update_prescription(id):
     """Update a prescription"""
     current_user_id = int(get_jwt_identity())
     
-    prescription = Prescription.query.filter_by(
-        id=id,
-        user_id=current_user_id
-    ).first_or_404()
+    prescription = load_owned(Prescription, id, current_user_id)
     
     data = request.get_json()
     
@@ -119,10 +137,7 @@ def delete_prescription(id):
     """Delete a prescription"""
     current_user_id = int(get_jwt_identity())
     
-    prescription = Prescription.query.filter_by(
-        id=id,
-        user_id=current_user_id
-    ).first_or_404()
+    prescription = load_owned(Prescription, id, current_user_id)
     
     db.session.delete(prescription)
     db.session.commit()
@@ -1,34 +1,382 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, url_for, abort
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from api.extensions import db
-from api.models import Reminder, ReminderLog, UserMedication
-from api.tasks.notification_tasks import schedule_reminder
-from datetime import datetime
+from api.extensions import db, redis_client
+from api.models import Reminder, ReminderLog, UserMedication, Medication, MedicationIntake, User
+from api.utils.catalog_cache import medication_cache
+from api.utils.serializers import serializer_for
+from api.utils.fields import requested_fields, FieldsError
+from api.utils.includes import requested_includes, loader_options, dump_included
+from api.utils.loaders import load_reminder, load_reminder_log, load_user_medication
+from api.utils.http_cache import conditional
+from api.utils.schedule import occurs_on, occurrence_dates, first_occurrence
+from api.utils.reminder_plans import reminder_rows, PlanError
+from api.utils import due_queue
+from api.utils.ics import reminder_event, build_calendar
+from api.utils.versioning import get_version, bump_version, user_version, CATALOG, INTAKES, REMINDERS
+from sqlalchemy import func, insert
+from collections import namedtuple
+from datetime import datetime, date, timedelta
+from itsdangerous import URLSafeSerializer, BadSignature
+from redis import RedisError
+import logging
+import secrets
+
+logger = logging.getLogger(__name__)
 
 reminders_bp = Blueprint('reminders', __name__, url_prefix='/api/reminders')
 
+# Relaciones aceptadas en ?include=
+REMINDER_INCLUDES = ('medication', 'user_medication', 'reminder_logs')
+
+# Columnas que necesita occurs_on() para ?due_today=true
+SCHEDULE_FIELDS = ('frequency_type', 'frequency_value', 'time_of_week', 'start_date', 'end_date')
+_Schedule = namedtuple('_Schedule', SCHEDULE_FIELDS)
+
+# Medicamentos por petición en /plan
+PLAN_MAX_MEDICATIONS = 50
+
+# Minutos para posponer una dosis
+SNOOZE_DEFAULT_MINUTES = 10
+SNOOZE_MAX_MINUTES = 240
+
+def _reminders_token(*args, **kwargs):
+    """ETag token for the current user's reminders and their embedded medications"""
+    catalog = get_version(CATALOG)
+    # Los logs cambian de estado sin marca de tiempo: sin token barato
+    if catalog is None or 'reminder_logs' in request.args.get('include', ''):
+        return None
+    user_id = int(get_jwt_identity())
+    medications = db.session.query(
+        func.count(UserMedication.id),
+        func.max(UserMedication.updated_at)
+    ).filter(UserMedication.user_id == user_id).one()
+    reminders = db.session.query(
+        func.count(Reminder.id),
+        func.max(Reminder.updated_at)
+    ).join(UserMedication).filter(UserMedication.user_id == user_id).one()
+    # ?due_today=true cambia de resultado a medianoche
+    day = datetime.utcnow().date() if request.args.get('due_today', 'false').lower() == 'true' else None
+    return (catalog, tuple(medications), tuple(reminders), day)
+
 # Reminder CRUD
 @reminders_bp.route('', methods=['GET'])
 @jwt_required()
+@conditional(_reminders_token)
 def get_reminders():
     """Get current user's reminders"""
     current_user_id = int(get_jwt_identity())
     
-    # Get user's medications first
-    user_med_ids = [um.id for um in UserMedication.query.filter_by(user_id=current_user_id).all()]
+    try:
+        selection = requested_fields(Reminder, {'medication': Medication}, REMINDER_INCLUDES)
+        includes = requested_includes(REMINDER_INCLUDES)
+    except FieldsError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # The medication comes from the catalog cache, not from a join
+    with_medication = includes.pop('medication', None) is not None or selection.includes('medication')
+    
+    active_only = request.args.get('active_only', 'false').lower() == 'true'
+    due_today = request.args.get('due_today', 'false').lower() == 'true'
+    user_medication_id = request.args.get('user_medication_id', type=int)
+    
+    # Un solo join en lugar de precargar los ids de UserMedication del usuario
+    filters = [UserMedication.user_id == current_user_id]
+    if active_only:
+        filters.append(Reminder.is_active == True)
+    if user_medication_id:
+        filters.append(Reminder.user_medication_id == user_medication_id)
+    schedule = SCHEDULE_FIELDS if due_today else ()
+    today = datetime.utcnow().date()
+    
+    fields = selection.with_fields('user_medication_id')
+    if includes:
+        rows = selection.apply(
+            db.session.query(Reminder, UserMedication.medication_id), Reminder, 'user_medication_id', *schedule
+        ).join(
+            UserMedication, Reminder.user_medication_id == UserMedication.id
+        ).options(*loader_options(Reminder, includes)).filter(*filters).all()
+        if due_today:
+            rows = [row for row in rows if occurs_on(row[0], today)]
+        result = [dump_included(reminder, includes, reminder.to_dict(fields)) for reminder, _ in rows]
+        medication_ids = [medication_id for _, medication_id in rows]
+    else:
+        serializer = serializer_for(Reminder)
+        columns = serializer.columns(fields)
+        rows = db.session.query(
+            *columns, UserMedication.medication_id, *(getattr(Reminder, field) for field in schedule)
+        ).join(
+            UserMedication, Reminder.user_medication_id == UserMedication.id
+        ).filter(*filters).all()
+        if due_today:
+            rows = [row for row in rows if occurs_on(_Schedule(*row[len(columns) + 1:]), today)]
+        result = serializer.dump_rows(rows, fields)
+        medication_ids = [row[len(columns)] for row in rows]
+    
+    catalog = {}
+    if with_medication:
+        catalog = medication_cache.get_many(medication_ids)
+    keep_user_medication_id = fields is None or 'user_medication_id' in selection.fields
+    for reminder_dict, medication_id in zip(result, medication_ids):
+        if not keep_user_medication_id:
+            del reminder_dict['user_medication_id']
+        if medication_id in catalog:
+            reminder_dict['medication'] = selection.trim('medication', catalog[medication_id])
     
-    reminders = Reminder.query.filter(
-        Reminder.user_medication_id.in_(user_med_ids)
+    return jsonify({'reminders': result}), 200
+
+def _occurrences_token(*args, **kwargs):
+    """ETag token and cache key part: catalog and the user's reminder and intake counters"""
+    user_id = int(get_jwt_identity())
+    versions = (
+        get_version(CATALOG),
+        get_version(user_version(REMINDERS, user_id)),
+        get_version(user_version(INTAKES, user_id))
+    )
+    return None if None in versions else versions
+
+def _occurrence_range():
+    """Parse ?start= and ?end= (ISO dates, default: the next 7 days)"""
+    today = datetime.utcnow().date()
+    start = date.fromisoformat(request.args['start']) if request.args.get('start') else today
+    end = date.fromisoformat(request.args['end']) if request.args.get('end') else start + timedelta(days=6)
+    return start, end
+
+def _expand_occurrences(user_id, start, end, limit):
+    """Concrete doses of the user's active reminders with their log/intake status"""
+    reminders = db.session.query(
+        Reminder.id,
+        Reminder.user_medication_id,
+        Reminder.title,
+        Reminder.reminder_time,
+        *(getattr(Reminder, field) for field in SCHEDULE_FIELDS),
+        UserMedication.custom_name,
+        UserMedication.medication_id
+    ).join(
+        UserMedication, Reminder.user_medication_id == UserMedication.id
+    ).filter(
+        UserMedication.user_id == user_id,
+        Reminder.is_active == True,
+        Reminder.reminder_time.isnot(None)
     ).all()
+    if not reminders:
+        return [], False
+    
+    # Estado de cada dosis: último log del día y la toma asociada, en una sola consulta
+    rows = db.session.query(
+        ReminderLog.reminder_id,
+        ReminderLog.scheduled_time,
+        ReminderLog.id,
+        ReminderLog.status,
+        MedicationIntake.id,
+        MedicationIntake.status
+    ).outerjoin(
+        MedicationIntake, MedicationIntake.reminder_log_id == ReminderLog.id
+    ).filter(
+        ReminderLog.reminder_id.in_([r.id for r in reminders]),
+        ReminderLog.scheduled_time >= datetime.combine(start, datetime.min.time()),
+        ReminderLog.scheduled_time <= datetime.combine(end, datetime.max.time())
+    ).order_by(ReminderLog.scheduled_time).all()
+    logs = {(row[0], row[1].date()): row[2:] for row in rows}
+    
+    catalog = medication_cache.get_many(r.medication_id for r in reminders)
+    occurrences = []
+    for reminder in reminders:
+        medication = catalog.get(reminder.medication_id)
+        name = reminder.custom_name or (medication['name'] if medication else None)
+        for day in occurrence_dates(reminder, start, end):
+            log_id, log_status, intake_id, intake_status = logs.get((reminder.id, day), (None,) * 4)
+            occurrences.append({
+                'reminder_id': reminder.id,
+                'user_medication_id': reminder.user_medication_id,
+                'medication_name': name,
+                'title': reminder.title,
+                'scheduled_at': datetime.combine(day, reminder.reminder_time).isoformat(),
+                'status': intake_status or log_status or 'scheduled',
+                'reminder_log_id': log_id,
+                'intake_id': intake_id
+            })
+    
+    occurrences.sort(key=lambda o: (o['scheduled_at'], o['reminder_id']))
+    return occurrences[:limit], len(occurrences) > limit
+
+@reminders_bp.route('/occurrences', methods=['GET'])
+@jwt_required()
+@conditional(_occurrences_token)
+def get_occurrences():
+    """Expand the user's active reminders into dated doses for a calendar"""
+    current_user_id = int(get_jwt_identity())
+    
+    try:
+        start, end = _occurrence_range()
+    except ValueError:
+        return jsonify({'error': 'start and end must be dates (YYYY-MM-DD)'}), 400
+    max_days = current_app.config['OCCURRENCES_MAX_DAYS']
+    if end < start:
+        return jsonify({'error': 'end must not be before start'}), 400
+    if (end - start).days >= max_days:
+        return jsonify({'error': f'Range is limited to {max_days} days'}), 400
+    
+    # Caché por (usuario, rango), invalidada por los contadores de versión
+    token = _occurrences_token()
+    key = f"occurrences:{current_user_id}:{start}:{end}:{':'.join(map(str, token))}" if token else None
+    if key:
+        try:
+            cached = redis_client.get(key)
+        except RedisError as e:
+            logger.warning(f"Could not read occurrences cache: {str(e)}")
+            cached = None
+        if cached:
+            return current_app.response_class(cached, mimetype='application/json'), 200
+    
+    occurrences, truncated = _expand_occurrences(
+        current_user_id, start, end, current_app.config['OCCURRENCES_MAX_RESULTS']
+    )
+    body = current_app.json.dumps({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'occurrences': occurrences,
+        'truncated': truncated
+    })
+    if key:
+        try:
+            redis_client.setex(key, current_app.config['OCCURRENCES_CACHE_TTL'], body)
+        except RedisError as e:
+            logger.warning(f"Could not write occurrences cache: {str(e)}")
     
-    result = []
+    return current_app.response_class(body, mimetype='application/json'), 200
+
+def _calendar_serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='calendar-feed')
+
+def _calendar_key_cache(user_id):
+    return f'calendar-key:{user_id}'
+
+def _calendar_key(user_id):
+    """
+    The user's current feed key. It lives in User.calendar_key (so a Redis
+    reset cannot revive revoked URLs) and is cached in Redis for the feed
+    """
+    try:
+        key = redis_client.get(_calendar_key_cache(user_id))
+        if key:
+            return key
+    except RedisError as e:
+        logger.warning(f"Could not read calendar key: {str(e)}")
+    
+    # Solo se crea si falta: dos peticiones simultáneas acaban con la misma
+    db.session.query(User).filter(User.id == user_id, User.calendar_key.is_(None)).update(
+        {'calendar_key': secrets.token_urlsafe(24)}, synchronize_session=False
+    )
+    db.session.commit()
+    key = db.session.query(User.calendar_key).filter(User.id == user_id).scalar()
+    if key is None:
+        return None
+    try:
+        # nx: una rotación simultánea ya dejó la clave nueva
+        redis_client.set(_calendar_key_cache(user_id), key, ex=current_app.config['CALENDAR_CACHE_TTL'], nx=True)
+    except RedisError as e:
+        logger.warning(f"Could not cache calendar key: {str(e)}")
+    return key
+
+def _calendar_url(user_id):
+    token = _calendar_serializer().dumps([user_id, _calendar_key(user_id)])
+    return url_for('reminders.calendar_feed', token=token, _external=True)
+
+def _build_calendar(user_id):
+    reminders = db.session.query(
+        Reminder.id,
+        Reminder.title,
+        Reminder.description,
+        Reminder.reminder_time,
+        *(getattr(Reminder, field) for field in SCHEDULE_FIELDS),
+        Reminder.created_at,
+        Reminder.updated_at,
+        UserMedication.custom_name,
+        UserMedication.medication_id,
+        UserMedication.prescribed_dosage
+    ).join(
+        UserMedication, Reminder.user_medication_id == UserMedication.id
+    ).filter(
+        UserMedication.user_id == user_id,
+        UserMedication.is_active == True,
+        Reminder.is_active == True,
+        Reminder.calendar_reminder == True,
+        Reminder.reminder_time.isnot(None)
+    ).order_by(Reminder.id).all()
+    
+    catalog = medication_cache.get_many(r.medication_id for r in reminders)
+    now = datetime.utcnow()
+    events = []
     for reminder in reminders:
-        reminder_dict = reminder.to_dict()
-        if reminder.user_medication and reminder.user_medication.medication:
-            reminder_dict['medication'] = reminder.user_medication.medication.to_dict()
-        result.append(reminder_dict)
+        medication = catalog.get(reminder.medication_id)
+        name = reminder.custom_name or (medication['name'] if medication else None) or 'Medicamento'
+        details = [name if reminder.title else None, reminder.prescribed_dosage, reminder.description]
+        events.append(reminder_event(
+            reminder,
+            reminder.title or name,
+            '\n'.join(detail for detail in details if detail),
+            request.host,
+            now
+        ))
+    return build_calendar(events, 'Capsule Care')
+
+@reminders_bp.route('/calendar', methods=['GET'])
+@jwt_required()
+def get_calendar_url():
+    """Secret URL of the user's ICS feed (reminders with calendar_reminder)"""
+    return jsonify({'url': _calendar_url(int(get_jwt_identity()))}), 200
+
+@reminders_bp.route('/calendar/rotate', methods=['POST'])
+@jwt_required()
+def rotate_calendar_url():
+    """Revoke the current feed URL and return a new one"""
+    current_user_id = int(get_jwt_identity())
+    key = secrets.token_urlsafe(24)
+    db.session.query(User).filter(User.id == current_user_id).update(
+        {'calendar_key': key}, synchronize_session=False
+    )
+    db.session.commit()
+    try:
+        redis_client.set(_calendar_key_cache(current_user_id), key, ex=current_app.config['CALENDAR_CACHE_TTL'])
+    except RedisError as e:
+        # La clave vieja sigue en caché hasta expirar: mejor fallar que dar por revocada la URL
+        logger.error(f"Could not update cached calendar key: {str(e)}")
+        return jsonify({'error': 'Calendar feed temporarily unavailable'}), 503
+    return jsonify({'url': _calendar_url(current_user_id)}), 200
+
+@reminders_bp.route('/calendar/<token>.ics', methods=['GET'])
+def calendar_feed(token):
+    """
+    ICS feed authenticated by the secret token in the URL. A cache hit is
+    answered from Redis alone (cached key, versions and body).
+    """
+    try:
+        user_id, key = _calendar_serializer().loads(token)
+    except BadSignature:
+        abort(404)
+    
+    if not key or key != _calendar_key(user_id):
+        abort(404)  # URL revocada
+    
+    versions = (get_version(CATALOG), get_version(user_version(REMINDERS, user_id)))
+    if None in versions:
+        return jsonify({'error': 'Calendar feed temporarily unavailable'}), 503
+    
+    cache_key = f'calendar:{user_id}:{versions[0]}:{versions[1]}'
+    try:
+        body = redis_client.get(cache_key)
+    except RedisError as e:
+        logger.warning(f"Could not read calendar cache: {str(e)}")
+        body = None
+    
+    if body is None:
+        body = _build_calendar(user_id)
+        try:
+            redis_client.setex(cache_key, current_app.config['CALENDAR_CACHE_TTL'], body)
+        except RedisError as e:
+            logger.warning(f"Could not write calendar cache: {str(e)}")
     
-    return jsonify({'reminders': result}), 200
+    return current_app.response_class(body, mimetype='text/calendar'), 200
 
 @reminders_bp.route('/<int:id>', methods=['GET'])
 @jwt_required()
@@ -36,15 +384,12 @@ def get_reminder(id):
     """Get a specific reminder"""
     current_user_id = int(get_jwt_identity())
     
-    reminder = Reminder.query.get_or_404(id)
-    
-    # Verify user owns this reminder
-    if reminder.user_medication.user_id != current_user_id:
-        return jsonify({'error': 'Unauthorized'}), 403
+    reminder = load_reminder(id, current_user_id)
     
     result = reminder.to_dict()
-    if reminder.user_medication and reminder.user_medication.medication:
-        result['medication'] = reminder.user_medication.medication.to_dict()
+    medication = medication_cache.get(reminder.user_medication.medication_id)
+    if medication:
+        result['medication'] = medication
     
     return jsonify(result), 200
 
@@ -59,9 +404,7 @@ def create_reminder():
         return jsonify({'error': 'user_medication_id is required'}), 400
     
     # Verify user owns the medication
-    user_med = UserMedication.query.get_or_404(data['user_medication_id'])
-    if user_med.user_id != current_user_id:
-        return jsonify({'error': 'Unauthorized'}), 403
+    load_user_medication(data['user_medication_id'], current_user_id)
     
     reminder = Reminder(
         user_medication_id=data['user_medication_id'],
@@ -81,8 +424,9 @@ def create_reminder():
     
     db.session.add(reminder)
     db.session.commit()
+    bump_version(user_version(REMINDERS, current_user_id))
     
-    # Programar el recordatorio en Celery si está habilitado
+    # Programar el primer aviso en la cola de vencimientos si está habilitado
     if reminder.event_enabled and reminder.reminder_time and reminder.start_date:
         try:
             # Programar la primera notificación
@@ -91,7 +435,7 @@ def create_reminder():
                 reminder.reminder_time
             )
             if first_reminder_datetime > datetime.utcnow():
-                schedule_reminder.delay(reminder.id, first_reminder_datetime)
+                due_queue.schedule(reminder.id, first_reminder_datetime)
         except Exception as e:
             print(f"Error scheduling reminder: {e}")
     
@@ -100,16 +444,75 @@ def create_reminder():
         'reminder': reminder.to_dict()
     }), 201
 
+@reminders_bp.route('/plan', methods=['POST'])
+@jwt_required()
+def create_reminder_plan():
+    """
+    Create the reminders for one or more dosing schedules in a single
+    transaction: {"plans": [{...}, ...], "replace": true}. With replace, the
+    active reminders of each medication are deactivated first.
+    """
+    current_user_id = int(get_jwt_identity())
+    data = request.get_json() or {}
+    plans = data['plans'] if 'plans' in data else [data]
+    
+    if not isinstance(plans, list) or not plans:
+        return jsonify({'error': 'plans must be a non-empty list'}), 400
+    if len(plans) > PLAN_MAX_MEDICATIONS:
+        return jsonify({'error': f'At most {PLAN_MAX_MEDICATIONS} plans per request'}), 400
+    
+    today = datetime.utcnow().date()
+    try:
+        rows = [row for plan in plans for row in reminder_rows(plan, today)]
+    except PlanError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Verify user owns every medication, in one query
+    user_medication_ids = {row['user_medication_id'] for row in rows}
+    owners = dict(db.session.query(UserMedication.id, UserMedication.user_id).filter(
+        UserMedication.id.in_(user_medication_ids)
+    ).all())
+    missing = user_medication_ids - owners.keys()
+    if missing:
+        return jsonify({'error': f"User medication not found: {', '.join(map(str, sorted(missing)))}"}), 404
+    if any(owner != current_user_id for owner in owners.values()):
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    replaced = 0
+    if data.get('replace'):
+        replaced = Reminder.query.filter(
+            Reminder.user_medication_id.in_(user_medication_ids),
+            Reminder.is_active == True
+        ).update({'is_active': False, 'updated_at': datetime.utcnow()}, synchronize_session=False)
+    
+    ids = db.session.scalars(insert(Reminder).returning(Reminder.id), rows).all()
+    db.session.commit()
+    bump_version(user_version(REMINDERS, current_user_id))
+    
+    reminders = Reminder.query.filter(Reminder.id.in_(ids)).order_by(Reminder.id).all()
+    
+    # Programar las primeras notificaciones en un solo lote
+    now = datetime.utcnow()
+    first_doses = []
+    for reminder in reminders:
+        if reminder.event_enabled and reminder.reminder_time:
+            first = first_occurrence(reminder, reminder.start_date)
+            if first and datetime.combine(first, reminder.reminder_time) > now:
+                first_doses.append((reminder.id, datetime.combine(first, reminder.reminder_time)))
+    due_queue.schedule_many(first_doses)
+    
+    return jsonify({
+        'message': 'Reminder plan created successfully',
+        'reminders': [reminder.to_dict() for reminder in reminders],
+        'replaced': replaced
+    }), 201
+
 @reminders_bp.route('/<int:id>', methods=['PUT'])
 @jwt_required()
 def update_reminder(id):
     """Update a reminder"""
     current_user_id = int(get_jwt_identity())
-    reminder = Reminder.query.get_or_404(id)
-    
-    # Verify user owns this reminder
-    if reminder.user_medication.user_id != current_user_id:
-        return jsonify({'error': 'Unauthorized'}), 403
+    reminder = load_reminder(id, current_user_id)
     
     data = request.get_json()
     
@@ -141,6 +544,7 @@ def update_reminder(id):
         reminder.email_notification = data['email_notification']
     
     db.session.commit()
+    bump_version(user_version(REMINDERS, current_user_id))
     
     return jsonify({
         'message': 'Reminder updated successfully',
@@ -152,14 +556,11 @@ def update_reminder(id):
 def delete_reminder(id):
     """Delete a reminder"""
     current_user_id = int(get_jwt_identity())
-    reminder = Reminder.query.get_or_404(id)
-    
-    # Verify user owns this reminder
-    if reminder.user_medication.user_id != current_user_id:
-        return jsonify({'error': 'Unauthorized'}), 403
+    reminder = load_reminder(id, current_user_id)
     
     reminder.is_active = False
     db.session.commit()
+    bump_version(user_version(REMINDERS, current_user_id))
     
     return jsonify({'message': 'Reminder deleted successfully'}), 200
 
@@ -170,11 +571,7 @@ def get_reminder_logs(reminder_id):
     """Get logs for a specific reminder"""
     current_user_id = int(get_jwt_identity())
     
-    reminder = Reminder.query.get_or_404(reminder_id)
-    
-    # Verify user owns this reminder
-    if reminder.user_medication.user_id != current_user_id:
-        return jsonify({'error': 'Unauthorized'}), 403
+    load_reminder(reminder_id, current_user_id)
     
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
@@ -199,11 +596,7 @@ def update_reminder_log(log_id):
     """Update a reminder log (mark as acknowledged, etc.)"""
     current_user_id = int(get_jwt_identity())
     
-    log = ReminderLog.query.get_or_404(log_id)
-    
-    # Verify user owns this log
-    if log.reminder.user_medication.user_id != current_user_id:
-        return jsonify({'error': 'Unauthorized'}), 403
+    log = load_reminder_log(log_id, current_user_id)
     
     data = request.get_json()
     
@@ -217,23 +610,53 @@ def update_reminder_log(log_id):
         log.log_metadata = data['log_metadata']
     
     db.session.commit()
+    bump_version(user_version(REMINDERS, current_user_id))
     
     return jsonify({
         'message': 'Reminder log updated successfully',
         'log': log.to_dict()
     }), 200
 
+@reminders_bp.route('/logs/<int:log_id>/snooze', methods=['POST'])
+@jwt_required()
+def snooze_reminder_log(log_id):
+    """
+    Posponer una dosis: se vuelve a avisar dentro de N minutos y el plazo
+    para darla por perdida empieza a contar desde entonces
+    """
+    current_user_id = int(get_jwt_identity())
+    log = load_reminder_log(log_id, current_user_id)
+    
+    data = request.get_json(silent=True) or {}
+    minutes = data.get('minutes', SNOOZE_DEFAULT_MINUTES)
+    if not isinstance(minutes, int) or isinstance(minutes, bool) or not 1 <= minutes <= SNOOZE_MAX_MINUTES:
+        return jsonify({'error': f'minutes must be between 1 and {SNOOZE_MAX_MINUTES}'}), 400
+    if log.status != 'pending':
+        return jsonify({'error': f'Cannot snooze a dose that is {log.status}'}), 400
+    
+    # snoozed_until marca el plazo de check_missed_doses; scheduled_time sigue siendo la hora de la dosis
+    snoozed_until = datetime.utcnow() + timedelta(minutes=minutes)
+    metadata = dict(log.log_metadata or {})
+    metadata['snooze_count'] = metadata.get('snooze_count', 0) + 1
+    log.log_metadata = metadata
+    log.snoozed_until = snoozed_until
+    db.session.commit()
+    
+    due_queue.schedule(log.id, snoozed_until, due_queue.SNOOZE)
+    bump_version(user_version(REMINDERS, current_user_id))
+    
+    return jsonify({
+        'message': 'Dose snoozed',
+        'log': log.to_dict()
+    }), 200
+
 @reminders_bp.route('/test-notification/<int:id>', methods=['POST'])
 @jwt_required()
 def test_notification(id):
     """Enviar una notificación de prueba para un recordatorio"""
     current_user_id = int(get_jwt_identity())
     
-    reminder = Reminder.query.get_or_404(id)
-    
-    # Verify user owns this reminder
-    if reminder.user_medication.user_id != current_user_id:
-        return jsonify({'error': 'Unauthorized'}), 403
+    reminder = load_reminder(id, current_user_id)
     
     from api.tasks.notification_tasks import send_reminder_notification
     
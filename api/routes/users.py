@@ -2,6 +2,8 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from api.extensions import db
 from api.models import User, UserSetting, EmergencyContact, ActivityLog
+from api.utils.fields import requested_fields, FieldsError
+from sqlalchemy.orm import undefer_group
 from datetime import datetime
 
 users_bp = Blueprint('users', __name__, url_prefix='/api/users')
@@ -248,16 +250,35 @@ def get_activity_logs():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     
-    pagination = ActivityLog.query.filter_by(
+    # old_data y new_data solo con ?include= o en el detalle
+    try:
+        selection = requested_fields(ActivityLog)
+    except FieldsError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    pagination = selection.apply(ActivityLog.query, ActivityLog).filter_by(
         user_id=current_user_id
     ).order_by(ActivityLog.created_at.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
     
     return jsonify({
-        'logs': [log.to_dict() for log in pagination.items],
+        'logs': [log.to_dict(selection.fields) for log in pagination.items],
         'total': pagination.total,
         'page': page,
         'per_page': per_page,
         'pages': pagination.pages
     }), 200
+
+@users_bp.route('/activity-logs/<int:id>', methods=['GET'])
+@jwt_required()
+def get_activity_log(id):
+    """Get a specific activity log with its old/new data"""
+    current_user_id = int(get_jwt_identity())
+    
+    log = ActivityLog.query.options(undefer_group('details')).filter_by(
+        id=id,
+        user_id=current_user_id
+    ).first_or_404()
+    
+    return jsonify(log.to_dict()), 200
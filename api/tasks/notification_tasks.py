@@ -1,61 +1,86 @@
+from collections import Counter, defaultdict
 from datetime import datetime, timedelta
+from api import channels
+from api.channels import throttle
 from api.extensions import db
 from api.models import (
     Reminder, ReminderLog, Notification, UserMedication,
-    User, Medication, EmergencyContact
+    User, EmergencyContact
 )
+from api.utils.catalog_cache import medication_cache
+from api.utils.notification_templates import templates
+from api.utils.schedule import occurs_on
+from api.utils.unread import UNREAD, add_unread, is_unread, reconcile
+from api.utils.versioning import bump_version, user_version, REMINDERS
+from api.utils import due_queue, notification_stream
 from celery import shared_task
+from sqlalchemy import and_, func, or_, update
+from sqlalchemy.orm import joinedload
+from flask import current_app
 import logging
+import random
+import time
 
 
 logger = logging.getLogger(__name__)
 
+# Usuarios por tarea de envío de recordatorios
+REMINDER_BATCH_USERS = 200
+# Notificaciones por tarea de entrega
+NOTIFICATION_TASK_SIZE = 1000
+# Segundos que una tarea tiene reservadas las notificaciones que envía
+NOTIFICATION_LEASE = 600
+
 
 @shared_task(name='tasks.notification_tasks.check_and_send_reminders')
 def check_and_send_reminders():
     """
-    Verifica recordatorios activos y envía notificaciones para las próximas dosis
+    Verifica recordatorios activos y envía notificaciones para las próximas dosis.
+    Las dosis de un mismo usuario se envían juntas, en lotes de usuarios
     """
     try:
         now = datetime.utcnow()
         current_time = now.time()
         current_date = now.date()
         
-        reminders = Reminder.query.filter_by(
-            is_active=True,
-            event_enabled=True
+        reminders = db.session.query(Reminder, UserMedication.user_id).join(
+            UserMedication, Reminder.user_medication_id == UserMedication.id
+        ).filter(
+            Reminder.is_active == True,
+            Reminder.event_enabled == True
         ).all()
         
-        notifications_sent = 0
+        due = [
+            (reminder.id, user_id) for reminder, user_id in reminders
+            if should_send_reminder(reminder, current_time, current_date)
+        ]
         
-        for reminder in reminders:
-            if reminder.start_date and current_date < reminder.start_date:
-                continue
-            if reminder.end_date and current_date > reminder.end_date:
-                continue
-            
-            if should_send_reminder(reminder, current_time, current_date):
-                existing_notification = Notification.query.filter_by(
-                    user_id=reminder.user_medication.user_id,
-                    reminder_id=reminder.id,
-                    status='pending'
-                ).filter(
-                    Notification.scheduled_at >= now - timedelta(minutes=30),
-                    Notification.scheduled_at <= now + timedelta(minutes=30)
-                ).first()
-                
-                if not existing_notification:
-                    send_reminder_notification.delay(reminder.id)
-                    notifications_sent += 1
+        users = _queue_reminder_batches(due)
         
-        logger.info(f"Checked reminders. Scheduled {notifications_sent} notifications.")
-        return {'notifications_scheduled': notifications_sent}
+        logger.info(f"Checked reminders. Scheduled {len(due)} doses for {users} users.")
+        return {'notifications_scheduled': len(due), 'users': users}
         
     except Exception as e:
         logger.error(f"Error checking reminders: {str(e)}")
         return {'error': str(e)}
 
 
+def _queue_reminder_batches(due):
+    """
+    Encola send_reminder_notifications para las dosis (reminder_id, user_id)
+    en lotes de REMINDER_BATCH_USERS usuarios: todas las dosis de un usuario
+    van en el mismo lote para poder agruparlas. Devuelve cuántos usuarios hay.
+    """
+    by_user = defaultdict(list)
+    for reminder_id, user_id in due:
+        by_user[user_id].append(reminder_id)
+    
+    users = list(by_user.values())
+    for i in range(0, len(users), REMINDER_BATCH_USERS):
+        send_reminder_notifications.delay([rid for ids in users[i:i + REMINDER_BATCH_USERS] for rid in ids])
+    return len(users)
+
+
 def should_send_reminder(reminder, current_time, current_date):
     if not reminder.reminder_time:
         return False
@@ -66,196 +91,466 @@ def should_send_reminder(reminder, current_time, current_date):
     if abs(reminder_minutes - current_minutes) > 1:
         return False
     
-    if reminder.frequency_type == 'daily':
-        return True
+    return occurs_on(reminder, current_date)
+
+
+def _create_reminder_notifications(user, doses, now):
+    """
+    Añade a la sesión las notificaciones de las dosis (reminder, user_med) de
+    un usuario que coinciden en el mismo minuto: un push y un email para
+    todas, en lugar de uno por medicamento
+    """
+    catalog = medication_cache.get_many(user_med.medication_id for _, user_med in doses)
+    t = templates.for_language(user.language)
     
-    if reminder.frequency_type == 'weekly':
-        if reminder.time_of_week:
-            days = [d.strip().lower() for d in reminder.time_of_week.split(',')]
-            current_day = current_date.strftime('%A').lower()
-            return current_day in days
-        return False
+    def name(user_med):
+        return user_med.custom_name or catalog[user_med.medication_id]['name']
     
-    if reminder.frequency_type == 'monthly':
-        if reminder.frequency_value:
-            return current_date.day == reminder.frequency_value
-        return False
+    notifications = []
+    push = [(r, um) for r, um in doses if r.push_notification]
+    if push:
+        if len(push) == 1:
+            user_med = push[0][1]
+            template = t['medication_reminder.push']
+            title = template.title(name=name(user_med))
+            message = template.message(dosage=user_med.prescribed_dosage or t['default.dosage'])
+        else:
+            template = t['medication_reminder.push_many']
+            item = t['medication_reminder.push_item']
+            title = template.title(count=len(push))
+            message = template.message(items='\n'.join(
+                item(name=name(um), dosage=um.prescribed_dosage or t['default.dosage']) for _, um in push
+            ))
+        notifications.append(Notification(
+            user_id=user.id,
+            reminder_id=push[0][0].id,
+            notification_type='medication_reminder',
+            title=title,
+            message=message,
+            delivery_method='push',
+            scheduled_at=now,
+            status='pending'
+        ))
     
-    if reminder.frequency_type == 'custom':
-        if reminder.start_date and reminder.frequency_value:
-            days_diff = (current_date - reminder.start_date).days
-            return days_diff % reminder.frequency_value == 0
-        return False
+    email = [(r, um) for r, um in doses if r.email_notification] if user.email else []
+    if email:
+        if len(email) == 1:
+            user_med = email[0][1]
+            template = t['medication_reminder.email']
+            title = template.title(name=name(user_med))
+            message = template.message(
+                dosage=user_med.prescribed_dosage or t['default.email_dosage'],
+                instructions=user_med.doctor_instructions or t['default.instructions']
+            )
+        else:
+            template = t['medication_reminder.email_many']
+            item = t['medication_reminder.email_item']
+            title = template.title(count=len(email))
+            message = template.message(items='\n\n'.join(
+                item(
+                    name=name(um),
+                    dosage=um.prescribed_dosage or t['default.email_dosage'],
+                    instructions=um.doctor_instructions or t['default.instructions']
+                )
+                for _, um in email
+            ))
+        notifications.append(Notification(
+            user_id=user.id,
+            reminder_id=email[0][0].id,
+            notification_type='medication_reminder',
+            title=title,
+            message=message,
+            delivery_method='email',
+            scheduled_at=now,
+            status='pending'
+        ))
     
-    return False
+    db.session.add_all(notifications)
+    return notifications
 
 
-@shared_task(name='tasks.notification_tasks.send_reminder_notification')
-def send_reminder_notification(reminder_id):
+@shared_task(name='tasks.notification_tasks.send_reminder_notifications')
+def send_reminder_notifications(reminder_ids, skip_logged=True):
+    """
+    Registra cada dosis por separado (un ReminderLog por recordatorio) y
+    envía una sola notificación por usuario y canal. Con skip_logged se
+    saltan las dosis que ya tienen registro a ±30 minutos: el barrido por
+    minuto y la cola de vencimientos pueden encolar la misma dosis.
+    """
     try:
-        reminder = Reminder.query.get(reminder_id)
-        if not reminder or not reminder.is_active:
-            return {'error': 'Reminder not found or inactive'}
-        
-        user_med = reminder.user_medication
-        medication = user_med.medication
-        user = user_med.user
+        # FOR UPDATE: dos tareas con la misma dosis no la comprueban a la vez
+        reminders = Reminder.query.options(
+            joinedload(Reminder.user_medication).joinedload(UserMedication.user)
+        ).filter(
+            Reminder.id.in_(reminder_ids),
+            Reminder.is_active == True
+        ).order_by(Reminder.reminder_time, Reminder.id).with_for_update(of=Reminder).all()
         
         now = datetime.utcnow()
-        
-        reminder_log = ReminderLog(
-            reminder_id=reminder.id,
-            scheduled_time=now,
-            status='pending'
-        )
-        db.session.add(reminder_log)
-        db.session.flush()
-        
-        notifications_created = []
-        
-        if reminder.push_notification:
-            notification = Notification(
-                user_id=user.id,
+        if skip_logged and reminders:
+            logged = {reminder_id for (reminder_id,) in db.session.query(ReminderLog.reminder_id).filter(
+                ReminderLog.reminder_id.in_([reminder.id for reminder in reminders]),
+                ReminderLog.scheduled_time >= now - timedelta(minutes=30),
+                ReminderLog.scheduled_time <= now + timedelta(minutes=30)
+            )}
+            reminders = [reminder for reminder in reminders if reminder.id not in logged]
+        
+        users = {}
+        doses = defaultdict(list)
+        for reminder in reminders:
+            user = reminder.user_medication.user
+            users[user.id] = user
+            doses[user.id].append((reminder, reminder.user_medication))
+            db.session.add(ReminderLog(
                 reminder_id=reminder.id,
-                notification_type='medication_reminder',
-                title=f"💊 Recordatorio: {user_med.custom_name or medication.name}",
-                message=f"Es hora de tomar tu medicamento: {user_med.prescribed_dosage or 'dosis prescrita'}",
-                delivery_method='push',
-                scheduled_at=now,
+                scheduled_time=now,
                 status='pending'
-            )
-            db.session.add(notification)
-            notifications_created.append('push')
+            ))
         
-        if reminder.email_notification and user.email:
-            notification = Notification(
-                user_id=user.id,
-                reminder_id=reminder.id,
-                notification_type='medication_reminder',
-                title=f"Recordatorio: {user_med.custom_name or medication.name}",
-                message=f"Es hora de tomar {user_med.prescribed_dosage or 'tu dosis prescrita'}.\n\nInstrucciones: {user_med.doctor_instructions or 'N/A'}",
-                delivery_method='email',
-                scheduled_at=now,
-                status='pending'
-            )
-            db.session.add(notification)
-            notifications_created.append('email')
+        notifications = []
+        for user_id, user_doses in doses.items():
+            notifications += _create_reminder_notifications(users[user_id], user_doses, now)
         
         db.session.commit()
+        for user_id in users:
+            bump_version(user_version(REMINDERS, user_id))
+        add_unread(Counter(notification.user_id for notification in notifications))
+        notification_stream.publish(notifications)
         
-        for notification in Notification.query.filter_by(
-            user_id=user.id,
-            reminder_id=reminder.id,
-            status='pending'
-        ).all():
-            send_notification.delay(notification.id)
+        if notifications:
+            send_notifications.delay([notification.id for notification in notifications])
         
-        logger.info(f"Created notifications for reminder {reminder_id}: {notifications_created}")
+        logger.info(
+            f"Created {len(notifications)} notifications for {len(reminders)} doses of {len(users)} users"
+        )
         return {
-            'reminder_id': reminder_id,
-            'notifications_created': notifications_created
+            'doses': len(reminders),
+            'users': len(users),
+            'notifications_created': len(notifications)
         }
         
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error sending reminder notification: {str(e)}")
+        logger.error(f"Error sending reminder notifications: {str(e)}")
         return {'error': str(e)}
 
 
-@shared_task(name='tasks.notification_tasks.send_notification')
-def send_notification(notification_id):
+@shared_task(name='tasks.notification_tasks.send_reminder_notification')
+def send_reminder_notification(reminder_id):
+    """Una sola dosis (notificación de prueba y mensajes ya encolados)"""
+    reminder = Reminder.query.get(reminder_id)
+    if not reminder or not reminder.is_active:
+        return {'error': 'Reminder not found or inactive'}
+    
+    # Prueba: se envía aunque la dosis ya esté registrada
+    result = send_reminder_notifications([reminder_id], skip_logged=False)
+    if 'error' in result:
+        return result
+    return {
+        'reminder_id': reminder_id,
+        'notifications_created': result['notifications_created']
+    }
+
+
+@shared_task(name='tasks.notification_tasks.send_snoozed_reminder')
+def send_snoozed_reminder(log_id, due_at):
+    """Vuelve a avisar de una dosis pospuesta, sin crear otro ReminderLog"""
     try:
-        notification = Notification.query.get(notification_id)
-        if not notification:
-            return {'error': 'Notification not found'}
-        
-        logger.info(f"Sending {notification.delivery_method} notification to user {notification.user_id}")
+        log = ReminderLog.query.get(log_id)
+        if not log or log.status != 'pending':
+            return {'skipped': 'Dose already handled'}
+        # Pospuesta otra vez después de programar este aviso: vale el último
+        if not log.snoozed_until or abs((log.snoozed_until - datetime.fromisoformat(due_at)).total_seconds()) >= 1:
+            return {'skipped': 'Snoozed again'}
+        
+        reminder = log.reminder
+        if not reminder.is_active:
+            return {'error': 'Reminder inactive'}
+        user_med = reminder.user_medication
         
-        notification.sent_at = datetime.utcnow()
-        notification.status = 'sent'
+        notifications = _create_reminder_notifications(user_med.user, [(reminder, user_med)], datetime.utcnow())
         db.session.commit()
+        add_unread({user_med.user_id: len(notifications)})
+        notification_stream.publish(notifications)
         
+        if notifications:
+            send_notifications.delay([notification.id for notification in notifications])
+        
+        logger.info(f"Re-sent snoozed reminder log {log_id}: {len(notifications)} notifications")
         return {
-            'notification_id': notification_id,
-            'status': 'sent',
-            'method': notification.delivery_method
+            'reminder_log_id': log_id,
+            'notifications_created': [n.delivery_method for n in notifications]
         }
         
     except Exception as e:
-        if notification.retry_count < 3:
-            notification.retry_count += 1
-            notification.error_message = str(e)
-            db.session.commit()
-            
-            send_notification.apply_async(
-                args=[notification_id],
-                countdown=300
-            )
+        db.session.rollback()
+        logger.error(f"Error sending snoozed reminder: {str(e)}")
+        return {'error': str(e)}
+
+
+def _ready():
+    return and_(
+        Notification.status == 'pending',
+        or_(Notification.scheduled_at.is_(None), Notification.scheduled_at <= datetime.utcnow())
+    )
+
+
+def _claim(notification_ids):
+    """
+    Reserva las notificaciones listas moviendo scheduled_at al final de un
+    plazo (NOTIFICATION_LEASE): otra tarea ya no las toma y, si el worker
+    muere, vuelven a estar listas al vencer. Devuelve [(id, delivery_method)].
+    """
+    if not notification_ids:
+        return []
+    lease = datetime.utcnow() + timedelta(seconds=NOTIFICATION_LEASE)
+    claimed = db.session.execute(
+        update(Notification).where(
+            Notification.id.in_(notification_ids), _ready()
+        ).values(scheduled_at=lease).returning(
+            Notification.id, Notification.delivery_method
+        ).execution_options(synchronize_session=False)
+    ).all()
+    db.session.commit()
+    return [tuple(row) for row in claimed]
+
+
+def _rate_limit(method):
+    rate, burst = current_app.config['NOTIFICATION_RATE_LIMITS'][method]
+    return rate, burst
+
+
+def _retry_delay(attempt):
+    """Backoff exponencial con jitter: entre la mitad y el total de base * 2^(intento - 1)"""
+    config = current_app.config
+    delay = min(config['NOTIFICATION_RETRY_MAX_DELAY'], config['NOTIFICATION_RETRY_BASE_DELAY'] * 2 ** (attempt - 1))
+    return timedelta(seconds=delay / 2 + random.uniform(0, delay / 2))
+
+
+def _deliver(notification_ids):
+    """Entrega notificaciones ya reservadas y registra el resultado de cada una"""
+    started = time.perf_counter()
+    rows = db.session.query(Notification, User).join(
+        User, Notification.user_id == User.id
+    ).filter(
+        Notification.id.in_(notification_ids),
+        Notification.status == 'pending'
+    ).order_by(Notification.id).all()
+    
+    by_method = defaultdict(list)
+    for notification, user in rows:
+        by_method[notification.delivery_method].append((notification, user))
+    
+    failures = {}
+    for method, items in by_method.items():
+        failures.update(channels.deliver(method, items))
+    
+    now = datetime.utcnow()
+    max_retries = current_app.config['NOTIFICATION_MAX_RETRIES']
+    retrying = dead = 0
+    for notification, _ in rows:
+        # Fin de la reserva: scheduled_at vuelve a la hora del intento
+        notification.scheduled_at -= timedelta(seconds=NOTIFICATION_LEASE)
+        error = failures.get(notification.id)
+        if error is None:
+            notification.sent_at = now
+            notification.status = 'sent'
+            continue
+        notification.error_message = error
+        if (notification.retry_count or 0) < max_retries:
+            notification.retry_count = (notification.retry_count or 0) + 1
+            notification.scheduled_at = now + _retry_delay(notification.retry_count)
+            retrying += 1
         else:
+            # Reintentos agotados: queda como 'failed' (dead letter) hasta que se reenvíe
             notification.status = 'failed'
-            notification.error_message = str(e)
-            db.session.commit()
+            dead += 1
+    db.session.commit()
+    
+    elapsed = time.perf_counter() - started
+    per_second = round(len(rows) / elapsed, 1) if elapsed else 0
+    logger.info(
+        f"Delivered {len(rows) - len(failures)} of {len(rows)} notifications "
+        f"in {elapsed:.3f}s ({per_second}/s), {retrying} to retry, {dead} dead-lettered"
+    )
+    return {
+        'sent': len(rows) - len(failures),
+        'failed': dead,
+        'retrying': retrying,
+        'per_second': per_second
+    }
+
+
+@shared_task(name='tasks.notification_tasks.send_notifications')
+def send_notifications(notification_ids):
+    """
+    Entrega notificaciones pendientes agrupadas por canal: cada backend recibe
+    lotes, de modo que una llamada al proveedor cubre muchos mensajes. Solo se
+    envía lo que permite el token bucket del canal; el resto queda pendiente
+    para dispatch_notifications
+    """
+    try:
+        by_method = defaultdict(list)
+        for notification_id, method in _claim(notification_ids):
+            by_method[method].append(notification_id)
+        
+        allowed = []
+        deferred = 0
+        for method, ids in by_method.items():
+            rate, burst = _rate_limit(method)
+            granted = throttle.take(method, channels.get_backend(method).provider, len(ids), rate, burst)
+            allowed += ids[:granted]
+            if granted < len(ids):
+                # Se liberan para cuando el bucket se haya rellenado
+                db.session.execute(
+                    update(Notification).where(Notification.id.in_(ids[granted:])).values(
+                        scheduled_at=datetime.utcnow() + timedelta(seconds=(len(ids) - granted) / rate)
+                    ).execution_options(synchronize_session=False)
+                )
+                deferred += len(ids) - granted
+        db.session.commit()
         
-        logger.error(f"Error sending notification {notification_id}: {str(e)}")
+        result = _deliver(allowed)
+        result['deferred'] = deferred
+        return result
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error sending notifications: {str(e)}")
+        return {'error': str(e)}
+
+
+@shared_task(name='tasks.notification_tasks.deliver_notifications')
+def deliver_notifications(notification_ids):
+    """Entrega notificaciones que dispatch_notifications ya reservó y dosificó"""
+    try:
+        return _deliver(notification_ids)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error delivering notifications: {str(e)}")
         return {'error': str(e)}
 
 
+@shared_task(name='tasks.notification_tasks.dispatch_notifications')
+def dispatch_notifications():
+    """
+    Toma de cada canal tantas notificaciones listas (nuevas, aplazadas por el
+    límite o con su reintento vencido) como tokens tenga su bucket
+    """
+    try:
+        dispatched = {}
+        for method in channels.METHODS:
+            rate, burst = _rate_limit(method)
+            ready = [notification_id for (notification_id,) in db.session.query(Notification.id).filter(
+                _ready(),
+                Notification.delivery_method == method
+            ).order_by(Notification.scheduled_at).limit(burst)]
+            granted = throttle.take(method, channels.get_backend(method).provider, len(ready), rate, burst)
+            ids = [notification_id for notification_id, _ in _claim(ready[:granted])]
+            for start in range(0, len(ids), NOTIFICATION_TASK_SIZE):
+                deliver_notifications.delay(ids[start:start + NOTIFICATION_TASK_SIZE])
+            dispatched[method] = len(ids)
+        
+        if any(dispatched.values()):
+            logger.info(f"Dispatched pending notifications: {dispatched}")
+        return dispatched
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error dispatching notifications: {str(e)}")
+        return {'error': str(e)}
+
+
+@shared_task(name='tasks.notification_tasks.send_notification')
+def send_notification(notification_id):
+    """Una sola notificación (mensajes ya encolados con la firma anterior)"""
+    notification = Notification.query.get(notification_id)
+    if not notification:
+        return {'error': 'Notification not found'}
+    
+    result = send_notifications([notification_id])
+    if 'error' in result:
+        return result
+    db.session.refresh(notification)
+    return {
+        'notification_id': notification_id,
+        'status': notification.status,
+        'method': notification.delivery_method
+    }
+
+
 @shared_task(name='tasks.notification_tasks.check_missed_doses')
 def check_missed_doses():
     try:
         now = datetime.utcnow()
         cutoff_time = now - timedelta(minutes=30)
         
-        missed_logs = ReminderLog.query.filter(
+        missed_logs = db.session.query(ReminderLog, UserMedication).join(
+            Reminder, ReminderLog.reminder_id == Reminder.id
+        ).join(
+            UserMedication, Reminder.user_medication_id == UserMedication.id
+        ).filter(
             ReminderLog.status == 'pending',
-            ReminderLog.scheduled_time < cutoff_time
+            func.coalesce(ReminderLog.snoozed_until, ReminderLog.scheduled_time) < cutoff_time
         ).all()
         
+        catalog = medication_cache.get_many(user_med.medication_id for _, user_med in missed_logs)
+        
         notifications_sent = 0
+        notifications = []
         
-        for log in missed_logs:
+        for log, user_med in missed_logs:
             log.status = 'missed'
             reminder = log.reminder
-            user_med = reminder.user_medication
-            medication = user_med.medication
+            medication = catalog[user_med.medication_id]
             user = user_med.user
+            t = templates.for_language(user.language)
             
+            template = t['missed_dose.push']
             notification = Notification(
                 user_id=user.id,
                 reminder_id=reminder.id,
                 notification_type='missed_dose',
-                title="⚠️ Dosis perdida",
-                message=f"No has registrado la toma de {user_med.custom_name or medication.name}",
+                title=template.title(),
+                message=template.message(name=user_med.custom_name or medication['name']),
                 delivery_method='push',
                 scheduled_at=now,
                 status='pending'
             )
-            db.session.add(notification)
+            notifications.append(notification)
             
-            if medication.criticality in ['high', 'critical']:
+            if medication['criticality'] in ['high', 'critical']:
                 emergency_contacts = EmergencyContact.query.filter_by(
                     user_id=user.id,
                     notify_missed_doses=True
                 ).all()
                 
+                template = t['emergency_alert.email']
                 for contact in emergency_contacts:
                     if contact.email:
-                        db.session.add(Notification(
+                        notifications.append(Notification(
                             user_id=user.id,
                             notification_type='emergency_alert',
-                            title=f"Alerta: Dosis perdida - {user.first_name}",
-                            message=f"{user.first_name} no ha tomado su medicamento {medication.name}",
+                            title=template.title(first_name=user.first_name or user.username),
+                            message=template.message(first_name=user.first_name or user.username, name=medication['name']),
                             delivery_method='email',
+                            recipient=contact.email,
                             scheduled_at=now,
                             status='pending'
                         ))
             
             notifications_sent += 1
         
+        db.session.add_all(notifications)
         db.session.commit()
+        for user_id in {user_med.user_id for _, user_med in missed_logs}:
+            bump_version(user_version(REMINDERS, user_id))
+        # Las alertas a los contactos no son avisos pendientes del paciente
+        add_unread(Counter(notification.user_id for notification in notifications if is_unread(notification)))
+        notification_stream.publish(notifications)
         
-        for notif in Notification.query.filter_by(status='pending').all():
-            send_notification.delay(notif.id)
+        for start in range(0, len(notifications), NOTIFICATION_TASK_SIZE):
+            send_notifications.delay([n.id for n in notifications[start:start + NOTIFICATION_TASK_SIZE]])
         
         logger.info(
             f"Checked missed doses. Found {len(missed_logs)} missed, sent {notifications_sent} alerts."
@@ -274,17 +569,24 @@ def check_missed_doses():
 def cleanup_old_notifications():
     try:
         cutoff_date = datetime.utcnow() - timedelta(days=30)
-        
-        deleted_count = Notification.query.filter(
+        old_notifications = Notification.query.filter(
             Notification.created_at < cutoff_date,
             Notification.status == 'read'
-        ).delete()
+        )
+        
+        # Normalmente ninguna: las leídas tienen read_at
+        unread = dict(old_notifications.filter(UNREAD).with_entities(
+            Notification.user_id, func.count(Notification.id)
+        ).group_by(Notification.user_id).all())
+        
+        deleted_count = old_notifications.delete()
         
         old_logs = ReminderLog.query.filter(
             ReminderLog.created_at < cutoff_date
         ).delete()
         
         db.session.commit()
+        add_unread({user_id: -count for user_id, count in unread.items()})
         
         logger.info(f"Cleaned {deleted_count} notifications & {old_logs} logs")
         return {
@@ -297,12 +599,77 @@ def cleanup_old_notifications():
         return {'error': str(e)}
 
 
+@shared_task(name='tasks.notification_tasks.reconcile_unread_counts')
+def reconcile_unread_counts():
+    """Drop unread counters that drifted from the database; the next read recounts them"""
+    try:
+        checked, dropped = reconcile()
+        if dropped:
+            logger.info(f"Dropped {dropped} of {checked} unread counters that drifted.")
+        return {'checked': checked, 'dropped': dropped}
+        
+    except Exception as e:
+        logger.error(f"Error reconciling unread counts: {str(e)}")
+        return {'error': str(e)}
+
+
+@shared_task(name='tasks.notification_tasks.dispatch_due_reminders')
+def dispatch_due_reminders():
+    """
+    Envía los recordatorios programados en la cola de vencimientos cuya hora
+    ya llegó. Los que vencieron hace más de DUE_REMINDERS_MAX_DELAY (p. ej.
+    tras una caída) se descartan. Cada aviso se confirma en la cola solo
+    después de encolar su tarea, así un error del broker no lo pierde.
+    """
+    try:
+        now = datetime.utcnow()
+        max_delay = timedelta(seconds=current_app.config['DUE_REMINDERS_MAX_DELAY'])
+        fires = due_queue.claim_due(now, current_app.config['DUE_REMINDERS_CLAIM_TIMEOUT'])
+        
+        dispatched = 0
+        expired = 0
+        first_fires = []
+        done = []  # encolados o descartados: se confirman aunque luego falle otro
+        try:
+            for fire in fires:
+                kind, object_id, due_at = fire
+                if now - due_at > max_delay:
+                    expired += 1
+                    done.append(fire)
+                    continue
+                if kind == due_queue.SNOOZE:
+                    send_snoozed_reminder.delay(object_id, due_at.isoformat())
+                    done.append(fire)
+                else:
+                    first_fires.append(fire)
+                dispatched += 1
+            
+            if first_fires:
+                due = db.session.query(Reminder.id, UserMedication.user_id).join(
+                    UserMedication, Reminder.user_medication_id == UserMedication.id
+                ).filter(Reminder.id.in_({object_id for _, object_id, _ in first_fires})).all()
+                db.session.rollback()  # no dejar abierta la transacción de lectura
+                _queue_reminder_batches(due)
+                done.extend(first_fires)
+        finally:
+            # Los no confirmados se reclaman pasado DUE_REMINDERS_CLAIM_TIMEOUT
+            due_queue.ack(done)
+        
+        if dispatched or expired:
+            logger.info(f"Dispatched {dispatched} due reminders, dropped {expired} expired.")
+        return {'dispatched': dispatched, 'expired': expired}
+        
+    except Exception as e:
+        logger.error(f"Error dispatching due reminders: {str(e)}")
+        return {'error': str(e)}
+
+
 @shared_task(name='tasks.notification_tasks.schedule_reminder')
 def schedule_reminder(reminder_id, scheduled_datetime):
-    send_reminder_notification.apply_async(
-        args=[reminder_id],
-        eta=scheduled_datetime
-    )
+    """Kept for messages queued by older versions: moves the fire to the due queue"""
+    if isinstance(scheduled_datetime, str):
+        scheduled_datetime = datetime.fromisoformat(scheduled_datetime)
+    due_queue.schedule(reminder_id, scheduled_datetime)
     
     return {
         'reminder_id': reminder_id,
@@ -0,0 +1,101 @@
+"""
+Adherence calculations shared by the metrics and dashboard endpoints.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from api.extensions import db
+from api.models import MedicationIntake, CRITICALITY_WEIGHTS
+
+# Un día cumple si la adherencia ponderada llega a este porcentaje
+COMPLIANCE_THRESHOLD = 80
+
+
+def expected_doses_per_day(frequency):
+    """Calculate expected doses per day from frequency string"""
+    if not frequency:
+        return 1
+
+    freq_lower = frequency.lower().strip()
+
+    if any(term in freq_lower for term in ['dos veces', '2 veces', 'twice']):
+        return 2
+    if any(term in freq_lower for term in ['tres veces', '3 veces', 'three times']):
+        return 3
+    if any(term in freq_lower for term in ['cuatro veces', '4 veces', 'four times']):
+        return 4
+    if 'cada 12 horas' in freq_lower or 'every 12 hours' in freq_lower:
+        return 2
+    if 'cada 8 horas' in freq_lower or 'every 8 hours' in freq_lower:
+        return 3
+    if 'cada 6 horas' in freq_lower or 'every 6 hours' in freq_lower:
+        return 4
+
+    return 1
+
+
+def daily_adherence(user_meds, start_date, days):
+    """
+    Per-day adherence for (user_medication, serialized medication) pairs.
+
+    Intakes of every medication and day are counted in a single grouped
+    query instead of one query per medication and day.
+    """
+    if not user_meds:
+        return []
+
+    end_date = start_date + timedelta(days=days - 1)
+    intake_day = func.date(MedicationIntake.status_at)
+    rows = db.session.query(
+        intake_day,
+        MedicationIntake.user_medication_id,
+        MedicationIntake.status,
+        func.count(MedicationIntake.id)
+    ).filter(
+        MedicationIntake.user_medication_id.in_([um.id for um, _ in user_meds]),
+        MedicationIntake.status_at >= datetime.combine(start_date, datetime.min.time()),
+        MedicationIntake.status_at <= datetime.combine(end_date, datetime.max.time())
+    ).group_by(intake_day, MedicationIntake.user_medication_id, MedicationIntake.status).all()
+
+    # SQLite devuelve la fecha como texto, PostgreSQL como date
+    counts = {}
+    for day, user_medication_id, status, count in rows:
+        counts[(str(day)[:10], user_medication_id, status)] = count
+
+    daily_metrics = []
+    for day_offset in range(days):
+        current_day = (start_date + timedelta(days=day_offset)).isoformat()
+
+        day_weight = 0
+        day_weighted_taken = 0
+        day_simple_taken = 0
+        day_expected = 0
+        day_missed_critical = 0
+
+        for user_med, medication in user_meds:
+            weight = CRITICALITY_WEIGHTS.get(medication['criticality'], 2)
+            doses_per_day = expected_doses_per_day(user_med.prescribed_frequency)
+            taken = counts.get((current_day, user_med.id, 'taken'), 0)
+            missed = counts.get((current_day, user_med.id, 'missed'), 0)
+
+            day_weight += weight * doses_per_day
+            day_weighted_taken += taken * weight
+            day_simple_taken += taken
+            day_expected += doses_per_day
+
+            if medication['criticality'] == 'critical':
+                day_missed_critical += missed
+
+        simple_adherence = (day_simple_taken / day_expected * 100) if day_expected > 0 else 0
+        weighted_adherence = (day_weighted_taken / day_weight * 100) if day_weight > 0 else 0
+
+        daily_metrics.append({
+            'date': current_day,
+            'taken_count': day_simple_taken,
+            'expected_count': day_expected,
+            'simple_adherence': round(simple_adherence, 2),
+            'weighted_adherence': round(weighted_adherence, 2),
+            'missed_critical': day_missed_critical,
+            'is_compliant': weighted_adherence >= COMPLIANCE_THRESHOLD
+        })
+
+    return daily_metrics
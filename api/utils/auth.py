@@ -0,0 +1,13 @@
+from functools import wraps
+from flask import current_app, jsonify
+from flask_jwt_extended import get_jwt_identity
+
+
+def admin_required(fn):
+    """Restrict a @jwt_required view to the users listed in ADMIN_USER_IDS"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if int(get_jwt_identity()) not in current_app.config.get('ADMIN_USER_IDS', set()):
+            return jsonify({'error': 'Unauthorized'}), 403
+        return fn(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,159 @@
+"""
+Process-local read-through cache of serialized Medication rows.
+
+The catalog changes rarely but is read on almost every request and task, so
+each worker keeps an LRU of serialized medications keyed by id. The
+whole cache is dropped whenever the shared catalog version in Redis moves;
+the version is read at most once per CATALOG_CACHE_CHECK_INTERVAL seconds.
+
+Cached dicts are shared between callers and must be treated as read-only.
+"""
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from api.extensions import db
+from api.models import Medication
+from api.utils.normalization import normalize_barcode, normalize_medication_name, normalize_strength
+from api.utils.medication_index import medication_index
+from api.utils.serializers import serializer_for
+from api.utils.versioning import get_version, bump_version, CATALOG
+
+# Without Redis we cannot see other workers' writes, so expire everything instead
+FALLBACK_TTL = 30
+
+
+class MedicationCache:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._items = OrderedDict()
+        self._version = None
+        self._checked_at = 0
+        self._loaded_at = 0
+
+    def get(self, medication_id):
+        """Return the serialized medication or None if it does not exist"""
+        if medication_id is None:
+            return None
+        return self.get_many([medication_id]).get(medication_id)
+
+    def get_many(self, medication_ids):
+        """Return {id: serialized medication} loading all misses in one query"""
+        self._check_version()
+        ids = {medication_id for medication_id in medication_ids if medication_id is not None}
+
+        found = {}
+        with self._lock:
+            for medication_id in ids:
+                item = self._items.get(medication_id)
+                if item is not None:
+                    self._items.move_to_end(medication_id)
+                    found[medication_id] = item
+
+        missing = ids - found.keys()
+        if missing:
+            serializer = serializer_for(Medication)
+            rows = db.session.query(*serializer.columns()).filter(Medication.id.in_(missing)).all()
+            loaded = {row.id: serializer.dump_row(row) for row in rows}
+            self._store(loaded)
+            found.update(loaded)
+
+        return found
+
+    def invalidate(self, medication_id=None):
+        """Drop one medication, or everything when no id is given"""
+        with self._lock:
+            if medication_id is None:
+                self._items.clear()
+            else:
+                self._items.pop(medication_id, None)
+
+    def _store(self, items):
+        max_size = current_app.config.get('CATALOG_CACHE_SIZE', 5000)
+        with self._lock:
+            if not self._items:
+                self._loaded_at = time.monotonic()
+            self._items.update(items)
+            while len(self._items) > max_size:
+                self._items.popitem(last=False)
+
+    def _check_version(self):
+        now = time.monotonic()
+        interval = current_app.config.get('CATALOG_CACHE_CHECK_INTERVAL', 1)
+        if now - self._checked_at < interval:
+            return
+        self._checked_at = now
+
+        version = get_version(CATALOG)
+        with self._lock:
+            if version is None:
+                if now - self._loaded_at > FALLBACK_TTL:
+                    self._items.clear()
+            elif version != self._version:
+                self._items.clear()
+                self._version = version
+
+
+medication_cache = MedicationCache()
+
+
+def catalog_changed(medication):
+    """Publish a committed catalog write to every worker"""
+    version = bump_version(CATALOG)
+    medication_cache.invalidate(medication.id)
+    medication_index.note_write(medication, version)
+
+
+def catalog_reloaded():
+    """Publish a bulk catalog change; workers re-sync on their next read"""
+    bump_version(CATALOG)
+    medication_cache.invalidate()
+
+
+def find_by_barcodes(codes):
+    """Resolve barcodes/NDC codes to serialized active medications with one index probe"""
+    keys = {code: normalize_barcode(code) for code in codes if code}
+    wanted = {key for key in keys.values() if key}
+    ids = {}
+    if wanted:
+        ids = dict(db.session.query(
+            Medication.normalized_barcode,
+            Medication.id
+        ).filter(
+            Medication.normalized_barcode.in_(wanted),
+            Medication.is_active == True
+        ).all())
+    catalog = medication_cache.get_many(ids.values())
+    return {code: catalog.get(ids.get(key)) for code, key in keys.items()}
+
+
+def find_by_names(names):
+    """
+    Resolve medication names to serialized active medications by normalized
+    name and strength. A name with a dosage only matches that strength; one
+    without prefers the entry without strength, then the oldest.
+    """
+    keys = {name: (normalize_medication_name(name), normalize_strength(name)) for name in names if name}
+    wanted = {key for key, _ in keys.values() if key}
+    ids = {}
+    if wanted:
+        # Oldest entry wins when several products share a name and strength
+        rows = db.session.query(
+            Medication.normalized_name,
+            Medication.normalized_strength,
+            Medication.id
+        ).filter(
+            Medication.normalized_name.in_(wanted),
+            Medication.is_active == True
+        ).order_by(Medication.id.desc()).all()
+        for key, strength, medication_id in rows:
+            ids[key, strength] = medication_id
+            ids[key, None] = medication_id  # nombre sin dosis: la más antigua de cualquier dosis...
+        for key in wanted:
+            if (key, '') in ids:
+                ids[key, None] = ids[key, '']  # ...salvo que haya una entrada sin dosis
+    catalog = medication_cache.get_many(ids.values())
+    return {
+        name: catalog.get(ids.get((key, strength or None)))
+        for name, (key, strength) in keys.items()
+    }
@@ -0,0 +1,312 @@
+"""
+Bulk import of medication catalogs (CSV or JSON lines).
+
+Records are streamed into a temporary staging table with PostgreSQL COPY,
+validated and de-duplicated there with set-based statements, then upserted
+into `medications` in two statements: rows matching an existing medication
+by normalized barcode (or by normalized name and strength when they carry no
+barcode) are
+updated, the rest are inserted. Nothing is visible to other sessions until the final
+commit, and a dry run rolls everything back after computing the counts.
+"""
+import csv
+import json
+import logging
+import time
+from itertools import islice
+from api.extensions import db
+from api.utils.normalization import normalize_barcode, normalize_medication_name, normalize_strength
+from api.utils.catalog_cache import catalog_reloaded
+
+logger = logging.getLogger(__name__)
+
+VALID_CRITICALITIES = ('low', 'medium', 'high', 'critical')
+
+TEXT_COLUMNS = (
+    'name', 'generic_name', 'brand_name', 'description', 'manufacturer',
+    'dosage_form', 'strength', 'route_of_administration', 'uses',
+    'contraindications', 'storage_instructions', 'barcode', 'image_url'
+)
+STAGING_COLUMNS = ('line_no',) + TEXT_COLUMNS + (
+    'normalized_name', 'normalized_strength', 'normalized_barcode', 'requires_prescription', 'criticality'
+)
+# Columns copied from the staging table into medications
+UPSERT_COLUMNS = TEXT_COLUMNS + (
+    'normalized_name', 'normalized_strength', 'normalized_barcode', 'requires_prescription'
+)
+
+_TRUE_VALUES = {'1', 'true', 't', 'yes', 'y', 'si', 'sí'}
+_FALSE_VALUES = {'0', 'false', 'f', 'no', 'n'}
+MAX_REPORTED_ERRORS = 20
+
+
+class CatalogImportError(Exception):
+    pass
+
+
+def detect_format(filename):
+    if filename and filename.lower().endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return 'csv'
+
+
+def iter_records(stream, fmt):
+    """Yield one dict per catalog record from a text stream"""
+    if fmt == 'jsonl':
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    elif fmt == 'csv':
+        yield from csv.DictReader(stream)
+    else:
+        raise CatalogImportError(f'Unsupported format: {fmt}')
+
+
+def _copy_value(value):
+    if value is None or value == '':
+        return '\\N'
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+
+def _bool_value(value):
+    """'t' or 'f', None when empty; other values are staged as given and rejected by _validate"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    folded = str(value).strip().lower()
+    if folded in _TRUE_VALUES:
+        return 't'
+    if folded in _FALSE_VALUES:
+        return 'f'
+    return str(value).strip()
+
+
+def _copy_line(line_no, record):
+    values = [str(line_no)]
+    for column in TEXT_COLUMNS:
+        value = record.get(column)
+        values.append(_copy_value(value.strip() if isinstance(value, str) else value))
+    values.append(_copy_value(normalize_medication_name(record.get('name'))))
+    strength = record.get('strength')
+    strength = normalize_strength(record.get('name'), strength if isinstance(strength, str) else None)
+    # Vacío y no NULL cuando no hay dosis: forma parte de la clave
+    values.append(_copy_value(strength) if strength else '')
+    values.append(_copy_value(normalize_barcode(record.get('barcode'))))
+    values.append(_copy_value(_bool_value(record.get('requires_prescription'))))
+    criticality = record.get('criticality')
+    values.append(_copy_value(criticality.strip().lower() if isinstance(criticality, str) else criticality))
+    return ('\t'.join(values) + '\n').encode('utf-8')
+
+
+class _CopyStream:
+    """File-like object feeding COPY ... FROM STDIN from an iterator of lines"""
+
+    def __init__(self, lines):
+        self._lines = lines
+        self._buffer = bytearray()
+        self.count = 0
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+            self.count += 1
+        if size < 0:
+            size = len(self._buffer)
+        chunk = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return chunk
+
+
+def _stage(cursor, records, batch_size, progress):
+    cursor.execute(f"""
+        CREATE TEMP TABLE medications_import (
+            line_no integer PRIMARY KEY,
+            {', '.join(f'{column} text' for column in TEXT_COLUMNS)},
+            normalized_name text,
+            normalized_strength text,
+            normalized_barcode text,
+            requires_prescription text,
+            criticality text,
+            medication_id integer
+        ) ON COMMIT DROP
+    """)
+
+    copy_sql = f"COPY medications_import ({', '.join(STAGING_COLUMNS)}) FROM STDIN"
+    numbered = enumerate(records, start=1)
+    started = time.monotonic()
+    staged = 0
+    while True:
+        batch = _CopyStream(_copy_line(n, record) for n, record in islice(numbered, batch_size))
+        cursor.copy_expert(copy_sql, batch, size=65536)
+        if not batch.count:
+            break
+        staged += batch.count
+        if progress:
+            progress(staged, time.monotonic() - started)
+    return staged
+
+
+def _reject(cursor, condition, reason, errors):
+    """Drop invalid staging rows, keeping a sample of them for the report"""
+    cursor.execute(f"""
+        DELETE FROM medications_import WHERE {condition}
+        RETURNING line_no, name, criticality
+    """)
+    rows = cursor.fetchall()
+    for line_no, name, criticality in rows[:MAX_REPORTED_ERRORS - len(errors)]:
+        errors.append({'line': line_no, 'name': name, 'criticality': criticality, 'error': reason})
+    return len(rows)
+
+
+def _validate(cursor, errors):
+    rejected = _reject(cursor, 'normalized_name IS NULL', 'name is required', errors)
+    valid = ', '.join(f"'{value}'" for value in VALID_CRITICALITIES)
+    rejected += _reject(
+        cursor,
+        f'criticality IS NOT NULL AND criticality NOT IN ({valid})',
+        f'criticality must be one of: {", ".join(VALID_CRITICALITIES)}',
+        errors
+    )
+    rejected += _reject(
+        cursor,
+        "requires_prescription IS NOT NULL AND requires_prescription NOT IN ('t', 'f')",
+        'requires_prescription must be true or false (yes/no, 1/0)',
+        errors
+    )
+
+    # The last occurrence of a medication in the file wins
+    cursor.execute("""
+        DELETE FROM medications_import
+        WHERE line_no IN (
+            SELECT line_no FROM (
+                SELECT line_no, row_number() OVER (
+                    PARTITION BY COALESCE(normalized_barcode, 'name:' || normalized_name || ':' || normalized_strength)
+                    ORDER BY line_no DESC
+                ) AS position
+                FROM medications_import
+            ) ranked
+            WHERE position > 1
+        )
+    """)
+    duplicates = cursor.rowcount
+    cursor.execute("ANALYZE medications_import")
+    return rejected, duplicates
+
+
+def _match(cursor):
+    cursor.execute("""
+        UPDATE medications_import s
+        SET medication_id = m.id
+        FROM medications m
+        WHERE m.normalized_barcode = s.normalized_barcode
+    """)
+    cursor.execute("""
+        UPDATE medications_import s
+        SET medication_id = m.id
+        FROM medications m
+        WHERE s.medication_id IS NULL
+          AND s.normalized_barcode IS NULL
+          AND m.normalized_barcode IS NULL
+          AND m.is_active
+          AND m.normalized_name = s.normalized_name
+          AND m.normalized_strength = s.normalized_strength
+    """)
+    cursor.execute("""
+        SELECT count(*) FILTER (WHERE medication_id IS NOT NULL),
+               count(*) FILTER (WHERE medication_id IS NULL)
+        FROM medications_import
+    """)
+    return cursor.fetchone()
+
+
+def _upsert(cursor):
+    # requires_prescription se guarda como texto en staging hasta validarlo
+    assignments = ', '.join(
+        f'{column} = COALESCE(s.{column}::boolean, m.{column})' if column == 'requires_prescription'
+        else f'{column} = COALESCE(s.{column}, m.{column})'
+        for column in UPSERT_COLUMNS
+    )
+    cursor.execute(f"""
+        UPDATE medications m
+        SET {assignments},
+            criticality = COALESCE(s.criticality, m.criticality::text)::medication_criticality_enum,
+            is_active = true,
+            updated_at = now() AT TIME ZONE 'utc'
+        FROM medications_import s
+        WHERE m.id = s.medication_id
+    """)
+    updated = cursor.rowcount
+
+    columns = ', '.join(UPSERT_COLUMNS)
+    # Los valores por defecto del modelo (requires_prescription=True) no aplican a un INSERT ... SELECT
+    values = ', '.join(
+        'COALESCE(requires_prescription::boolean, true)' if column == 'requires_prescription' else column
+        for column in UPSERT_COLUMNS
+    )
+    cursor.execute(f"""
+        INSERT INTO medications ({columns}, criticality, is_active, created_at, updated_at)
+        SELECT {values},
+               COALESCE(criticality, 'medium')::medication_criticality_enum,
+               true,
+               now() AT TIME ZONE 'utc',
+               now() AT TIME ZONE 'utc'
+        FROM medications_import
+        WHERE medication_id IS NULL
+        ORDER BY line_no
+    """)
+    return updated, cursor.rowcount
+
+
+def import_catalog(records, dry_run=False, batch_size=50000, progress=None):
+    """
+    Stage, validate and upsert catalog records in one transaction.
+
+    `progress(rows_staged, elapsed_seconds)` is called after every COPY batch.
+    Returns a report with staged/rejected/updated/inserted counts.
+    """
+    started = time.monotonic()
+    errors = []
+    cursor = db.session.connection().connection.cursor()
+    try:
+        staged = _stage(cursor, records, batch_size, progress)
+        rejected, duplicates = _validate(cursor, errors)
+        to_update, to_insert = _match(cursor)
+
+        if dry_run:
+            updated, inserted = to_update, to_insert
+            db.session.rollback()
+        else:
+            updated, inserted = _upsert(cursor)
+            db.session.commit()
+            catalog_reloaded()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    elapsed = time.monotonic() - started
+    report = {
+        'dry_run': dry_run,
+        'staged': staged,
+        'rejected': rejected,
+        'duplicates': duplicates,
+        'updated': updated,
+        'inserted': inserted,
+        'errors': errors,
+        'seconds': round(elapsed, 2),
+        'rows_per_second': int(staged / elapsed) if elapsed > 0 else staged
+    }
+    logger.info(f"Catalog import finished: {report}")
+    return report
@@ -0,0 +1,99 @@
+"""
+Future reminder fires, kept in a Redis sorted set scored by due time and
+polled by the dispatch_due_reminders beat task.
+
+This replaces Celery ETA tasks: with a Redis broker those sit unacked in
+worker memory until they are due, are redelivered when the visibility
+timeout expires and are lost or duplicated on restarts. Now the broker only
+sees tasks that are due. Redis persistence (AOF, see supervisord.conf) keeps
+the schedule across Redis restarts.
+
+Due fires are claimed, not popped: claim_due moves them to a processing set
+and the dispatcher acks them once their tasks are queued. Fires whose ack
+never comes (broker error, worker killed mid-loop) are claimed again after
+DUE_REMINDERS_CLAIM_TIMEOUT, so they are sent late rather than lost.
+
+Datetimes are naive UTC, like the rest of the app.
+"""
+import logging
+from datetime import datetime, timezone
+from redis import RedisError
+from api.extensions import redis_client
+
+logger = logging.getLogger(__name__)
+
+DUE_KEY = 'reminders:due'
+PROCESSING_KEY = 'reminders:due:processing'
+
+# Tipos de aviso en la cola
+REMINDER = 'reminder'  # first fire of a reminder (creates its ReminderLog)
+SNOOZE = 'snooze'      # snoozed occurrence (re-sends an existing ReminderLog)
+
+
+def _epoch(when):
+    return int(when.replace(tzinfo=timezone.utc).timestamp())
+
+
+def _member(kind, object_id, when):
+    # El miembro lleva la hora para que un mismo objeto pueda tener varias
+    return f'{kind}:{object_id}:{_epoch(when)}'
+
+
+# Mueve los vencidos y los reclamados hace demasiado al conjunto en proceso,
+# puntuados con la hora del reclamo
+_CLAIM = """
+local claimed = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+local stale = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[2])
+for _, member in ipairs(stale) do
+    table.insert(claimed, member)
+end
+for _, member in ipairs(claimed) do
+    redis.call('ZADD', KEYS[2], ARGV[1], member)
+end
+return claimed
+"""
+
+
+def schedule_many(fires, kind=REMINDER):
+    """Add (object_id, datetime) fires; returns False if Redis is unreachable"""
+    mapping = {_member(kind, object_id, when): _epoch(when) for object_id, when in fires}
+    if not mapping:
+        return True
+    try:
+        redis_client.zadd(DUE_KEY, mapping)
+    except RedisError as e:
+        logger.error(f"Could not schedule {len(mapping)} {kind} fires: {str(e)}")
+        return False
+    return True
+
+
+def schedule(object_id, when, kind=REMINDER):
+    return schedule_many([(object_id, when)], kind)
+
+
+def claim_due(now, timeout):
+    """
+    Claim the (kind, object_id, due datetime) fires due by `now`, plus those
+    claimed more than `timeout` seconds ago and never acked
+    """
+    script = redis_client.register_script(_CLAIM)
+    members = script(keys=[DUE_KEY, PROCESSING_KEY], args=[_epoch(now), _epoch(now) - timeout])
+
+    fires = []
+    for member in dict.fromkeys(members):
+        kind, object_id, epoch = member.split(':')
+        fires.append((kind, int(object_id), datetime.fromtimestamp(int(epoch), timezone.utc).replace(tzinfo=None)))
+    return fires
+
+
+def ack(fires):
+    """Forget claimed fires once they are queued (or dropped on purpose)"""
+    members = [_member(kind, object_id, when) for kind, object_id, when in fires]
+    if not members:
+        return
+    try:
+        redis_client.zrem(PROCESSING_KEY, *members)
+    except RedisError as e:
+        # Se reclamarán otra vez: mejor repetidos que perdidos
+        logger.error(f"Could not ack {len(members)} due fires: {str(e)}")
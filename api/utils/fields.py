@@ -0,0 +1,103 @@
+"""
+Sparse fieldsets for list endpoints: `?fields=id,name` or, for resources
+that embed another one, `?fields=id,custom_name,medication.name`.
+
+Without `fields` responses are unchanged. With it only the listed fields
+(plus `id`) are returned, embedded objects are omitted unless named, and
+the SQL only selects the columns needed to produce them.
+
+Deferred columns (large JSON blobs) are left out of lists unless named in
+`fields` or in `?include=`, so they are never read from the database.
+"""
+from flask import request
+from sqlalchemy.orm import load_only
+from api.utils.serializers import serializer_for
+
+
+class FieldsError(ValueError):
+    pass
+
+
+class FieldSelection:
+    def __init__(self, fields=None, nested=None):
+        # None means "everything", as without ?fields=
+        self.fields = fields
+        self.nested = nested
+
+    @property
+    def is_sparse(self):
+        return self.fields is not None
+
+    def with_fields(self, *extra):
+        """Requested fields plus the ones a route needs internally (e.g. join keys)"""
+        if self.fields is None:
+            return None
+        return self.fields + tuple(field for field in extra if field not in self.fields)
+
+    def includes(self, relation):
+        return self.nested is None or relation in self.nested
+
+    def trim(self, relation, item):
+        """Restrict an embedded (possibly cached, read-only) dict to the requested fields"""
+        fields = None if self.nested is None else self.nested.get(relation)
+        if fields is None or item is None:
+            return item
+        return {field: item[field] for field in fields if field in item}
+
+    def apply(self, query, model, *extra):
+        """Limit the columns loaded by an ORM query (plus `extra` fields the route needs)"""
+        if self.fields is None:
+            return query
+        return query.options(load_only(*serializer_for(model).columns(self.with_fields(*extra))))
+
+
+def _split(raw):
+    return [name.strip() for name in (raw or '').split(',') if name.strip()]
+
+
+def requested_fields(model, nested=None, relations=()):
+    """
+    Parse ?fields= for `model`. `nested` maps embedded object keys
+    (e.g. 'medication') to their model. Raises FieldsError on unknown names.
+    Includes listed in `relations` are left to requested_includes().
+    """
+    serializer = serializer_for(model)
+    names = _split(request.args.get('fields'))
+    include = [name for name in _split(request.args.get('include')) if name not in relations]
+
+    unknown = [name for name in include if name not in serializer.deferred]
+    if unknown:
+        raise FieldsError(f"Unknown include: {', '.join(unknown)}")
+
+    if not names:
+        if not serializer.deferred:
+            return FieldSelection()
+        return FieldSelection(serializer.summary_fields + tuple(include))
+
+    nested = nested or {}
+    known = serializer.fields
+    fields = ['id'] + include
+    nested_fields = {}
+    unknown = []
+    for name in names:
+        relation, _, field = name.partition('.')
+        if field and relation in nested:
+            if field not in serializer_for(nested[relation]).fields:
+                unknown.append(name)
+            elif nested_fields.get(relation, ()) is not None:
+                nested_fields.setdefault(relation, ['id']).append(field)
+        elif name in nested:
+            nested_fields[name] = None
+        elif name in known:
+            fields.append(name)
+        else:
+            unknown.append(name)
+
+    if unknown:
+        raise FieldsError(f"Unknown fields: {', '.join(unknown)}")
+
+    return FieldSelection(
+        tuple(dict.fromkeys(fields)),
+        {relation: None if subset is None else tuple(dict.fromkeys(subset))
+         for relation, subset in nested_fields.items()}
+    )
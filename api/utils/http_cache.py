@@ -0,0 +1,113 @@
+"""
+Conditional GET (weak ETags) and response compression for the whole app.
+
+Every successful GET returning JSON gets a weak ETag; a request whose
+If-None-Match matches it receives `304 Not Modified` with an empty body.
+By default the tag is a hash of the serialized body, which saves bandwidth
+but not the work of building it. Routes that can describe their data with a
+cheap version token (a Redis counter, max(updated_at) and a row count...)
+use `@conditional(token_func)`: the token is checked before the view runs,
+so an unchanged resource is answered without querying or serializing it.
+
+Bodies of at least COMPRESS_MIN_SIZE bytes are then compressed with brotli
+(when installed) or gzip, according to the client's Accept-Encoding.
+"""
+import gzip
+import hashlib
+from functools import wraps
+from flask import current_app, g, request
+from flask_jwt_extended import get_jwt_identity
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - gzip only
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/plain', 'text/html', 'text/csv', 'text/calendar'}
+
+
+def _etag(*parts):
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else repr(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _not_modified(etag):
+    response = current_app.response_class(status=304)
+    response.set_etag(etag, weak=True)
+    response.vary.update(('Authorization', 'Accept-Encoding'))
+    return response
+
+
+def conditional(token_func):
+    """
+    Answer 304 before running the view when the client already has the
+    current version. `token_func(*view_args)` returns any hashable token,
+    or None when no cheap version is available (the body hash is used then).
+    Must be applied below @jwt_required().
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            token = token_func(*args, **kwargs)
+            if token is not None:
+                # Same token, different user or query string: different resource
+                etag = _etag(request.full_path, get_jwt_identity(), token)
+                if request.if_none_match.contains_weak(etag):
+                    return _not_modified(etag)
+                g.etag = etag
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _accepted_encoding():
+    accept = request.accept_encodings
+    if brotli is not None and accept['br']:
+        return 'br'
+    if accept['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compress(response):
+    encoding = _accepted_encoding()
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < current_app.config.get('COMPRESS_MIN_SIZE', 1024):
+        return response
+
+    if encoding == 'br':
+        data = brotli.compress(data, quality=current_app.config.get('COMPRESS_BROTLI_QUALITY', 4))
+    else:
+        data = gzip.compress(data, compresslevel=current_app.config.get('COMPRESS_GZIP_LEVEL', 6))
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def _finalize(response):
+    if (
+        response.direct_passthrough
+        or response.is_streamed
+        or 'Content-Encoding' in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    if request.method in ('GET', 'HEAD') and response.status_code == 200:
+        response.vary.add('Authorization')
+        etag = g.get('etag') or _etag(response.get_data())
+        if request.if_none_match.contains_weak(etag):
+            return _not_modified(etag)
+        response.set_etag(etag, weak=True)
+
+    return _compress(response)
+
+
+def init_app(app):
+    app.after_request(_finalize)
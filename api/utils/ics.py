@@ -0,0 +1,118 @@
+"""
+iCalendar (RFC 5545) export of reminders.
+
+Each reminder becomes one recurring VEVENT whose RRULE is derived from
+frequency_type, time_of_week and frequency_value, so a calendar client
+expands the doses itself. reminder_time is UTC (the scheduler compares it
+with utcnow()), so DTSTART and UNTIL are written as UTC times and each
+client shows the doses in its own time zone.
+"""
+from datetime import datetime, time
+from api.utils.schedule import WEEKDAYS, parse_weekdays, first_occurrence
+
+PRODID = '-//Capsule Care//Reminders//ES'
+DOSE_DURATION = 'PT15M'
+
+
+def _escape(text):
+    return (
+        str(text).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def _fold(line):
+    """Split content lines longer than 75 octets (RFC 5545, 3.1)"""
+    data = line.encode('utf-8')
+    if len(data) <= 75:
+        return line
+    parts, start, limit = [], 0, 75
+    while start < len(data):
+        end = min(start + limit, len(data))
+        while end < len(data) and (data[end] & 0xC0) == 0x80:
+            end -= 1  # no partir un carácter UTF-8
+        parts.append(data[start:end].decode('utf-8'))
+        start, limit = end, 74
+    return '\r\n '.join(parts)
+
+
+def _stamp(value):
+    """UTC date-time for a naive UTC datetime"""
+    return value.strftime('%Y%m%dT%H%M%SZ')
+
+
+def rrule(reminder):
+    """RRULE value for a reminder, or None when it never repeats"""
+    if reminder.frequency_type == 'daily':
+        rule = 'FREQ=DAILY'
+    elif reminder.frequency_type == 'weekly':
+        days = parse_weekdays(reminder.time_of_week or '')
+        if not days:
+            return None
+        rule = 'FREQ=WEEKLY;BYDAY=' + ','.join(WEEKDAYS[day][:2].upper() for day in days)
+    elif reminder.frequency_type == 'monthly':
+        if not reminder.frequency_value or not 1 <= reminder.frequency_value <= 31:
+            return None
+        rule = f'FREQ=MONTHLY;BYMONTHDAY={reminder.frequency_value}'
+    elif reminder.frequency_type == 'custom':
+        if not reminder.start_date or not reminder.frequency_value:
+            return None
+        rule = f'FREQ=DAILY;INTERVAL={abs(reminder.frequency_value)}'
+    else:
+        return None
+
+    if reminder.end_date:
+        # Con DTSTART en UTC, UNTIL también debe ir en UTC (RFC 5545, 3.3.10)
+        rule += f';UNTIL={_stamp(datetime.combine(reminder.end_date, time(23, 59, 59)))}'
+    return rule
+
+
+def reminder_event(reminder, summary, description, host, now):
+    """
+    VEVENT lines for a reminder, or [] if it has no dose. DTSTART is the first
+    real dose: RFC 5545 counts DTSTART as an occurrence even when it does not
+    match the rule.
+    """
+    rule = rrule(reminder)
+    anchor = reminder.start_date or (reminder.created_at or now).date()
+    first = first_occurrence(reminder, anchor) if rule else None
+    if first is None:
+        return []
+
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:reminder-{reminder.id}@{host}',
+        f'DTSTAMP:{_stamp(reminder.updated_at or now)}',
+        f'DTSTART:{_stamp(datetime.combine(first, reminder.reminder_time))}',
+        f'DURATION:{DOSE_DURATION}',
+        f'RRULE:{rule}',
+        f'SUMMARY:{_escape(summary)}',
+    ]
+    if description:
+        lines.append(f'DESCRIPTION:{_escape(description)}')
+    lines += [
+        'BEGIN:VALARM',
+        'ACTION:DISPLAY',
+        f'DESCRIPTION:{_escape(summary)}',
+        'TRIGGER:PT0M',
+        'END:VALARM',
+        'END:VEVENT',
+    ]
+    return lines
+
+
+def build_calendar(events, name):
+    """Serialize VEVENT line lists into a VCALENDAR document"""
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{_escape(name)}',
+        'REFRESH-INTERVAL;VALUE=DURATION:PT15M',
+    ]
+    for event in events:
+        lines.extend(event)
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(_fold(line) for line in lines) + '\r\n'
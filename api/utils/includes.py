@@ -0,0 +1,62 @@
+"""
+Relationship expansion for user-scoped lists: `?include=reminders` or
+`?include=user_medication,reminder_logs`, nested with dots.
+
+Each requested relationship becomes an eager-loading option (joinedload for
+many-to-one, selectinload for collections), so a response costs a fixed
+number of queries whatever the number of rows or the depth of expansion.
+"""
+from flask import request
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.interfaces import MANYTOONE
+from api.utils.fields import FieldsError
+
+
+def requested_includes(allowed):
+    """
+    Parse ?include= into a tree such as {'reminders': {'reminder_logs': {}}}.
+    `allowed` lists the accepted dotted paths; other names raise FieldsError.
+    """
+    names = [name.strip() for name in request.args.get('include', '').split(',') if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise FieldsError(f"Unknown include: {', '.join(unknown)}")
+
+    tree = {}
+    for name in names:
+        node = tree
+        for part in name.split('.'):
+            node = node.setdefault(part, {})
+    return tree
+
+
+def _loader(attribute):
+    if attribute.property.direction is MANYTOONE:
+        return joinedload(attribute)
+    return selectinload(attribute)
+
+
+def loader_options(model, tree):
+    """Eager-loading options for every relationship in the include tree"""
+    options = []
+    for name, children in tree.items():
+        attribute = getattr(model, name)
+        loader = _loader(attribute)
+        nested = loader_options(attribute.property.mapper.class_, children)
+        options.append(loader.options(*nested) if nested else loader)
+    return options
+
+
+def dump_included(obj, tree, item=None):
+    """Serialize obj (unless item is given) and embed the eagerly loaded relationships"""
+    if item is None:
+        item = obj.to_dict()
+    for name, children in tree.items():
+        value = getattr(obj, name)
+        if value is None:
+            item[name] = None
+        elif isinstance(value, list):
+            item[name] = [dump_included(child, children) for child in value]
+        else:
+            item[name] = dump_included(value, children)
+    return item
@@ -0,0 +1,59 @@
+"""
+Ownership-checked loaders for user-scoped routes.
+
+Rows owned through a UserMedication (reminders, reminder logs, intakes) are
+fetched together with their owner in one joined query, instead of walking
+reminder.user_medication.user_id lazily. A missing row aborts with 404 and a
+row owned by another user with 403. Rows carrying their own user_id
+(notifications, prescriptions) are simply filtered by it and answer 404.
+"""
+from flask import abort, jsonify, make_response
+from sqlalchemy.orm import contains_eager
+from api.extensions import db
+from api.models import Reminder, ReminderLog, UserMedication, MedicationIntake
+
+
+def _owned(query, user_id):
+    row = query.first()
+    if row is None:
+        abort(404)
+    obj, owner_id = row
+    if owner_id != user_id:
+        abort(make_response(jsonify({'error': 'Unauthorized'}), 403))
+    return obj
+
+
+def load_user_medication(id, user_id):
+    return _owned(db.session.query(UserMedication, UserMedication.user_id).filter(UserMedication.id == id), user_id)
+
+
+def load_reminder(id, user_id):
+    """Reminder with its user_medication already populated"""
+    query = db.session.query(Reminder, UserMedication.user_id).join(
+        Reminder.user_medication
+    ).options(contains_eager(Reminder.user_medication)).filter(Reminder.id == id)
+    return _owned(query, user_id)
+
+
+def load_reminder_log(id, user_id):
+    """ReminderLog with its reminder and user_medication already populated"""
+    query = db.session.query(ReminderLog, UserMedication.user_id).join(
+        ReminderLog.reminder
+    ).join(
+        Reminder.user_medication
+    ).options(
+        contains_eager(ReminderLog.reminder).contains_eager(Reminder.user_medication)
+    ).filter(ReminderLog.id == id)
+    return _owned(query, user_id)
+
+
+def load_intake(id, user_id):
+    query = db.session.query(MedicationIntake, UserMedication.user_id).join(
+        UserMedication, MedicationIntake.user_medication_id == UserMedication.id
+    ).filter(MedicationIntake.id == id)
+    return _owned(query, user_id)
+
+
+def load_owned(model, id, user_id):
+    """Row of a model with its own user_id column; other users' rows are 404"""
+    return model.query.filter_by(id=id, user_id=user_id).first_or_404()
@@ -0,0 +1,224 @@
+"""
+In-process prefix index over the medication catalog.
+
+Every worker keeps a sorted list of (key, medication_id) postings built from
+the folded name, generic name and brand name of each active medication (the
+full string and each of its words). A prefix lookup is two bisects plus a
+top-k selection by popularity, i.e. how many UserMedication rows reference
+the medication.
+
+The index is built at worker start and kept current through the shared
+catalog version counter: when it moves, only rows updated since the last
+sync are re-read and patched in.
+"""
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from api.extensions import db
+from api.models import Medication, UserMedication
+from api.utils.normalization import fold_text
+from api.utils.versioning import get_version, CATALOG
+
+logger = logging.getLogger(__name__)
+
+# Rows written by other workers may carry slightly older timestamps
+SYNC_OVERLAP = timedelta(seconds=5)
+# Without Redis we cannot see other workers' writes, so poll the DB instead
+FALLBACK_SYNC_INTERVAL = 30
+MAX_CACHED_PREFIXES = 4096
+_KEY_END = '\uffff'
+
+
+def _index_keys(name, generic_name, brand_name):
+    keys = set()
+    for value in (name, generic_name, brand_name):
+        folded = fold_text(value)
+        if not folded:
+            continue
+        keys.add(folded)
+        keys.update(word for word in folded.split(' ') if len(word) > 1)
+    return keys
+
+
+def _entry(row):
+    return {
+        'id': row.id,
+        'name': row.name,
+        'generic_name': row.generic_name,
+        'brand_name': row.brand_name,
+        'strength': row.strength
+    }
+
+
+class MedicationIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = []
+        self._keys_by_id = {}
+        self._entries = {}
+        self._popularity = {}
+        self._results = {}
+        self._version = None
+        self._synced_at = None
+        self._checked_at = 0
+        self._popularity_at = 0
+
+    @property
+    def is_built(self):
+        return self._synced_at is not None
+
+    def rebuild(self):
+        """Load the whole active catalog and popularity counts"""
+        synced_at = datetime.utcnow()
+        version = get_version(CATALOG)
+        rows = self._load_rows(Medication.is_active == True)
+        popularity = self._load_popularity()
+
+        with self._lock:
+            self._postings = []
+            self._keys_by_id = {}
+            self._entries = {}
+            for row in rows:
+                self._add(row)
+            self._postings.sort()
+            self._popularity = popularity
+            self._results = {}
+            self._version = version
+            self._synced_at = synced_at
+            self._checked_at = self._popularity_at = time.monotonic()
+
+        logger.info(f"Medication index built with {len(self._entries)} medications")
+
+    def sync(self):
+        """Apply catalog writes made since the last sync (cheap when nothing changed)"""
+        if not self.is_built:
+            self.rebuild()
+            return
+
+        now = time.monotonic()
+        version = get_version(CATALOG)
+        if version is None:
+            stale = now - self._checked_at > FALLBACK_SYNC_INTERVAL
+        else:
+            stale = version != self._version
+
+        if stale:
+            synced_at = datetime.utcnow()
+            rows = self._load_rows(Medication.updated_at >= self._synced_at - SYNC_OVERLAP)
+            with self._lock:
+                for row in rows:
+                    self._apply(row)
+                self._version = version
+                self._synced_at = synced_at
+                self._checked_at = now
+
+        ttl = current_app.config.get('AUTOCOMPLETE_POPULARITY_TTL', 300)
+        if now - self._popularity_at > ttl:
+            popularity = self._load_popularity()
+            with self._lock:
+                self._popularity = popularity
+                self._results = {}
+                self._popularity_at = now
+
+    def note_write(self, medication, version=None):
+        """Patch a medication written by this worker without waiting for a sync"""
+        with self._lock:
+            self._apply(medication)
+            if version is not None and self._version is not None and version == self._version + 1:
+                self._version = version
+
+    def record_usage(self, medication_id):
+        """Count a new UserMedication referencing medication_id"""
+        with self._lock:
+            self._popularity[medication_id] = self._popularity.get(medication_id, 0) + 1
+            self._drop_results(self._keys_by_id.get(medication_id, ()))
+
+    def search(self, prefix, limit=10):
+        """Return up to `limit` medications whose keys start with prefix, most used first"""
+        folded = fold_text(prefix)
+        if not folded:
+            return []
+
+        cache_key = (folded, limit)
+        with self._lock:
+            cached = self._results.get(cache_key)
+            if cached is not None:
+                return cached
+
+            lo = bisect_left(self._postings, (folded,))
+            hi = bisect_left(self._postings, (folded + _KEY_END,), lo)
+            ids = {self._postings[i][1] for i in range(lo, hi)}
+            popularity = self._popularity
+            entries = self._entries
+            top = heapq.nsmallest(
+                limit,
+                ids,
+                key=lambda med_id: (-popularity.get(med_id, 0), entries[med_id]['name'])
+            )
+            results = [dict(entries[med_id], popularity=popularity.get(med_id, 0)) for med_id in top]
+
+            if len(self._results) >= MAX_CACHED_PREFIXES:
+                self._results = {}
+            self._results[cache_key] = results
+            return results
+
+    def _load_rows(self, *criteria):
+        return db.session.query(
+            Medication.id,
+            Medication.name,
+            Medication.generic_name,
+            Medication.brand_name,
+            Medication.strength,
+            Medication.is_active
+        ).filter(*criteria).all()
+
+    def _load_popularity(self):
+        rows = db.session.query(
+            UserMedication.medication_id,
+            func.count(UserMedication.id)
+        ).group_by(UserMedication.medication_id).all()
+        return {medication_id: count for medication_id, count in rows}
+
+    def _add(self, row):
+        keys = _index_keys(row.name, row.generic_name, row.brand_name)
+        self._keys_by_id[row.id] = keys
+        self._entries[row.id] = _entry(row)
+        self._postings.extend((key, row.id) for key in keys)
+
+    def _remove(self, medication_id):
+        keys = self._keys_by_id.pop(medication_id, set())
+        self._entries.pop(medication_id, None)
+        for key in keys:
+            i = bisect_left(self._postings, (key, medication_id))
+            if i < len(self._postings) and self._postings[i] == (key, medication_id):
+                del self._postings[i]
+        return keys
+
+    def _apply(self, row):
+        old_keys = self._remove(row.id)
+        new_keys = set()
+        if row.is_active:
+            new_keys = _index_keys(row.name, row.generic_name, row.brand_name)
+            self._keys_by_id[row.id] = new_keys
+            self._entries[row.id] = _entry(row)
+            for key in new_keys:
+                insort(self._postings, (key, row.id))
+        self._drop_results(old_keys | new_keys)
+
+    def _drop_results(self, keys):
+        """Forget cached results for every prefix of the given keys"""
+        if not keys or not self._results:
+            return
+        self._results = {
+            (prefix, limit): results
+            for (prefix, limit), results in self._results.items()
+            if not any(key.startswith(prefix) for key in keys)
+        }
+
+
+medication_index = MedicationIndex()
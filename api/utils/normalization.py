@@ -0,0 +1,141 @@
+"""
+Text normalization helpers shared by catalog lookups
+"""
+import re
+import unicodedata
+from functools import lru_cache
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def fold_text(value):
+    """Lowercase, strip accents and collapse whitespace"""
+    if not value:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', value)
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return _WHITESPACE_RE.sub(' ', stripped.lower()).strip()
+
+
+def _gtin_check_digit(digits):
+    total = sum(int(d) * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(digits)))
+    return str((10 - total % 10) % 10)
+
+
+# Segmentaciones válidas de un NDC (labeler-product-package)
+_NDC_SEGMENTS = ((4, 4, 2), (5, 3, 2), (5, 4, 1), (5, 4, 2))
+
+
+def _ndc11(labeler, product, package):
+    """5-4-2 form of a segmented NDC, padding the short segment; None if not an NDC layout"""
+    if (len(labeler), len(product), len(package)) not in _NDC_SEGMENTS:
+        return None
+    return labeler.zfill(5) + product.zfill(4) + package.zfill(2)
+
+
+def _ndc10_key(digits):
+    """
+    Key of an unhyphenated 10-digit NDC. Without hyphens the padding position
+    is unknown, so it is only converted when every segmentation gives the
+    same 11 digits; otherwise the digits are kept and match exactly.
+    """
+    candidates = {_ndc11(digits[:4], digits[4:8], digits[8:]),
+                  _ndc11(digits[:5], digits[5:8], digits[8:]),
+                  _ndc11(digits[:5], digits[5:9], digits[9:])}
+    return 'NDC' + candidates.pop() if len(candidates) == 1 else digits
+
+
+def normalize_barcode(value):
+    """
+    Canonical lookup key for a package barcode or NDC code.
+
+    Hyphenated NDCs resolve to 'NDC' + the 11-digit 5-4-2 form, padding the
+    segment the layout shortens ('0002-8215-01' and '00002-8215-01' share a
+    key); bare 11-digit codes are already in that form. Bare 10-digit NDCs,
+    also the one inside the UPC-A printed on US packages ('3' + NDC + check
+    digit, also inside EAN-13 or GTIN-14), are ambiguous and keep their
+    digits (see _ndc10_key). Other GTINs are zero-padded to 14 digits,
+    anything else is kept as uppercase alphanumerics.
+    """
+    if not value:
+        return ''
+    value = value.strip().upper()
+    if value.startswith('NDC'):
+        value = value[3:]
+
+    segments = [s for s in re.split(r'[\s\-]+', value) if s]
+    if len(segments) == 3 and all(s.isdigit() for s in segments):
+        ndc = _ndc11(*segments)
+        if ndc:
+            return 'NDC' + ndc
+
+    code = re.sub(r'[^0-9A-Z]', '', value)
+    if not code.isdigit():
+        return code
+
+    if len(code) == 10:
+        return _ndc10_key(code)
+    if len(code) == 11:
+        return 'NDC' + code
+    if len(code) in (8, 12, 13, 14):
+        gtin = code.zfill(14)
+        if gtin.startswith('003') and _gtin_check_digit(gtin[:-1]) == gtin[-1]:
+            return _ndc10_key(gtin[3:13])
+        return gtin
+    return code
+
+
+_UNIT = r'(?:mg|mcg|µg|μg|ug|g|kg|ml|l|ui|iu|u|meq|mmol|%)'
+_AMOUNT = r'\d+(?:[.,]\d+)?\s*' + _UNIT
+# Dosage such as "50 mg", "500mg/5ml", "875 mg + 125 mg" or "0,5%"
+_DOSAGE_RE = re.compile(
+    _AMOUNT + r'(?:\s*/\s*(?:\d+(?:[.,]\d+)?\s*)?(?:' + _UNIT + r'|dosis|dose|h))?'
+    r'(?:\s*\+\s*' + _AMOUNT + r')*\s*',
+    re.IGNORECASE
+)
+# Places where a trailing dosage may begin
+_DOSAGE_START_RE = re.compile(r'[\s,\-]+(?=\d)')
+_NON_ALNUM_RE = re.compile(r'[^a-z0-9]+')
+_MICROGRAM_RE = re.compile(r'[µμ]g|ug')
+
+
+def split_dosage(name):
+    """Split a trailing dosage off a medication name: 'Losartán 50 mg' -> ('Losartán', '50 mg')"""
+    name = _WHITESPACE_RE.sub(' ', (name or '').strip())
+    for start in _DOSAGE_START_RE.finditer(name):
+        if _DOSAGE_RE.fullmatch(name, start.end()):
+            return name[:start.start()], name[start.end():]
+    return name, None
+
+
+@lru_cache(maxsize=65536)
+def normalize_medication_name(name):
+    """
+    Catalog matching key for a medication name.
+
+    Lowercased, accent-stripped, punctuation and whitespace collapsed, with
+    any trailing dosage split off, so 'Losartán 50mg' and 'losartan 50 mg'
+    share a key. The dosage is kept apart by normalize_strength: both form
+    the catalog key.
+    """
+    base, _ = split_dosage(name)
+    return _NON_ALNUM_RE.sub(' ', fold_text(base)).strip()
+
+
+@lru_cache(maxsize=65536)
+def normalize_strength(name, strength=None):
+    """
+    Strength part of the catalog key: the trailing dosage of `name`, else
+    `strength` when it reads as a dosage, compacted ('250 mg' -> '250mg').
+    '' when there is none, so 'Amoxicillin 250 mg', 'Amoxicillin 500 mg' and
+    'Amoxicillin' are three products.
+    """
+    _, dosage = split_dosage(name)
+    if dosage is None and strength:
+        strength = _WHITESPACE_RE.sub(' ', strength.strip())
+        if _DOSAGE_RE.fullmatch(strength):
+            dosage = strength
+    if not dosage:
+        return ''
+    compact = _WHITESPACE_RE.sub('', fold_text(dosage)).replace(',', '.')
+    return _MICROGRAM_RE.sub('mcg', compact)
@@ -0,0 +1,127 @@
+"""
+Live notifications as server-sent events, through Redis pub/sub.
+
+The tasks publish the notifications they create on the user's channel after
+committing, and every open stream (GET /api/notifications/stream) holds one
+subscription to its user's channel, so clients no longer poll the list.
+Redis does not keep published messages: a client reconnecting with
+Last-Event-ID gets the rows it missed from the database once, then only what
+is published. Publishing fails open like the other Redis helpers; the rows
+are still there for the next reconnect or list request. Notifications sent to
+someone else (Notification.recipient) are not streamed to the user.
+
+Every open stream holds a server thread for up to its duration, so each
+worker process caps them (NOTIFICATION_STREAM_MAX_PER_WORKER) and answers 503
+above the cap instead of letting streams starve the other requests.
+"""
+import logging
+import threading
+import time
+from flask import current_app
+from redis import RedisError
+from api.extensions import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Notificaciones perdidas que se reenvían al reconectar con Last-Event-ID
+BACKLOG_LIMIT = 100
+
+
+class StreamSlots:
+    """Counts the open streams of this worker process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+
+    def acquire(self, limit):
+        """Take a slot without waiting; False when `limit` streams are open"""
+        with self._lock:
+            if self.open >= limit:
+                return False
+            self.open += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.open -= 1
+
+
+slots = StreamSlots()
+
+
+def _channel(user_id):
+    return f'notifications:stream:{user_id}'
+
+
+def publish(notifications):
+    """Publish committed notifications to their users' streams"""
+    notifications = [notification for notification in notifications if notification.recipient is None]
+    if not notifications:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for notification in notifications:
+            # "<id> <json>": el stream saca el id sin decodificar el JSON
+            pipe.publish(
+                _channel(notification.user_id),
+                f'{notification.id} {current_app.json.dumps(notification.to_dict())}'
+            )
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Could not publish {len(notifications)} notifications: {str(e)}")
+
+
+def subscribe(user_id):
+    """Pub/sub subscription to a user's stream; raises RedisError if Redis is down"""
+    pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+    try:
+        pubsub.subscribe(_channel(user_id))
+    except RedisError:
+        pubsub.close()
+        raise
+    return pubsub
+
+
+def _event(notification_id, data):
+    return f'id: {notification_id}\nevent: notification\ndata: {data}\n\n'
+
+
+def events(pubsub, backlog=(), duration=300, heartbeat=15, retry=5):
+    """
+    SSE frames: the (id, json) backlog, then every published notification
+    not already in it, with a comment line every `heartbeat` seconds of
+    silence (it also reveals closed connections). Ends after `duration`
+    seconds so the client reconnects, re-checking its token. Runs outside
+    the app context.
+    """
+    yield f'retry: {retry * 1000}\n\n'
+    sent = set()
+    for notification_id, data in backlog:
+        sent.add(notification_id)
+        yield _event(notification_id, data)
+
+    deadline = time.monotonic() + duration
+    quiet_since = time.monotonic()
+    while True:
+        now = time.monotonic()
+        if now >= deadline:
+            return
+        try:
+            message = pubsub.get_message(timeout=min(deadline - now, heartbeat))
+        except RedisError as e:
+            logger.warning(f"Notification stream lost Redis: {str(e)}")
+            return
+        if message is None:
+            if time.monotonic() - quiet_since >= heartbeat:
+                quiet_since = time.monotonic()
+                yield ': keep-alive\n\n'
+            continue
+
+        notification_id, data = message['data'].split(' ', 1)
+        notification_id = int(notification_id)
+        # Publicada mientras se leía el backlog; las tareas no publican en orden de id
+        if notification_id in sent:
+            continue
+        quiet_since = time.monotonic()
+        yield _event(notification_id, data)
@@ -0,0 +1,118 @@
+"""
+Localized notification texts, by language and template key.
+
+Every template is compiled once per worker process (when this module is
+imported) into a function that renders it with a single f-string, so the
+batch senders pay no parsing or lookup per message: they fetch the compiled
+templates for a language once and call them with the values.
+
+Template keys are '<notification_type>.<variant>'. Languages fall back to
+DEFAULT_LANGUAGE, and a missing key falls back to the default language's.
+"""
+import string
+
+DEFAULT_LANGUAGE = 'es'
+
+TEMPLATES = {
+    'es': {
+        'medication_reminder.push': ('💊 Recordatorio: {name}', 'Es hora de tomar tu medicamento: {dosage}'),
+        'medication_reminder.push_many': (
+            '💊 Recordatorio: {count} medicamentos', 'Es hora de tomar tus medicamentos:\n{items}'
+        ),
+        'medication_reminder.push_item': '• {name}: {dosage}',
+        'medication_reminder.email': (
+            'Recordatorio: {name}', 'Es hora de tomar {dosage}.\n\nInstrucciones: {instructions}'
+        ),
+        'medication_reminder.email_many': ('Recordatorio: {count} medicamentos', 'Es hora de tomar:\n\n{items}'),
+        'medication_reminder.email_item': '• {name}: {dosage}\n  Instrucciones: {instructions}',
+        'missed_dose.push': ('⚠️ Dosis perdida', 'No has registrado la toma de {name}'),
+        'emergency_alert.email': (
+            'Alerta: Dosis perdida - {first_name}', '{first_name} no ha tomado su medicamento {name}'
+        ),
+        'email.footer': '\n\n--\nCapsule Care\nRecibes este correo porque activaste los recordatorios por email.\n',
+        # Valores por defecto
+        'default.dosage': 'dosis prescrita',
+        'default.email_dosage': 'tu dosis prescrita',
+        'default.instructions': 'N/A',
+    },
+    'en': {
+        'medication_reminder.push': ('💊 Reminder: {name}', 'Time to take your medication: {dosage}'),
+        'medication_reminder.push_many': ('💊 Reminder: {count} medications', 'Time to take your medications:\n{items}'),
+        'medication_reminder.push_item': '• {name}: {dosage}',
+        'medication_reminder.email': ('Reminder: {name}', 'Time to take {dosage}.\n\nInstructions: {instructions}'),
+        'medication_reminder.email_many': ('Reminder: {count} medications', 'Time to take:\n\n{items}'),
+        'medication_reminder.email_item': '• {name}: {dosage}\n  Instructions: {instructions}',
+        'missed_dose.push': ('⚠️ Missed dose', 'You have not logged your dose of {name}'),
+        'emergency_alert.email': (
+            'Alert: Missed dose - {first_name}', '{first_name} has not taken their medication {name}'
+        ),
+        'email.footer': '\n\n--\nCapsule Care\nYou are receiving this email because email reminders are turned on.\n',
+        'default.dosage': 'prescribed dose',
+        'default.email_dosage': 'your prescribed dose',
+        'default.instructions': 'N/A',
+    },
+}
+
+
+def compile_template(text):
+    """
+    A function rendering `text` from keyword arguments, e.g.
+    compile_template('Hi {name}')(name='Ana') -> 'Hi Ana'
+    """
+    fields = []
+    source = []
+    for literal, field, spec, conversion in string.Formatter().parse(text):
+        source.append(literal.replace('{', '{{').replace('}', '}}'))
+        if field is None:
+            continue
+        if not field.isidentifier() or spec or conversion:
+            raise ValueError(f'Unsupported placeholder {{{field}}} in {text!r}')
+        if field not in fields:
+            fields.append(field)
+        source.append('{' + field + '}')
+    # Las claves son identificadores y el texto va escapado por repr()
+    code = f"lambda *, {', '.join(fields)}: f{''.join(source)!r}" if fields else f"lambda: {text!r}"
+    return eval(code, {})
+
+
+class Template:
+    __slots__ = ('title', 'message')
+
+    def __init__(self, title, message):
+        self.title = compile_template(title)
+        self.message = compile_template(message)
+
+
+class TemplateRegistry:
+    def __init__(self, templates, default_language=DEFAULT_LANGUAGE):
+        self.default_language = default_language
+        default = templates[default_language]
+        self._languages = {}
+        for language, entries in templates.items():
+            compiled = {}
+            for key, value in {**default, **entries}.items():
+                if isinstance(value, tuple):
+                    compiled[key] = Template(*value)
+                elif key.startswith('default.'):
+                    compiled[key] = value
+                else:
+                    compiled[key] = compile_template(value)
+            self._languages[language] = compiled
+        # User.language -> plantillas, resuelto una sola vez por valor
+        self._resolved = {}
+
+    def language(self, code):
+        """Supported language for a User.language value such as 'en-US'"""
+        code = (code or '')[:2].lower()
+        return code if code in self._languages else self.default_language
+
+    def for_language(self, code):
+        """{key: compiled template} for a language; look this up once per batch"""
+        try:
+            return self._resolved[code]
+        except KeyError:
+            compiled = self._resolved[code] = self._languages[self.language(code)]
+            return compiled
+
+
+templates = TemplateRegistry(TEMPLATES)
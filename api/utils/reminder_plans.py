@@ -0,0 +1,147 @@
+"""
+Reminder plans: one dosing schedule expanded into the Reminder rows that
+implement it, e.g. "3 times a day from 08:00 for 10 days" becomes three
+daily reminders at 08:00, 16:00 and 00:00 ending on day 10.
+
+A plan is a dict with:
+    user_medication_id  required
+    times               ["08:00", "20:00"], or
+    times_per_day       with first_time (default 08:00) and
+                        interval_hours (default 24 / times_per_day); the
+                        doses must fit in one day and fall on whole minutes
+    interval_days       every N days (custom frequency), or
+    weekdays            ["monday", "thursday"] (weekly frequency)
+    start_date          default today
+    duration_days       or end_date; open-ended without either
+    title, description, push_notification, email_notification,
+    calendar_reminder   copied to every reminder
+"""
+from datetime import date, datetime, time, timedelta
+from api.utils.schedule import WEEKDAYS
+
+PLAN_MAX_TIMES = 24
+COPIED_FIELDS = ('title', 'description', 'push_notification', 'email_notification', 'calendar_reminder')
+
+
+class PlanError(ValueError):
+    pass
+
+
+def _time(value):
+    try:
+        parsed = time.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise PlanError(f'Invalid time: {value}')
+    # El aviso de recordatorios compara horas y minutos
+    if parsed.second or parsed.microsecond:
+        raise PlanError(f'Invalid time: {value} (use HH:MM)')
+    return parsed
+
+
+def _date(value, name):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise PlanError(f'Invalid {name}: {value}')
+
+
+def _positive_int(plan, name):
+    value = plan.get(name)
+    if value is None:
+        return None
+    if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+        raise PlanError(f'{name} must be a positive integer')
+    return value
+
+
+def _dose_times(plan):
+    if plan.get('times') is not None:
+        if not isinstance(plan['times'], list):
+            raise PlanError('times must be a list of HH:MM values')
+        times = sorted({_time(value) for value in plan['times']})
+    else:
+        count = _positive_int(plan, 'times_per_day')
+        if count is None:
+            raise PlanError('times or times_per_day is required')
+        first = _time(plan.get('first_time', '08:00'))
+        interval = plan.get('interval_hours', 24 / count)
+        if not isinstance(interval, (int, float)) or isinstance(interval, bool) or interval <= 0:
+            raise PlanError('interval_hours must be a positive number')
+        minutes = interval * 60
+        if abs(minutes - round(minutes)) > 1e-6 or round(minutes) == 0:
+            if 'interval_hours' not in plan:
+                raise PlanError(f'24 hours cannot be split into {count} doses on whole minutes; give interval_hours or times')
+            raise PlanError('interval_hours must be a whole number of minutes')
+        minutes = round(minutes)
+        # Más allá de un día las horas se repetirían y el plan tendría menos dosis
+        if count * minutes > 24 * 60:
+            raise PlanError(f'{count} doses every {interval} hours do not fit in one day')
+        start = datetime.combine(date.min, first)
+        times = [(start + timedelta(minutes=minutes * i)).time() for i in range(count)]
+        times.sort()
+
+    if not times:
+        raise PlanError('At least one dose time is required')
+    if len(times) > PLAN_MAX_TIMES:
+        raise PlanError(f'At most {PLAN_MAX_TIMES} doses per day')
+    return times
+
+
+def _frequency(plan):
+    """(frequency_type, frequency_value, time_of_week) for the plan"""
+    interval_days = _positive_int(plan, 'interval_days')
+    weekdays = plan.get('weekdays')
+    if interval_days and weekdays:
+        raise PlanError('Use either interval_days or weekdays')
+
+    if weekdays:
+        if not isinstance(weekdays, list):
+            raise PlanError('weekdays must be a list of day names')
+        names = {str(day).strip().lower() for day in weekdays}
+        unknown = sorted(names - set(WEEKDAYS))
+        if unknown:
+            raise PlanError(f"Unknown weekday: {', '.join(unknown)}")
+        if len(names) < len(WEEKDAYS):
+            return 'weekly', 1, ','.join(day for day in WEEKDAYS if day in names)
+
+    if interval_days and interval_days > 1:
+        return 'custom', interval_days, None
+    return 'daily', 1, None
+
+
+def reminder_rows(plan, today):
+    """Column values of the Reminder rows implementing a plan"""
+    if not isinstance(plan, dict):
+        raise PlanError('Each plan must be an object')
+    if _positive_int(plan, 'user_medication_id') is None:
+        raise PlanError('user_medication_id is required')
+
+    times = _dose_times(plan)
+    frequency_type, frequency_value, time_of_week = _frequency(plan)
+
+    start_date = _date(plan['start_date'], 'start_date') if plan.get('start_date') else today
+    end_date = None
+    duration = _positive_int(plan, 'duration_days')
+    if duration and plan.get('end_date'):
+        raise PlanError('Use either duration_days or end_date')
+    if duration:
+        end_date = start_date + timedelta(days=duration - 1)
+    elif plan.get('end_date'):
+        end_date = _date(plan['end_date'], 'end_date')
+        if end_date < start_date:
+            raise PlanError('end_date must not be before start_date')
+
+    common = {field: plan[field] for field in COPIED_FIELDS if field in plan}
+    return [
+        dict(
+            common,
+            user_medication_id=plan['user_medication_id'],
+            reminder_time=dose_time,
+            frequency_type=frequency_type,
+            frequency_value=frequency_value,
+            time_of_week=time_of_week,
+            start_date=start_date,
+            end_date=end_date
+        )
+        for dose_time in times
+    ]
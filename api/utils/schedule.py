@@ -0,0 +1,105 @@
+"""
+Reminder recurrence rules shared by the scheduler tasks and the API.
+
+Functions accept Reminder instances or any row exposing the same attributes
+(frequency_type, frequency_value, time_of_week, start_date, end_date).
+"""
+from datetime import date, timedelta
+
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+
+def parse_weekdays(time_of_week):
+    """Weekday numbers (Monday is 0) named in a 'monday,thursday' string"""
+    names = {d.strip().lower() for d in time_of_week.split(',')}
+    return sorted(i for i, name in enumerate(WEEKDAYS) if name in names)
+
+
+def occurs_on(reminder, day):
+    """Whether a reminder has a dose on the given date"""
+    if reminder.start_date and day < reminder.start_date:
+        return False
+    if reminder.end_date and day > reminder.end_date:
+        return False
+
+    if reminder.frequency_type == 'daily':
+        return True
+
+    if reminder.frequency_type == 'weekly':
+        if reminder.time_of_week:
+            return day.weekday() in parse_weekdays(reminder.time_of_week)
+        return False
+
+    if reminder.frequency_type == 'monthly':
+        if reminder.frequency_value:
+            return day.day == reminder.frequency_value
+        return False
+
+    if reminder.frequency_type == 'custom':
+        if reminder.start_date and reminder.frequency_value:
+            return (day - reminder.start_date).days % reminder.frequency_value == 0
+        return False
+
+    return False
+
+
+def _every(first, end, step):
+    return [first + timedelta(days=offset) for offset in range(0, (end - first).days + 1, step)]
+
+
+def occurrence_dates(reminder, start, end):
+    """
+    Dates from start to end (inclusive) on which a reminder has a dose.
+
+    Same rules as occurs_on(), but the matching dates are generated directly
+    (a stride per weekday, one candidate per month) instead of testing every
+    day of the range.
+    """
+    if reminder.start_date and start < reminder.start_date:
+        start = reminder.start_date
+    if reminder.end_date and end > reminder.end_date:
+        end = reminder.end_date
+    if start > end:
+        return []
+
+    if reminder.frequency_type == 'daily':
+        return _every(start, end, 1)
+
+    if reminder.frequency_type == 'weekly':
+        if not reminder.time_of_week:
+            return []
+        days = []
+        for weekday in parse_weekdays(reminder.time_of_week):
+            first = start + timedelta(days=(weekday - start.weekday()) % 7)
+            days.extend(_every(first, end, 7))
+        return sorted(days)
+
+    if reminder.frequency_type == 'monthly':
+        if not reminder.frequency_value:
+            return []
+        days = []
+        year, month = start.year, start.month
+        while (year, month) <= (end.year, end.month):
+            try:
+                day = date(year, month, reminder.frequency_value)
+            except ValueError:
+                day = None  # el mes no tiene ese día
+            if day and start <= day <= end:
+                days.append(day)
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return days
+
+    if reminder.frequency_type == 'custom':
+        if not reminder.start_date or not reminder.frequency_value:
+            return []
+        step = abs(reminder.frequency_value)
+        first = start + timedelta(days=-(start - reminder.start_date).days % step)
+        return _every(first, end, step)
+
+    return []
+
+
+def first_occurrence(reminder, after):
+    """First dose date on or after `after` (within a year), or None"""
+    days = occurrence_dates(reminder, after, after + timedelta(days=366))
+    return days[0] if days else None
@@ -0,0 +1,147 @@
+"""
+Compiled serializers for SQLAlchemy models.
+
+Instead of a hand-written `to_dict` per model, each model gets a serializer
+built from its column metadata. For every requested field set a small
+encoder function is generated once and reused, so serializing a row costs
+one dict literal: no per-field loops, getattr calls or type checks.
+
+Encoders exist for ORM instances and for `Row` tuples selected with
+`serializer.columns(fields)`, which skips building ORM objects entirely.
+Date, datetime and time columns are rendered with `isoformat()`.
+"""
+import datetime
+import threading
+from sqlalchemy import inspect
+
+_TEMPORAL_TYPES = (datetime.date, datetime.datetime, datetime.time)
+MAX_COMPILED_FIELDSETS = 256
+
+
+def _is_temporal(column):
+    try:
+        return column.type.python_type in _TEMPORAL_TYPES
+    except NotImplementedError:
+        return False
+
+
+class ModelSerializer:
+    def __init__(self, model):
+        self.model = model
+        mapper = inspect(model)
+        exclude = set(getattr(model, '__serializer_exclude__', ()))
+
+        fields = []
+        self._temporal = set()
+        self.deferred = set()
+        for column in model.__table__.columns:
+            prop = mapper.get_property_by_column(column)
+            if prop.key in exclude:
+                continue
+            fields.append(prop.key)
+            if _is_temporal(column):
+                self._temporal.add(prop.key)
+            if prop.deferred:
+                self.deferred.add(prop.key)
+        self.fields = tuple(fields)
+        # What list endpoints return by default: everything but deferred columns
+        self.summary_fields = tuple(field for field in fields if field not in self.deferred)
+
+        self._lock = threading.Lock()
+        self._encoders = {}
+
+    def resolve_fields(self, fields=None):
+        """Known fields in declaration order; None means all of them"""
+        if fields is None:
+            return self.fields
+        wanted = set(fields)
+        return tuple(field for field in self.fields if field in wanted)
+
+    def columns(self, fields=None):
+        """Mapped attributes to select for `dump_row`, in encoder order"""
+        return [getattr(self.model, field) for field in self.resolve_fields(fields)]
+
+    def dump(self, obj, fields=None):
+        return self._encoder(self.resolve_fields(fields), False)(obj)
+
+    def dump_many(self, objs, fields=None):
+        encode = self._encoder(self.resolve_fields(fields), False)
+        return [encode(obj) for obj in objs]
+
+    def dump_row(self, row, fields=None):
+        """Serialize a row selected with `columns(fields)`"""
+        return self._encoder(self.resolve_fields(fields), True)(row)
+
+    def dump_rows(self, rows, fields=None):
+        encode = self._encoder(self.resolve_fields(fields), True)
+        return [encode(row) for row in rows]
+
+    def _encoder(self, fields, from_row):
+        encoder = self._encoders.get((fields, from_row))
+        if encoder is None:
+            encoder = self._compile(fields, from_row)
+            with self._lock:
+                if len(self._encoders) >= MAX_COMPILED_FIELDSETS:
+                    self._encoders.clear()
+                self._encoders[(fields, from_row)] = encoder
+        return encoder
+
+    def _compile(self, fields, from_row):
+        """Generate `def encode(src): return {...}` for one field set"""
+        if from_row:
+            source = self._source('encode', fields, 'src[{position}]')
+        else:
+            # Loaded attributes are read from the instance __dict__, bypassing the
+            # descriptors; anything missing (expired, deferred) takes the slow path
+            source = '\n'.join([
+                self._source('_encode_attributes', fields, 'src.{field}'),
+                self._source('_encode_state', fields, 'state[{field!r}]', prelude='    state = src.__dict__'),
+                'def encode(src):',
+                '    try:',
+                '        return _encode_state(src)',
+                '    except KeyError:',
+                '        return _encode_attributes(src)'
+            ])
+        namespace = {}
+        exec(compile(source, f'<serializer {self.model.__name__}>', 'exec'), namespace)
+        return namespace['encode']
+
+    def _source(self, name, fields, accessor, prelude=None):
+        body = [f'def {name}(src):']
+        if prelude:
+            body.append(prelude)
+        items = []
+        for position, field in enumerate(fields):
+            value = accessor.format(position=position, field=field)
+            if field in self._temporal:
+                body.append(f'    v{position} = {value}')
+                value = f'v{position}.isoformat() if v{position} is not None else None'
+            items.append(f'{field!r}: {value}')
+        body.append('    return {' + ', '.join(items) + '}')
+        return '\n'.join(body)
+
+
+_serializers = {}
+_serializers_lock = threading.Lock()
+
+
+def serializer_for(model):
+    """Shared serializer of a model class, built on first use"""
+    serializer = _serializers.get(model)
+    if serializer is None:
+        with _serializers_lock:
+            serializer = _serializers.get(model)
+            if serializer is None:
+                serializer = _serializers[model] = ModelSerializer(model)
+    return serializer
+
+
+class SerializerMixin:
+    """
+    Adds `to_dict(fields=None)` driven by the model's columns.
+    Columns listed in `__serializer_exclude__` are never serialized.
+    """
+    __serializer_exclude__ = ()
+
+    def to_dict(self, fields=None):
+        return serializer_for(type(self)).dump(self, fields)
@@ -0,0 +1,129 @@
+"""
+Per-user unread notification counters stored in Redis, so the badge count
+never needs a COUNT(*) over the user's notification history.
+
+A missing counter means "unknown": the first read counts the user's unread
+rows once and stores the result for UNREAD_COUNT_TTL. Increments and
+decrements skip missing counters, so they never turn a partial count into a
+believable one. Writers adjust the counters after committing, and the
+reconcile_unread_counts beat task drops the counters that drifted from the
+database (the next read counts again). When Redis is unreachable the count
+comes from the database.
+
+Notifications addressed to someone else (Notification.recipient, e.g. the
+alerts to emergency contacts) are never unread for the user.
+"""
+import logging
+from flask import current_app
+from redis import RedisError
+from sqlalchemy import and_, func
+from api.extensions import db, redis_client
+from api.models import Notification
+
+logger = logging.getLogger(__name__)
+
+_PREFIX = 'notifications:unread:'
+
+# Lo que cuenta como no leído, en consultas y en objetos
+UNREAD = and_(Notification.read_at.is_(None), Notification.recipient.is_(None))
+
+
+def is_unread(notification):
+    return notification.read_at is None and notification.recipient is None
+
+# Solo ajusta contadores que existen; uno negativo se descarta y se recuenta
+_ADD = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+local value = redis.call('INCRBY', KEYS[1], ARGV[1])
+if value < 0 then
+    redis.call('DEL', KEYS[1])
+    return nil
+end
+return value
+"""
+
+
+def _key(user_id):
+    return f'{_PREFIX}{user_id}'
+
+
+def count_unread(user_ids):
+    """{user_id: unread notifications} from the database"""
+    rows = db.session.query(Notification.user_id, func.count(Notification.id)).filter(
+        Notification.user_id.in_(user_ids),
+        UNREAD
+    ).group_by(Notification.user_id).all()
+    counts = dict.fromkeys(user_ids, 0)
+    counts.update(rows)
+    return counts
+
+
+def get_unread(user_id):
+    """Unread notifications of a user"""
+    try:
+        value = redis_client.get(_key(user_id))
+        if value is not None:
+            return int(value)
+    except RedisError as e:
+        logger.warning(f"Could not read unread count of user {user_id}: {str(e)}")
+        return count_unread([user_id])[user_id]
+
+    count = count_unread([user_id])[user_id]
+    try:
+        # nx: un ajuste llegado mientras contábamos no se pisa
+        redis_client.set(_key(user_id), count, ex=current_app.config['UNREAD_COUNT_TTL'], nx=True)
+    except RedisError as e:
+        logger.warning(f"Could not store unread count of user {user_id}: {str(e)}")
+    return count
+
+
+def add_unread(deltas):
+    """Adjust counters after a commit, e.g. add_unread({7: 2, 9: -1})"""
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    try:
+        script = redis_client.register_script(_ADD)
+        pipe = redis_client.pipeline(transaction=False)
+        for user_id, delta in deltas.items():
+            script(keys=[_key(user_id)], args=[delta], client=pipe)
+        pipe.execute()
+    except RedisError as e:
+        # Quedan desfasados hasta la próxima conciliación
+        logger.warning(f"Could not update unread counts of {len(deltas)} users: {str(e)}")
+
+
+def reconcile(batch_size=1000):
+    """
+    Compare the stored counters with the database and delete the ones that
+    differ. Returns (checked, dropped).
+    """
+    checked = 0
+    dropped = 0
+    keys = []
+
+    def check(keys):
+        values = redis_client.mget(keys)
+        user_ids = [int(key[len(_PREFIX):]) for key in keys]
+        counts = count_unread(user_ids)
+        db.session.rollback()  # no dejar abierta la transacción de lectura
+        stale = [
+            key for key, user_id, value in zip(keys, user_ids, values)
+            if value is not None and int(value) != counts[user_id]
+        ]
+        if stale:
+            redis_client.delete(*stale)
+        return len(stale)
+
+    for key in redis_client.scan_iter(match=f'{_PREFIX}*', count=batch_size):
+        keys.append(key)
+        if len(keys) == batch_size:
+            dropped += check(keys)
+            checked += len(keys)
+            keys = []
+    if keys:
+        dropped += check(keys)
+        checked += len(keys)
+    return checked, dropped
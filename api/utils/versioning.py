@@ -0,0 +1,63 @@
+"""
+Shared version counters stored in Redis.
+
+Writers bump a named counter after committing; every worker compares the
+current value with the one it saw last to decide whether its in-process data
+is stale. When Redis is unreachable the getters return None and callers fall
+back to their own expiry rules.
+
+A missing counter starts at the current time in milliseconds rather than 0,
+so after Redis loses its data (restart without persistence, FLUSHALL) the
+counters resume above any value handed out before and an old ETag cannot
+match again.
+"""
+import logging
+import time
+from redis import RedisError
+from api.extensions import redis_client
+
+logger = logging.getLogger(__name__)
+
+CATALOG = 'catalog'
+# Per-user counters, see user_version()
+INTAKES = 'intakes'
+REMINDERS = 'reminders'  # reminders and their logs
+
+
+def _key(name):
+    return f'version:{name}'
+
+
+def user_version(name, user_id):
+    """Name of a per-user counter, e.g. user_version(INTAKES, 7) -> 'intakes:7'"""
+    return f'{name}:{user_id}'
+
+
+def _seed():
+    return int(time.time() * 1000)
+
+
+def get_version(name):
+    """Return the current value of a counter"""
+    try:
+        value = redis_client.get(_key(name))
+        if value is None:
+            # nx: si otro proceso lo creó antes, vale el suyo
+            redis_client.set(_key(name), _seed(), nx=True)
+            value = redis_client.get(_key(name))
+    except RedisError as e:
+        logger.warning(f"Could not read version '{name}': {str(e)}")
+        return None
+    return int(value)
+
+
+def bump_version(name):
+    """Increment a counter and return its new value"""
+    try:
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.set(_key(name), _seed(), nx=True)
+        pipe.incr(_key(name))
+        return pipe.execute()[1]
+    except RedisError as e:
+        logger.warning(f"Could not bump version '{name}': {str(e)}")
+        return None
@@ -0,0 +1,126 @@
+"""
+Bandwidth and latency of the list routes with compression and conditional GET.
+
+Seeds a throwaway database (SQLite in memory unless DATABASE_URL is set) and
+requests each route through the Flask test client as identity, gzip, brotli
+and as a revalidation carrying the previous ETag:
+
+    python -m benchmarks.http_cache --medications 2000 --repeat 20
+
+Without a reachable Redis the version tokens are unavailable and 304s are
+computed from the body hash, so revalidations still run the view.
+"""
+import argparse
+import os
+import random
+import time
+from datetime import date, datetime, time as dtime, timedelta
+from flask_jwt_extended import create_access_token
+from api import create_app
+from api.config import Config
+from api.extensions import db
+from api.models import Medication, MedicationIntake, Reminder, User, UserMedication
+
+ROUTES = (
+    '/api/medications?per_page=100',
+    '/api/medications/user',
+    '/api/reminders',
+    '/api/medications/user/metrics/daily?days=7',
+)
+
+
+class BenchmarkConfig(Config):
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite://')
+    REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    AUTOCOMPLETE_WARM_START = False
+
+
+def seed(medications, user_medications):
+    user = User(username='bench', email='bench@example.com')
+    user.set_password('bench')
+    db.session.add(user)
+    db.session.add_all(
+        Medication(
+            name=f'Medication {i}',
+            generic_name=f'Generic {i}',
+            description='Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 8,
+            uses='Hypertension and related cardiovascular conditions. ' * 4,
+            contraindications='Pregnancy, severe renal impairment. ' * 4,
+            storage_instructions='Store below 25C, protect from light.',
+            strength='50 mg',
+            criticality=random.choice(['low', 'medium', 'high', 'critical'])
+        )
+        for i in range(medications)
+    )
+    db.session.flush()
+
+    today = date.today()
+    for i in range(user_medications):
+        user_med = UserMedication(
+            user_id=user.id,
+            medication_id=i + 1,
+            custom_name=f'My medication {i}',
+            prescribed_dosage='1 tablet',
+            prescribed_frequency='twice a day',
+            start_date=today - timedelta(days=30)
+        )
+        db.session.add(user_med)
+        db.session.flush()
+        for hour in (8, 20):
+            db.session.add(Reminder(
+                user_medication_id=user_med.id,
+                title=f'Take medication {i}',
+                reminder_time=dtime(hour),
+                frequency_type='daily',
+                start_date=today - timedelta(days=30)
+            ))
+        for day in range(7):
+            db.session.add(MedicationIntake(
+                user_medication_id=user_med.id,
+                status_at=datetime.combine(today - timedelta(days=day), dtime(8)),
+                status=random.choice(['taken', 'taken', 'missed'])
+            ))
+    db.session.commit()
+    return user.id
+
+
+def measure(client, url, headers, repeat):
+    best = float('inf')
+    response = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(url, headers=headers)
+        best = min(best, time.perf_counter() - started)
+    return response, best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--medications', type=int, default=2000)
+    parser.add_argument('--user-medications', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app(BenchmarkConfig)
+    client = app.test_client()
+    with app.app_context():
+        user_id = seed(args.medications, args.user_medications)
+        token = create_access_token(identity=str(user_id))
+    auth = {'Authorization': f'Bearer {token}'}
+
+    encodings = ('identity', 'gzip', 'br')
+
+    print(f"{'route':<46} {'variant':<10} {'status':>6} {'bytes':>9} {'ms':>8}")
+    for url in ROUTES:
+        etag = None
+        for accept in encodings:
+            response, elapsed = measure(client, url, {**auth, 'Accept-Encoding': accept}, args.repeat)
+            etag = etag or response.headers.get('ETag')
+            encoding = response.headers.get('Content-Encoding', 'identity')
+            print(f"{url:<46} {encoding:<10} {response.status_code:>6} {len(response.data):>9} {elapsed:>8.2f}")
+        response, elapsed = measure(client, url, {**auth, 'If-None-Match': etag or '', 'Accept-Encoding': 'gzip'}, args.repeat)
+        print(f"{url:<46} {'304 check':<10} {response.status_code:>6} {len(response.data):>9} {elapsed:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Notification delivery throughput of one worker, per channel.
+
+Seeds a throwaway database (SQLite in memory unless DATABASE_URL is set) with
+pending notifications and runs send_notifications in process against local
+stand-ins: the fake push/SMS gateway and FakeSMTPServer when aiosmtpd is
+installed (email is only logged otherwise):
+
+    python -m benchmarks.notifications --notifications 5000 --batch-size 100
+
+Compare with --batch-size 1 to see the cost of a provider call per message,
+and --smtp-pool 1 for a single SMTP connection per worker.
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+from api import channels, create_app
+from api.channels.fake import FakePushGateway, FakeSMTPServer
+from api.config import Config
+from api.extensions import db
+from api.models import Notification, User
+from api.tasks.notification_tasks import send_notifications
+
+METHODS = ('push', 'email', 'sms')
+
+
+class BenchmarkConfig(Config):
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite://')
+    REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    AUTOCOMPLETE_WARM_START = False
+    # Se mide el envío, no el límite de los proveedores
+    NOTIFICATION_RATE_LIMITS = {method: (10 ** 9, 10 ** 9) for method in ('push', 'email', 'sms')}
+
+
+def seed_users(count):
+    users = [User(username=f'bench{i}', email=f'bench{i}@example.com', phone=f'+3460000{i:04d}', password_hash='x')
+             for i in range(count)]
+    db.session.add_all(users)
+    db.session.commit()
+    return [user.id for user in users]
+
+
+def seed(user_ids, notifications, method):
+    now = datetime.utcnow()
+    db.session.add_all(
+        Notification(
+            user_id=user_ids[i % len(user_ids)],
+            notification_type='medication_reminder',
+            title='💊 Recordatorio: Medication',
+            message='Es hora de tomar tu medicamento: 1 tablet',
+            delivery_method=method,
+            scheduled_at=now,
+            status='pending'
+        )
+        for i in range(notifications)
+    )
+    db.session.commit()
+    return [notification_id for (notification_id,) in db.session.query(Notification.id).filter_by(
+        delivery_method=method, status='pending'
+    )]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--notifications', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--smtp-pool', type=int, default=Config.SMTP_POOL_SIZE)
+    args = parser.parse_args()
+
+    gateway = FakePushGateway().start()
+    try:
+        smtp = FakeSMTPServer(port=8026).start()
+    except RuntimeError:  # sin aiosmtpd el email solo se registra en el log
+        smtp = None
+
+    BenchmarkConfig.NOTIFICATION_BATCH_SIZE = args.batch_size
+    BenchmarkConfig.PUSH_GATEWAY_URL = gateway.url
+    BenchmarkConfig.SMS_GATEWAY_URL = gateway.url
+    BenchmarkConfig.SMTP_HOST = '127.0.0.1' if smtp else ''
+    BenchmarkConfig.SMTP_PORT = 8026
+    BenchmarkConfig.SMTP_POOL_SIZE = args.smtp_pool
+
+    app = create_app(BenchmarkConfig)
+    print(f"{'channel':<8} {'provider':<10} {'sent':>7} {'calls':>6} {'seconds':>8} {'per second':>11}")
+    try:
+        with app.app_context():
+            user_ids = seed_users(args.users)
+            for method in METHODS:
+                ids = seed(user_ids, args.notifications, method)
+                provider = type(channels.get_backend(method)).__name__.replace('Backend', '')
+                requests = gateway.requests
+                started = time.perf_counter()
+                result = send_notifications(ids)
+                elapsed = time.perf_counter() - started
+                calls = gateway.requests - requests if method != 'email' else '-'
+                print(f"{method:<8} {provider:<10} {result['sent']:>7} {calls:>6} {elapsed:>8.2f} "
+                      f"{result['sent'] / elapsed:>11.0f}")
+            channels.close_all()
+    finally:
+        gateway.stop()
+        if smtp:
+            smtp.stop()
+
+
+if __name__ == '__main__':
+    main()
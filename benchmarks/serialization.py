@@ -0,0 +1,109 @@
+"""
+Serialization benchmark: hand-written to_dict vs compiled serializers, and
+the stdlib JSON encoder vs FastJSONProvider.
+
+Runs on in-memory objects, no database needed:
+
+    python -m benchmarks.serialization --rows 5000 --repeat 20
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+from flask import Flask
+from api.models import Medication
+from api.utils.json_provider import FastJSONProvider, orjson
+from api.utils.serializers import serializer_for
+
+
+def handwritten_to_dict(self):
+    """Medication.to_dict as it was written before the compiled serializers"""
+    return {
+        'id': self.id,
+        'name': self.name,
+        'generic_name': self.generic_name,
+        'brand_name': self.brand_name,
+        'description': self.description,
+        'manufacturer': self.manufacturer,
+        'dosage_form': self.dosage_form,
+        'strength': self.strength,
+        'route_of_administration': self.route_of_administration,
+        'uses': self.uses,
+        'contraindications': self.contraindications,
+        'storage_instructions': self.storage_instructions,
+        'barcode': self.barcode,
+        'image_url': self.image_url,
+        'requires_prescription': self.requires_prescription,
+        'criticality': self.criticality,
+        'is_active': self.is_active,
+        'created_at': self.created_at.isoformat() if self.created_at else None,
+        'updated_at': self.updated_at.isoformat() if self.updated_at else None
+    }
+
+
+def make_medications(count):
+    now = datetime.utcnow()
+    return [
+        Medication(
+            id=i,
+            name=f'Medication {i}',
+            generic_name=f'Generic {i}',
+            brand_name=f'Brand {i}',
+            description='Lorem ipsum dolor sit amet ' * 20,
+            manufacturer='Laboratorio',
+            dosage_form='tablet',
+            strength='50 mg',
+            route_of_administration='oral',
+            uses='Hypertension',
+            contraindications='Pregnancy',
+            storage_instructions='Keep below 25C',
+            barcode=f'770{i:010d}',
+            image_url=None,
+            requires_prescription=True,
+            criticality='medium',
+            is_active=True,
+            created_at=now,
+            updated_at=now
+        )
+        for i in range(count)
+    ]
+
+
+def timed(label, func, repeat, rows):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    print(f'{label:<40} {best * 1000:9.2f} ms  {rows / best:12,.0f} rows/s')
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    serializer = serializer_for(Medication)
+    medications = make_medications(args.rows)
+    rows = [tuple(getattr(med, field) for field in serializer.fields) for med in medications]
+
+    print(f'{args.rows} medications, best of {args.repeat}\n')
+    baseline = timed('to_dict (hand-written)', lambda: [handwritten_to_dict(m) for m in medications], args.repeat, args.rows)
+    compiled = timed('to_dict (compiled)', lambda: serializer.dump_many(medications), args.repeat, args.rows)
+    from_rows = timed('dump_rows (Row tuples)', lambda: serializer.dump_rows(rows), args.repeat, args.rows)
+    print(f'\ncompiled: {baseline / compiled:.1f}x, rows: {baseline / from_rows:.1f}x faster than hand-written\n')
+
+    payload = {'medications': serializer.dump_rows(rows)}
+    provider = FastJSONProvider(Flask(__name__))
+    stdlib = timed('json.dumps (Flask default options)', lambda: json.dumps(payload, sort_keys=True, separators=(',', ':')), args.repeat, args.rows)
+    if orjson is None:
+        print('orjson is not installed; FastJSONProvider uses the stdlib encoder')
+        return
+    fast = timed('FastJSONProvider', lambda: provider._dumps_bytes(payload), args.repeat, args.rows)
+    print(f'\nFastJSONProvider: {stdlib / fast:.1f}x faster than json.dumps')
+
+
+if __name__ == '__main__':
+    main()
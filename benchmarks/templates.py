@@ -0,0 +1,76 @@
+"""
+Rendering cost of the compiled notification templates.
+
+Renders the reminder, missed dose and emergency texts of --messages
+notifications, spread over the supported languages, with the compiled
+templates and with str.format_map on the raw template strings:
+
+    python -m benchmarks.templates --messages 100000
+"""
+import argparse
+import time
+from api.utils.notification_templates import TEMPLATES, templates
+
+# (clave, campos del título, campos del mensaje), como los rellenan las tareas
+KEYS = (
+    ('medication_reminder.push', ('name',), ('dosage',)),
+    ('medication_reminder.email', ('name',), ('dosage', 'instructions')),
+    ('missed_dose.push', (), ('name',)),
+    ('emergency_alert.email', ('first_name',), ('first_name', 'name')),
+)
+
+
+def values(i, language):
+    t = templates.for_language(language)
+    return {
+        'name': f'Medication {i % 500}',
+        'dosage': '1 tablet' if i % 3 else t['default.dosage'],
+        'instructions': t['default.instructions'],
+        'first_name': 'Ana',
+    }
+
+
+def compiled(jobs):
+    rendered = []
+    for language, key, title, message in jobs:
+        template = templates.for_language(language)[key]
+        rendered.append((template.title(**title), template.message(**message)))
+    return rendered
+
+
+def format_map(jobs):
+    rendered = []
+    for language, key, title, message in jobs:
+        title_text, message_text = TEMPLATES[language][key]
+        rendered.append((title_text.format_map(title), message_text.format_map(message)))
+    return rendered
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    languages = sorted(TEMPLATES)
+    jobs = []
+    for i in range(args.messages):
+        language = languages[i % len(languages)]
+        key, title, message = KEYS[i % len(KEYS)]
+        data = values(i, language)
+        jobs.append((language, key, {f: data[f] for f in title}, {f: data[f] for f in message}))
+
+    assert compiled(jobs[:100]) == format_map(jobs[:100])
+
+    print(f"{'renderer':<12} {'messages':>9} {'ms':>9} {'per second':>12}")
+    for name, render in (('compiled', compiled), ('format_map', format_map)):
+        best = float('inf')
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            render(jobs)
+            best = min(best, time.perf_counter() - started)
+        print(f"{name:<12} {args.messages:>9} {best * 1000:>9.1f} {args.messages / best:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,8 @@
 import os
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import worker_process_shutdown
+from api import channels
 from api.app import app
 
 # Initialize Celery with new-style config keys
@@ -38,16 +40,34 @@ class FlaskTask(celery.Task):
 
 celery.Task = FlaskTask
 
+
+# Cerrar las conexiones con los proveedores de notificaciones al terminar cada proceso
+@worker_process_shutdown.connect
+def close_notification_channels(**kwargs):
+    channels.close_all()
+
 # Beat schedule
 celery.conf.beat_schedule = {
     'check-and-send-reminders': {
         'task': 'tasks.notification_tasks.check_and_send_reminders',
         'schedule': 60.0,
     },
+    'dispatch-due-reminders': {
+        'task': 'tasks.notification_tasks.dispatch_due_reminders',
+        'schedule': 15.0,
+    },
+    'dispatch-notifications': {
+        'task': 'tasks.notification_tasks.dispatch_notifications',
+        'schedule': 5.0,
+    },
     'check-missed-doses': {
         'task': 'tasks.notification_tasks.check_missed_doses',
         'schedule': 300.0,
     },
+    'reconcile-unread-counts': {
+        'task': 'tasks.notification_tasks.reconcile_unread_counts',
+        'schedule': 600.0,
+    },
     'cleanup-old-notifications': {
         'task': 'tasks.notification_tasks.cleanup_old_notifications',
         'schedule': crontab(hour=2, minute=0),
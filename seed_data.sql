@@ -6,6 +6,46 @@ ADD COLUMN reset_token VARCHAR(100) NULL UNIQUE;
 ALTER TABLE users 
 ADD COLUMN reset_token_expiry TIMESTAMP NULL;
 
+-- Agregar columna normalized_barcode (búsqueda por código de barras / NDC)
+ALTER TABLE medications 
+ADD COLUMN normalized_barcode VARCHAR(100) NULL;
+
+CREATE UNIQUE INDEX ix_medications_normalized_barcode ON medications (normalized_barcode);
+
+-- Agregar columna normalized_name (búsqueda por nombre normalizado)
+-- Luego ejecutar `flask --app api.app normalize-medications` para calcular las
+-- claves, fusionar duplicados y crear los índices
+ALTER TABLE medications 
+ADD COLUMN normalized_name VARCHAR(200) NULL;
+
+-- Agregar columna normalized_strength (dosis de la clave: 250 mg y 500 mg son productos distintos)
+-- El índice único pasa a (normalized_name, normalized_strength): se borra el anterior y
+-- `flask --app api.app normalize-medications` calcula la dosis y lo vuelve a crear
+ALTER TABLE medications 
+ADD COLUMN normalized_strength VARCHAR(100) NOT NULL DEFAULT '';
+
+DROP INDEX IF EXISTS uq_medications_normalized_name;
+
+-- Agregar columna calendar_key (URL secreta del calendario ICS)
+ALTER TABLE users 
+ADD COLUMN calendar_key VARCHAR(32) NULL;
+
+-- Agregar columna recipient (alertas a contactos de emergencia)
+ALTER TABLE notifications 
+ADD COLUMN recipient VARCHAR(120) NULL;
+
+-- Índice de notificaciones listas para enviar (dispatch_notifications)
+CREATE INDEX IF NOT EXISTS ix_notifications_status_scheduled_at ON notifications (status, scheduled_at);
+
+-- Índice del recuento de no leídas por usuario (api.utils.unread)
+CREATE INDEX IF NOT EXISTS ix_notifications_user_id_read_at ON notifications (user_id, read_at);
+
+-- Agregar columna snoozed_until (plazo de una dosis pospuesta para check_missed_doses)
+ALTER TABLE reminder_logs 
+ADD COLUMN snoozed_until TIMESTAMP NULL;
+
+CREATE INDEX IF NOT EXISTS ix_reminder_logs_snoozed_until ON reminder_logs (snoozed_until);
+
 -- 1. Medicamentos (catálogo general)
 INSERT INTO medications (id, name, generic_name, brand_name, description, manufacturer, dosage_form, strength, route_of_administration, uses, contraindications, storage_instructions, requires_prescription, is_active, created_at)
 VALUES 
@@ -0,0 +1,112 @@
+"""
+Shared fixtures: an app on in-memory SQLite with a fakeredis server per test.
+
+Fixtures do not keep an app context pushed: requests made with the test
+client would reuse it (and its `g` and session). Tests open one with
+`with app.app_context():` when they touch the database directly.
+"""
+import datetime
+import fakeredis
+import pytest
+import redis
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from api import channels, create_app
+from api.config import Config
+from api.extensions import db
+from api.utils.catalog_cache import medication_cache
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    JWT_SECRET_KEY = 'test-secret-key-long-enough-for-hs256'
+    AUTOCOMPLETE_WARM_START = False
+    ADMIN_USER_IDS = set()
+
+
+@pytest.fixture
+def redis_server(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, 'from_url', classmethod(
+        lambda cls, url, **kwargs: fakeredis.FakeRedis(
+            server=server, decode_responses=kwargs.get('decode_responses', False)
+        )
+    ))
+    return server
+
+
+@pytest.fixture
+def app(redis_server, tmp_path):
+    config = type('Config', (TestConfig,), {'UPLOAD_FOLDER': str(tmp_path / 'uploads')})
+    app = create_app(config)
+    # Cachés por proceso: cada prueba parte de cero
+    medication_cache.invalidate()
+    yield app
+    channels.close_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    from api.models import User
+
+    def make_user(username='ana', **fields):
+        """Create a user and return its id"""
+        fields.setdefault('email', f'{username}@example.com')
+        with app.app_context():
+            user = User(username=username, **fields)
+            user.set_password('password123')
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+    return make_user
+
+
+@pytest.fixture
+def make_reminders(app):
+    from api.models import Medication, Reminder, UserMedication
+
+    def make_reminders(user_id, count=1, **fields):
+        """Create `count` daily reminders of one medication and return their ids"""
+        fields.setdefault('reminder_time', datetime.time(8))
+        with app.app_context():
+            medication = Medication(name=f'Losartan {user_id}')
+            user_med = UserMedication(user_id=user_id, medication=medication, is_active=True)
+            db.session.add(user_med)
+            db.session.flush()
+            reminders = [
+                Reminder(user_medication_id=user_med.id, frequency_type='daily', **fields)
+                for _ in range(count)
+            ]
+            db.session.add_all(reminders)
+            db.session.commit()
+            return [reminder.id for reminder in reminders]
+    return make_reminders
+
+
+@pytest.fixture
+def auth_headers(app):
+    def auth_headers(user_id):
+        with app.app_context():
+            return {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+    return auth_headers
+
+
+@pytest.fixture
+def queries(app):
+    """SQL statements run by the app; clear() it before the request under test"""
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', record)
@@ -0,0 +1,40 @@
+import datetime
+from api.extensions import db, redis_client
+from api.models import Medication, Reminder, UserMedication
+
+
+def test_events_are_published_in_utc(app, client, make_user, auth_headers):
+    user_id = make_user()
+    with app.app_context():
+        db.session.add(Medication(name='Losartan'))
+        db.session.flush()
+        user_med = UserMedication(user_id=user_id, medication_id=1, is_active=True)
+        db.session.add(user_med)
+        db.session.flush()
+        db.session.add(Reminder(
+            user_medication_id=user_med.id, reminder_time=datetime.time(13, 0), frequency_type='daily',
+            start_date=datetime.date(2025, 3, 1), end_date=datetime.date(2025, 3, 31), calendar_reminder=True
+        ))
+        db.session.commit()
+
+    url = client.get('/api/reminders/calendar', headers=auth_headers(user_id)).get_json()['url']
+    body = client.get(url).get_data(as_text=True)
+
+    assert 'DTSTART:20250301T130000Z\r\n' in body
+    assert 'RRULE:FREQ=DAILY;UNTIL=20250331T235959Z\r\n' in body
+
+
+def test_rotated_url_stays_revoked_after_redis_reset(client, make_user, auth_headers):
+    user_id = make_user()
+    headers = auth_headers(user_id)
+    old_url = client.get('/api/reminders/calendar', headers=headers).get_json()['url']
+    assert client.get(old_url).status_code == 200
+
+    new_url = client.post('/api/reminders/calendar/rotate', headers=headers).get_json()['url']
+    assert client.get(old_url).status_code == 404
+
+    redis_client.flushall()
+
+    assert client.get(old_url).status_code == 404
+    assert client.get(new_url).status_code == 200
+    assert client.get('/api/reminders/calendar', headers=headers).get_json()['url'] == new_url
@@ -0,0 +1,19 @@
+"""Catalog import staging values (the COPY itself needs PostgreSQL)."""
+import pytest
+from api.utils.catalog_import import _bool_value, _copy_line
+
+
+@pytest.mark.parametrize('value, staged', [
+    (True, 't'), ('Yes', 't'), ('sí', 't'), ('1', 't'),
+    (False, 'f'), ('NO', 'f'), ('0', 'f'),
+    ('', None), (None, None),
+    # Se conserva el texto para que _validate rechace la fila
+    ('maybe', 'maybe'), (' quizás ', 'quizás'),
+])
+def test_bool_value(value, staged):
+    assert _bool_value(value) == staged
+
+
+def test_invalid_flag_is_staged_as_text():
+    line = _copy_line(3, {'name': 'Losartan', 'requires_prescription': 'maybe'}).decode()
+    assert line.rstrip('\n').split('\t')[-2:] == ['maybe', '\\N']
@@ -0,0 +1,91 @@
+"""Due reminders queue: fires are only forgotten once their task is queued."""
+from datetime import datetime, timedelta
+import pytest
+from api.extensions import redis_client
+from api.tasks import notification_tasks
+from api.utils import due_queue
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Task messages queued by the dispatcher"""
+    calls = []
+    monkeypatch.setattr(notification_tasks.send_reminder_notifications, 'delay',
+                        lambda ids: calls.append(('reminders', sorted(ids))))
+    monkeypatch.setattr(notification_tasks.send_snoozed_reminder, 'delay',
+                        lambda log_id, due_at: calls.append(('snooze', log_id)))
+    return calls
+
+
+def dispatch(app):
+    with app.app_context():
+        return notification_tasks.dispatch_due_reminders.run()
+
+
+def test_claim_due_moves_fires_to_processing(app):
+    now = datetime.utcnow().replace(microsecond=0)
+    with app.app_context():
+        due_queue.schedule_many([(1, now - timedelta(minutes=1)), (2, now + timedelta(hours=1))])
+        fires = due_queue.claim_due(now, 60)
+        assert fires == [(due_queue.REMINDER, 1, now - timedelta(minutes=1))]
+        assert redis_client.zcard(due_queue.DUE_KEY) == 1
+        assert redis_client.zcard(due_queue.PROCESSING_KEY) == 1
+
+        # Reclamado hace poco: no se vuelve a entregar
+        assert due_queue.claim_due(now + timedelta(seconds=30), 60) == []
+        # Sin confirmar pasado el timeout: se reclama otra vez
+        assert due_queue.claim_due(now + timedelta(seconds=61), 60) == fires
+
+        due_queue.ack(fires)
+        assert redis_client.zcard(due_queue.PROCESSING_KEY) == 0
+
+
+def test_dispatch_acks_queued_fires(app, sent, make_user, make_reminders):
+    first, second = make_reminders(make_user(), 2)
+    now = datetime.utcnow()
+    with app.app_context():
+        due_queue.schedule_many([(first, now - timedelta(seconds=5)), (second, now - timedelta(seconds=5))])
+        due_queue.schedule(9, now - timedelta(seconds=5), due_queue.SNOOZE)
+        due_queue.schedule(3, now - timedelta(hours=2))  # vencido hace más de DUE_REMINDERS_MAX_DELAY
+
+    assert dispatch(app) == {'dispatched': 3, 'expired': 1}
+    assert sorted(sent) == [('reminders', [first, second]), ('snooze', 9)]
+    with app.app_context():
+        assert redis_client.zcard(due_queue.DUE_KEY) == 0
+        assert redis_client.zcard(due_queue.PROCESSING_KEY) == 0
+
+
+def test_dispatch_batches_fires_by_user(app, sent, make_user, make_reminders, monkeypatch):
+    monkeypatch.setattr(notification_tasks, 'REMINDER_BATCH_USERS', 2)
+    ids = [make_reminders(make_user(f'user{i}'), 2) for i in range(5)]
+    now = datetime.utcnow()
+    with app.app_context():
+        due_queue.schedule_many([(rid, now - timedelta(seconds=5)) for user_ids in ids for rid in user_ids])
+
+    assert dispatch(app) == {'dispatched': 10, 'expired': 0}
+    # Tres tareas de dos, dos y un usuario; las dosis de un usuario nunca se separan
+    batches = [set(ids) for _, ids in sent]
+    assert sorted(len(batch) for batch in batches) == [2, 4, 4]
+    for user_ids in ids:
+        assert any(set(user_ids) <= batch for batch in batches)
+
+
+def test_broker_error_keeps_fires_for_retry(app, sent, make_user, make_reminders, monkeypatch):
+    (reminder_id,) = make_reminders(make_user(), 1)
+    now = datetime.utcnow()
+    with app.app_context():
+        due_queue.schedule(9, now - timedelta(seconds=5), due_queue.SNOOZE)
+        due_queue.schedule(reminder_id, now - timedelta(seconds=5))
+
+    def broker_down(ids):
+        raise ConnectionError('broker unreachable')
+
+    monkeypatch.setattr(notification_tasks.send_reminder_notifications, 'delay', broker_down)
+    assert 'error' in dispatch(app)
+    with app.app_context():
+        # El aviso pospuesto ya se encoló; el del recordatorio espera su reintento
+        pending = redis_client.zrange(due_queue.PROCESSING_KEY, 0, -1)
+        assert len(pending) == 1 and pending[0].startswith(f'{due_queue.REMINDER}:{reminder_id}:')
+
+        later = datetime.utcnow() + timedelta(seconds=app.config['DUE_REMINDERS_CLAIM_TIMEOUT'] + 1)
+        assert [object_id for _, object_id, _ in due_queue.claim_due(later, app.config['DUE_REMINDERS_CLAIM_TIMEOUT'])] == [reminder_id]
@@ -0,0 +1,94 @@
+"""
+?include= costs a fixed number of queries, whatever the number of rows.
+"""
+import datetime
+import pytest
+from api.extensions import db
+from api.models import Doctor, Medication, Prescription, Reminder, ReminderLog, UserDoctor, UserMedication
+
+
+@pytest.fixture
+def user_id(app, make_user):
+    return make_user()
+
+
+def seed(app, user_id, rows):
+    with app.app_context():
+        db.session.add_all([Medication(name='Losartan', criticality='high'), Doctor(first_name='Ada', last_name='Ruiz')])
+        db.session.flush()
+        for i in range(rows):
+            user_med = UserMedication(user_id=user_id, medication_id=1, custom_name=f'med {i}', is_active=True)
+            db.session.add(user_med)
+            db.session.flush()
+            for hour in (8, 14, 20):
+                reminder = Reminder(
+                    user_medication_id=user_med.id, reminder_time=datetime.time(hour),
+                    frequency_type='daily', start_date=datetime.date.today()
+                )
+                db.session.add(reminder)
+                db.session.flush()
+                db.session.add(ReminderLog(reminder_id=reminder.id, scheduled_time=datetime.datetime.utcnow(), status='pending'))
+            db.session.add(UserDoctor(user_id=user_id, doctor_id=1))
+            db.session.add(Prescription(user_id=user_id, doctor_id=1, medication_id=1, status='active'))
+        db.session.commit()
+
+
+# (url, consultas): el token del ETag (sin él con reminder_logs), la consulta principal,
+# una por colección incluida y la carga de la caché del catálogo, que empieza vacía
+CASES = [
+    ('/api/medications/user', 3),
+    ('/api/medications/user?include=medication', 3),
+    ('/api/medications/user?include=reminders', 4),
+    ('/api/medications/user?include=reminders,medication&fields=custom_name,medication.name', 4),
+    ('/api/reminders', 4),
+    ('/api/reminders?include=user_medication', 4),
+    ('/api/reminders?include=reminder_logs', 3),
+    ('/api/reminders?include=user_medication,reminder_logs', 3),
+    ('/api/reminders?include=medication&fields=title,medication.name', 4),
+    ('/api/doctors/user', 1),
+    ('/api/doctors/user?include=doctor', 1),
+    ('/api/prescriptions', 1),
+    ('/api/prescriptions?include=doctor', 1),
+    ('/api/prescriptions?include=doctor,medication&fields=status', 2),
+]
+
+
+@pytest.mark.parametrize('rows', [1, 5])
+@pytest.mark.parametrize('url, expected', CASES)
+def test_query_count(app, client, auth_headers, queries, user_id, url, expected, rows):
+    seed(app, user_id, rows)
+    queries.clear()
+
+    response = client.get(url, headers=auth_headers(user_id))
+
+    assert response.status_code == 200
+    assert len(queries) == expected, '\n'.join(queries)
+
+
+@pytest.mark.parametrize('url', [
+    '/api/medications/user?include=bogus',
+    '/api/reminders?include=logs',
+    '/api/doctors/user?include=x',
+    '/api/prescriptions?include=nope',
+])
+def test_unknown_include(client, auth_headers, user_id, url):
+    response = client.get(url, headers=auth_headers(user_id))
+
+    assert response.status_code == 400
+    assert 'Unknown include' in response.get_json()['error']
+
+
+def test_included_reminders_invalidate_etag(app, client, auth_headers, user_id):
+    seed(app, user_id, 1)
+    headers = auth_headers(user_id)
+    url = '/api/medications/user?include=reminders'
+    etag = client.get(url, headers=headers).headers['ETag']
+    assert client.get(url, headers={**headers, 'If-None-Match': etag}).status_code == 304
+
+    response = client.delete('/api/reminders/1', headers=headers)
+    assert response.status_code == 200
+
+    response = client.get(url, headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 200
+    reminders = response.get_json()['medications'][0]['reminders']
+    assert [r['is_active'] for r in reminders if r['id'] == 1] == [False]
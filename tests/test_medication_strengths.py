@@ -0,0 +1,79 @@
+"""Strengths of one drug are different catalog products."""
+import pytest
+from sqlalchemy import insert
+from api.extensions import db
+from api.models import Medication, UserMedication
+from api.utils.catalog_cache import find_by_names
+from api.utils.normalization import normalize_medication_name, normalize_strength
+
+
+@pytest.fixture
+def headers(make_user, auth_headers):
+    return auth_headers(make_user())
+
+
+def create(client, headers, **data):
+    return client.post('/api/medications', json=data, headers=headers)
+
+
+def test_strength_is_part_of_the_key():
+    assert normalize_medication_name('Amoxicillin 250 mg') == normalize_medication_name('Amoxicillin 500 mg') == 'amoxicillin'
+    assert normalize_strength('Amoxicillin 250 mg') == '250mg'
+    assert normalize_strength('Amoxicillin 500mg') == '500mg'
+    assert normalize_strength('Amoxicillin', '0,5 µg') == '0.5mcg'
+    assert normalize_strength('Amoxicillin', '1 tablet') == ''  # no es una dosis
+    assert normalize_strength('Amoxicillin 250 mg', '500 mg') == '250mg'  # manda la del nombre
+
+
+def test_two_strengths_can_be_created(client, headers):
+    assert create(client, headers, name='Amoxicillin 250 mg').status_code == 201
+    assert create(client, headers, name='Amoxicillin 500 mg').status_code == 201
+    assert create(client, headers, name='Amoxicillin').status_code == 201
+
+    assert create(client, headers, name='amoxicillin 250mg').status_code == 409
+    assert create(client, headers, name='Amoxicillin', strength='500 mg').status_code == 409
+
+
+def test_update_to_a_taken_strength_is_rejected(client, headers):
+    create(client, headers, name='Amoxicillin', strength='250 mg')
+    other = create(client, headers, name='Amoxicillin', strength='500 mg').get_json()['medication']['id']
+
+    response = client.put(f'/api/medications/{other}', json={'strength': '250mg'}, headers=headers)
+
+    assert response.status_code == 409
+
+
+def test_user_medication_matches_its_strength(app, client, headers):
+    low = create(client, headers, name='Amoxicillin 250 mg').get_json()['medication']['id']
+    high = create(client, headers, name='Amoxicillin 500 mg').get_json()['medication']['id']
+
+    response = client.post('/api/medications/user', json={'custom_name': 'amoxicillin 500mg'}, headers=headers)
+
+    assert response.status_code == 201
+    assert response.get_json()['user_medication']['medication_id'] == high
+    with app.app_context():
+        matches = find_by_names(['Amoxicillin 250 mg', 'Amoxicillin 125 mg'])
+        assert matches['Amoxicillin 250 mg']['id'] == low
+        assert matches['Amoxicillin 125 mg'] is None
+
+
+def test_normalize_command_only_merges_the_same_strength(app, make_user):
+    user_id = make_user('luis')
+    with app.app_context():
+        # Sin claves, como en una base anterior a la columna (el índice único no las ve)
+        names = ('Amoxicillin 250 mg', 'Amoxicillin 500 mg', 'amoxicillin 500mg')
+        ids = [
+            db.session.execute(insert(Medication.__table__).values(
+                name=name, criticality='medium', is_active=True
+            )).inserted_primary_key[0]
+            for name in names
+        ]
+        db.session.add_all([UserMedication(user_id=user_id, medication_id=i, is_active=True) for i in ids])
+        db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['normalize-medications'])
+
+    assert 'merged 1 duplicates' in result.output
+    with app.app_context():
+        assert [db.session.get(Medication, i).is_active for i in ids] == [True, True, False]
+        assert sorted(um.medication_id for um in UserMedication.query) == [ids[0], ids[1], ids[1]]
@@ -0,0 +1,38 @@
+"""Catalog matching keys."""
+import pytest
+from api.utils.normalization import normalize_barcode
+
+
+@pytest.mark.parametrize('code, key', [
+    ('00002-8215-01', 'NDC00002821501'),  # 5-4-2: ya canónico
+    ('0002-8215-01', 'NDC00002821501'),   # 4-4-2: se rellena el labeler
+    ('01234-567-89', 'NDC01234056789'),   # 5-3-2: se rellena el producto
+    ('01234-5678-9', 'NDC01234567809'),   # 5-4-1: se rellena el paquete
+    ('NDC 00002 8215 01', 'NDC00002821501'),
+    ('00002821501', 'NDC00002821501'),    # 11 dígitos sin guiones
+])
+def test_segmented_ndc_is_padded_to_5_4_2(code, key):
+    assert normalize_barcode(code) == key
+
+
+def test_both_forms_of_one_ndc_share_a_key():
+    assert normalize_barcode('01234-0567-89') == normalize_barcode('01234-567-89')
+
+
+def test_different_segmentations_do_not_collide():
+    assert normalize_barcode('01234-567-89') != normalize_barcode('0123-4567-89')
+
+
+@pytest.mark.parametrize('code, key', [
+    ('0002821501', '0002821501'),      # 4-4-2, 5-3-2 o 5-4-1: ambiguo
+    ('300028215012', '0002821501'),    # el NDC dentro del UPC-A, igual de ambiguo
+    ('0000000001', 'NDC00000000001'),  # todas las segmentaciones coinciden
+])
+def test_bare_10_digit_ndc_only_converted_when_unambiguous(code, key):
+    assert normalize_barcode(code) == key
+
+
+def test_other_codes():
+    assert normalize_barcode('12345-678-9') == '123456789'  # no es un NDC
+    assert normalize_barcode('4006381333931') == '04006381333931'  # EAN-13
+    assert normalize_barcode('') == ''
@@ -0,0 +1,128 @@
+"""GET /api/notifications/stream over fakeredis pub/sub."""
+import pytest
+from api.extensions import db, redis_client
+from api.models import Notification
+from api.utils import notification_stream
+
+
+@pytest.fixture
+def user_id(app, make_user):
+    app.config.update(NOTIFICATION_STREAM_HEARTBEAT=0.1, NOTIFICATION_STREAM_MAX_DURATION=2)
+    return make_user()
+
+
+@pytest.fixture
+def open_stream(client, auth_headers, user_id):
+    """Open streams of the user; all are closed at the end of the test"""
+    responses = []
+
+    def open_stream(**headers):
+        response = client.get('/api/notifications/stream', headers={**auth_headers(user_id), **headers},
+                              buffered=False)
+        responses.append(response)
+        return response
+    yield open_stream
+    for response in responses:
+        response.close()
+
+
+def add_notifications(app, user_id, *titles, **fields):
+    with app.app_context():
+        notifications = [
+            Notification(user_id=user_id, title=title, delivery_method='push', status='pending', **fields)
+            for title in titles
+        ]
+        db.session.add_all(notifications)
+        db.session.commit()
+        return [notification.id for notification in notifications]
+
+
+def publish(app, ids):
+    with app.app_context():
+        notification_stream.publish([db.session.get(Notification, i) for i in ids])
+
+
+def subscribers(app, user_id):
+    with app.app_context():
+        return dict(redis_client.pubsub_numsub(f'notifications:stream:{user_id}'))[f'notifications:stream:{user_id}']
+
+
+def next_event(chunks):
+    """Next chunk that is not a keep-alive"""
+    for chunk in chunks:
+        chunk = chunk.decode()
+        if not chunk.startswith(':'):
+            return chunk
+
+
+def test_published_notification_is_streamed(app, open_stream, user_id):
+    response = open_stream()
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    chunks = iter(response.response)
+    assert next(chunks) == b'retry: 5000\n\n'
+
+    # La alerta a un contacto de emergencia no se envía al paciente
+    alert, = add_notifications(app, user_id, 'Alert', recipient='luis@example.com')
+    dose, = add_notifications(app, user_id, 'Dose')
+    publish(app, [alert, dose])
+
+    event = next_event(chunks)
+    assert event.startswith(f'id: {dose}\nevent: notification\ndata: ')
+    assert '"title":"Dose"' in event.replace(' ', '')
+
+
+def test_reconnect_replays_missed_notifications(app, open_stream, user_id):
+    first, second, third = add_notifications(app, user_id, 'One', 'Two', 'Three')
+    response = open_stream(**{'Last-Event-ID': str(first)})
+    chunks = iter(response.response)
+    next(chunks)
+
+    assert next_event(chunks).startswith(f'id: {second}\n')
+    assert next_event(chunks).startswith(f'id: {third}\n')
+    # Publicada también por la tarea: no se repite
+    fourth, = add_notifications(app, user_id, 'Four')
+    publish(app, [third, fourth])
+    assert next_event(chunks).startswith(f'id: {fourth}\n')
+
+
+def test_keep_alive_and_end(app, open_stream):
+    chunks = [chunk.decode() for chunk in open_stream().response]
+
+    # Termina a los NOTIFICATION_STREAM_MAX_DURATION segundos con comentarios entre medias
+    assert chunks[0] == 'retry: 5000\n\n'
+    assert set(chunks[1:]) == {': keep-alive\n\n'}
+
+
+def test_close_unsubscribes(app, open_stream, user_id):
+    response = open_stream()
+    next(iter(response.response))
+    assert subscribers(app, user_id) == 1
+    assert notification_stream.slots.open == 1
+
+    response.close()
+
+    assert subscribers(app, user_id) == 0
+    assert notification_stream.slots.open == 0
+
+
+def test_redis_down(app, redis_server, open_stream):
+    redis_server.connected = False
+
+    response = open_stream()
+
+    assert response.status_code == 503
+    assert notification_stream.slots.open == 0
+
+
+def test_streams_above_the_cap_are_refused(app, open_stream):
+    app.config['NOTIFICATION_STREAM_MAX_PER_WORKER'] = 2
+    first, second = open_stream(), open_stream()
+    assert first.status_code == second.status_code == 200
+
+    refused = open_stream()
+    assert refused.status_code == 503
+    assert refused.headers['Retry-After']
+
+    first.close()
+    assert open_stream().status_code == 200
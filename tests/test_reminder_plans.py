@@ -0,0 +1,48 @@
+import datetime
+import pytest
+from api.utils.reminder_plans import PlanError, reminder_rows
+
+TODAY = datetime.date(2025, 3, 1)
+
+
+def times(plan):
+    return [row['reminder_time'].strftime('%H:%M') for row in reminder_rows(dict(plan, user_medication_id=1), TODAY)]
+
+
+def test_times_per_day_spreads_doses_over_the_day():
+    assert times({'times_per_day': 3}) == ['00:00', '08:00', '16:00']
+    assert times({'times_per_day': 2, 'first_time': '09:00', 'interval_hours': 1.5}) == ['09:00', '10:30']
+    assert times({'times_per_day': 3, 'interval_hours': 8}) == ['00:00', '08:00', '16:00']
+
+
+@pytest.mark.parametrize('plan', [
+    {'times_per_day': 3, 'interval_hours': 12},
+    {'times_per_day': 25, 'interval_hours': 1},
+])
+def test_doses_beyond_one_day_are_rejected(plan):
+    with pytest.raises(PlanError, match='do not fit in one day'):
+        times(plan)
+
+
+@pytest.mark.parametrize('plan', [
+    {'times_per_day': 2, 'interval_hours': 0.3333},
+    {'times_per_day': 2, 'interval_hours': 1e-9},
+    {'times_per_day': 7},
+    {'times': ['08:00:30']},
+])
+def test_times_with_seconds_are_rejected(plan):
+    with pytest.raises(PlanError):
+        times(plan)
+
+
+def test_plan_endpoint_rejects_overlapping_doses(app, client, make_user, auth_headers):
+    user_id = make_user()
+    headers = auth_headers(user_id)
+    user_med = client.post('/api/medications/user', json={'custom_name': 'Amoxicilina'}, headers=headers).get_json()
+
+    response = client.post('/api/reminders/plan', json={'plans': [
+        {'user_medication_id': user_med['user_medication']['id'], 'times_per_day': 3, 'interval_hours': 12}
+    ]}, headers=headers)
+
+    assert response.status_code == 400
+    assert 'do not fit in one day' in response.get_json()['error']
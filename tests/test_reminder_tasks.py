@@ -0,0 +1,70 @@
+"""Reminder sending tasks: one ReminderLog and one notification per dose."""
+from datetime import datetime, timedelta
+import pytest
+from api.extensions import db
+from api.models import Notification, ReminderLog
+from api.tasks import notification_tasks
+
+
+@pytest.fixture(autouse=True)
+def no_delivery(monkeypatch):
+    monkeypatch.setattr(notification_tasks.send_notifications, 'delay', lambda ids: None)
+
+
+def counts(app):
+    with app.app_context():
+        return ReminderLog.query.count(), Notification.query.count()
+
+
+def test_dose_sent_by_both_callers_is_sent_once(app, make_user, make_reminders):
+    reminder_ids = make_reminders(make_user(), 2)
+    with app.app_context():
+        first = notification_tasks.send_reminder_notifications.run(reminder_ids)
+        # El barrido por minuto encola las mismas dosis que la cola de vencimientos
+        second = notification_tasks.send_reminder_notifications.run(reminder_ids)
+
+    assert first['doses'] == 2 and first['notifications_created'] == 1  # un push para las dos
+    assert second == {'doses': 0, 'users': 0, 'notifications_created': 0}
+    assert counts(app) == (2, 1)
+
+
+def test_test_notification_is_sent_even_if_logged(app, make_user, make_reminders):
+    (reminder_id,) = make_reminders(make_user())
+    with app.app_context():
+        notification_tasks.send_reminder_notifications.run([reminder_id])
+        result = notification_tasks.send_reminder_notification.run(reminder_id)
+
+    assert result['notifications_created'] == 1
+    assert counts(app) == (2, 2)
+
+
+def test_snoozed_dose_is_not_sent_again_by_the_sweep(app, client, auth_headers, make_user, make_reminders):
+    user_id = make_user()
+    (reminder_id,) = make_reminders(user_id)
+    with app.app_context():
+        notification_tasks.send_reminder_notifications.run([reminder_id])
+        log = ReminderLog.query.one()
+        log_id, scheduled_time = log.id, log.scheduled_time
+
+    response = client.post(f'/api/reminders/logs/{log_id}/snooze', json={'minutes': 60},
+                           headers=auth_headers(user_id))
+    assert response.status_code == 200
+
+    with app.app_context():
+        # El barrido sigue viendo la dosis en su hora y no crea otro log
+        notification_tasks.send_reminder_notifications.run([reminder_id])
+        assert notification_tasks.check_missed_doses.run()['missed_doses'] == 0
+        log = db.session.get(ReminderLog, log_id)
+        assert log.scheduled_time == scheduled_time
+        assert log.status == 'pending'
+        # El aviso pospuesto reutiliza el log
+        result = notification_tasks.send_snoozed_reminder.run(log_id, log.snoozed_until.isoformat())
+        assert result['notifications_created'] == ['push']
+    assert counts(app) == (1, 2)
+
+    with app.app_context():
+        log = db.session.get(ReminderLog, log_id)
+        log.snoozed_until = datetime.utcnow() - timedelta(minutes=31)
+        db.session.commit()
+        assert notification_tasks.check_missed_doses.run()['missed_doses'] == 1
+        assert db.session.get(ReminderLog, log_id).status == 'missed'
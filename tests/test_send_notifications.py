@@ -0,0 +1,149 @@
+"""send_notifications against the local provider stand-ins in api.channels.fake."""
+import socket
+from datetime import datetime, timedelta
+import pytest
+from api import channels
+from api.channels.fake import FakePushGateway, FakeSMTPServer
+from api.channels.smtp import SMTPBackend
+from api.extensions import db
+from api.models import EmergencyContact, Notification, Reminder, ReminderLog
+from api.tasks import notification_tasks
+
+
+@pytest.fixture
+def gateway(app):
+    gateway = FakePushGateway().start()
+    app.config.update(PUSH_GATEWAY_URL=gateway.url, NOTIFICATION_BATCH_SIZE=10)
+    yield gateway
+    gateway.stop()
+
+
+@pytest.fixture
+def smtp_server(app):
+    pytest.importorskip('aiosmtpd')
+    with socket.socket() as probe:  # el Controller de aiosmtpd necesita un puerto fijo
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    server = FakeSMTPServer(port=port).start()
+    app.config.update(SMTP_HOST='127.0.0.1', SMTP_PORT=port, SMTP_POOL_SIZE=2,
+                      MAIL_FROM='care@example.com', NOTIFICATION_BATCH_SIZE=10)
+    yield server
+    server.stop()
+
+
+def add_notifications(app, user_id, count, method='push'):
+    """Pending notifications ready to send; returns their ids"""
+    with app.app_context():
+        notifications = [
+            Notification(user_id=user_id, notification_type='medication_reminder', title=f'Dose {i}',
+                         message='Take it', delivery_method=method, scheduled_at=datetime.utcnow(),
+                         status='pending')
+            for i in range(count)
+        ]
+        db.session.add_all(notifications)
+        db.session.commit()
+        return [notification.id for notification in notifications]
+
+
+def send(app, ids):
+    with app.app_context():
+        return notification_tasks.send_notifications.run(ids)
+
+
+def test_push_is_sent_in_batches(app, gateway, make_user):
+    ids = add_notifications(app, make_user(), 25)
+
+    result = send(app, ids)
+
+    assert result['sent'] == 25 and result['deferred'] == 0
+    assert gateway.requests == 3  # lotes de NOTIFICATION_BATCH_SIZE
+    assert sorted(message['id'] for message in gateway.messages) == ids
+    with app.app_context():
+        assert {n.status for n in Notification.query} == {'sent'}
+
+
+def test_rejected_recipient_is_retried(app, gateway, make_user):
+    ids = add_notifications(app, make_user(), 5)
+    gateway.reject = {ids[2]}
+
+    result = send(app, ids)
+
+    assert result == {'sent': 4, 'failed': 0, 'retrying': 1, 'per_second': result['per_second'], 'deferred': 0}
+    with app.app_context():
+        rejected = db.session.get(Notification, ids[2])
+        assert rejected.status == 'pending'
+        assert rejected.error_message == 'Rejected by fake gateway'
+        assert rejected.retry_count == 1
+        assert rejected.scheduled_at > datetime.utcnow()
+        assert Notification.query.filter_by(status='sent').count() == 4
+
+
+def test_emergency_alert_goes_to_the_contact(app, gateway, make_user, make_reminders, monkeypatch):
+    user_id = make_user(first_name='Ana')
+    (reminder_id,) = make_reminders(user_id)
+    with app.app_context():
+        db.session.get(Reminder, reminder_id).user_medication.medication.criticality = 'critical'
+        db.session.add_all([
+            ReminderLog(reminder_id=reminder_id, scheduled_time=datetime.utcnow() - timedelta(hours=1), status='pending'),
+            EmergencyContact(user_id=user_id, name='Luis', email='luis@example.com', notify_missed_doses=True),
+            EmergencyContact(user_id=user_id, name='Eva', email='eva@example.com', notify_missed_doses=True),
+        ])
+        db.session.commit()
+
+    queued = []
+    monkeypatch.setattr(notification_tasks.send_notifications, 'delay', queued.extend)
+    with app.app_context():
+        assert notification_tasks.check_missed_doses.run()['missed_doses'] == 1
+
+    assert send(app, queued)['sent'] == 3
+    assert [message['to'] for message in gateway.messages] == [str(user_id)]
+    with app.app_context():
+        emails = channels.get_backend('email').sent
+        assert sorted(message.address for message in emails) == ['eva@example.com', 'luis@example.com']
+
+
+@pytest.fixture
+def pipelined(monkeypatch):
+    """Messages sent by SMTPBackend per path"""
+    calls = {'pipelined': 0, 'serial': 0}
+    send_pipelined, send_serial = SMTPBackend._send_pipelined, SMTPBackend._send_serial
+
+    def count(path, send):
+        def wrapper(self, connection, messages, *args):
+            calls[path] += len(messages)
+            return send(self, connection, messages, *args)
+        return wrapper
+
+    monkeypatch.setattr(SMTPBackend, '_send_pipelined', count('pipelined', send_pipelined))
+    monkeypatch.setattr(SMTPBackend, '_send_serial', count('serial', send_serial))
+    return calls
+
+
+def test_email_is_pipelined(app, smtp_server, make_user, pipelined):
+    users = [make_user(f'user{i}') for i in range(12)]
+    ids = [notification_id for user_id in users for notification_id in add_notifications(app, user_id, 1, 'email')]
+
+    result = send(app, ids)
+
+    assert result['sent'] == 12
+    assert pipelined == {'pipelined': 12, 'serial': 0}
+    assert sorted(rcpt for rcpt, _ in smtp_server.messages) == sorted(f'user{i}@example.com' for i in range(12))
+    rcpt, content = smtp_server.messages[0]
+    assert b'From: care@example.com' in content and b'Subject: Dose 0' in content
+
+
+def test_rejected_email_recipient_is_retried(app, smtp_server, make_user, pipelined):
+    ids = [add_notifications(app, make_user(name), 1, 'email')[0] for name in ('ana', 'bad', 'luis')]
+    smtp_server.reject = {'bad@example.com'}
+    app.config['SMTP_POOL_SIZE'] = 1  # los tres por la misma conexión: tras el 550 sigue enviando
+
+    result = send(app, ids)
+
+    assert result['sent'] == 2 and result['retrying'] == 1
+    assert pipelined['pipelined'] == 3
+    assert sorted(rcpt for rcpt, _ in smtp_server.messages) == ['ana@example.com', 'luis@example.com']
+    with app.app_context():
+        rejected = db.session.get(Notification, ids[1])
+        assert rejected.status == 'pending'
+        assert rejected.error_message.startswith('550')
+        assert rejected.retry_count == 1
@@ -0,0 +1,62 @@
+"""Unread counters: alerts sent to emergency contacts are not the user's unread."""
+from datetime import datetime, timedelta
+import pytest
+from api.extensions import db
+from api.models import EmergencyContact, Notification, Reminder, ReminderLog
+from api.tasks import notification_tasks
+from api.utils.unread import reconcile
+
+
+@pytest.fixture
+def missed_dose(app, make_user, make_reminders, monkeypatch):
+    """A user with a missed critical dose and two contacts to alert; returns the user id"""
+    monkeypatch.setattr(notification_tasks.send_notifications, 'delay', lambda ids: None)
+    user_id = make_user()
+    (reminder_id,) = make_reminders(user_id)
+    with app.app_context():
+        db.session.get(Reminder, reminder_id).user_medication.medication.criticality = 'high'
+        db.session.add_all([
+            ReminderLog(reminder_id=reminder_id, scheduled_time=datetime.utcnow() - timedelta(hours=1), status='pending'),
+            EmergencyContact(user_id=user_id, name='Luis', email='luis@example.com', notify_missed_doses=True),
+            EmergencyContact(user_id=user_id, name='Eva', email='eva@example.com', notify_missed_doses=True),
+        ])
+        db.session.commit()
+    return user_id
+
+
+def unread(client, headers):
+    return client.get('/api/notifications/unread-count', headers=headers).get_json()['unread']
+
+
+def test_contact_alerts_are_not_unread(app, client, auth_headers, missed_dose):
+    headers = auth_headers(missed_dose)
+    assert unread(client, headers) == 0  # contador creado antes de la tarea
+
+    with app.app_context():
+        notification_tasks.check_missed_doses.run()
+        assert Notification.query.count() == 3
+
+    # El incremento de la tarea y el recuento desde la base coinciden
+    assert unread(client, headers) == 1
+    with app.app_context():
+        assert reconcile() == (1, 0)
+
+    listed = client.get('/api/notifications?unread_only=true', headers=headers).get_json()
+    assert [n['notification_type'] for n in listed['notifications']] == ['missed_dose']
+
+
+def test_reading_contact_alerts_keeps_the_count(app, client, auth_headers, missed_dose):
+    headers = auth_headers(missed_dose)
+    with app.app_context():
+        notification_tasks.check_missed_doses.run()
+        alert_ids = [n.id for n in Notification.query.filter(Notification.recipient.isnot(None))]
+    assert unread(client, headers) == 1
+
+    assert client.put(f'/api/notifications/{alert_ids[0]}/read', headers=headers).status_code == 200
+    assert client.delete(f'/api/notifications/{alert_ids[1]}', headers=headers).status_code == 200
+    assert unread(client, headers) == 1
+
+    assert client.put('/api/notifications/mark-all-read', headers=headers).status_code == 200
+    assert unread(client, headers) == 0
+    with app.app_context():
+        assert reconcile() == (1, 0)